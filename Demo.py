@@ -110,9 +110,8 @@ if __name__ == '__main__':
 			from Module.Lighting.Lighting import Lighting
 			from Module.IOC import ioc
 			ioc(globals())
-			from math import sqrt
 			import numpy as np
-			import Lilac
+			from Module.Lighting.Shading import shade
 			
 			from Module.Shapes.Point import Point
 			Point.disable_transforms()
@@ -133,23 +132,19 @@ if __name__ == '__main__':
 			root.create_light( Colors.SUN, Lighting.Point, lp )
 			(rows,cols) = root.config('height','width')
 			
-			for i in range(rows):
-				print(i,'out of',rows)
-				z = -1 + i * (2/(rows-1))
-				for j in range(cols):
-					x = -1 + j * (2/(cols-1))
-					y = 1 - x*x - z*z
-					if (y<=0): continue
-					y = sqrt(y)
-					
-					p = np.array([x,y,z,1])
+			# shade every point of the unit hemisphere seen from above at once
+			z = np.linspace(-1,1,rows)[:,np.newaxis]
+			x = np.linspace(-1,1,cols)[np.newaxis,:]
+			(i,j) = np.nonzero( 1 - x*x - z*z > 0 )
+			p = np.column_stack(( x[0,j], np.sqrt(1 - x[0,j]**2 - z[i,0]**2),
+				z[i,0], np.ones(len(i)) ))
 			# Lighting_shading( l, &N, &V, &p, &Cb, &Cs, 32, 1, &c);
 			# lighting l, Vector N, Vector V, Point p, Color cb, 
 			# Color cs, float s, int onesided, color c
-					base = Cb.copy()
-					Lilac.shade( lights, light_types, base, Cs, lp,
-						p, V, p )
-					root.create_point( x0=i,y0=j,color=base.tolist(),radii=1)
+			colors = shade( np.broadcast_to(Cb,p.shape), Cs, p, p, V, lights,
+				light_types, [lp,lp], [32,32] ).astype(int)
+			for (x0,y0,color) in zip(i,j,colors):
+				root.create_point( x0=int(x0),y0=int(y0),color=color.tolist(),radii=1)
 			root.mainloop()
 			
 		elif check and 'Sphere' in sys.argv:
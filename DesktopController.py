@@ -30,7 +30,7 @@ ioc(globals()) # mark ourselves for dependency injection
 class DesktopController:
 
 	def __init__( self ):
-		canvas = ltk.LTk()
+		canvas = ltk.LTk(sampling='progressive') # stays responsive while moving
 		self.dir = {
 			'canvas' : canvas, # the Ltk root
 			'root' : canvas.config('root'), # the Tk Root
@@ -186,6 +186,7 @@ class DesktopController:
 			list witihn the references is dereferenced.			
 		"""
 		del self.dir['scene'].__elements__[2:]
+		self.dir['scene']._dirty()
 		self.dir['canvas'].update_idletasks()
 		
 	def next_layer(self):
@@ -213,6 +214,7 @@ class DesktopController:
 
 		self.dir['__tmp__'] = modules[0].__elements__
 		modules[0].__elements__ = modules[self.dir['scene_index']].__elements__
+		modules[0]._dirty()
 		
 		self.dir['canvas'].update_idletasks()
 		
@@ -231,6 +233,7 @@ class DesktopController:
 		self.dir['scene_index'] -= 1		
 		self.dir['__tmp__'] = modules[0].__elements__
 		modules[0].__elements__ = modules[self.dir['scene_index']].__elements__
+		modules[0]._dirty()
 		
 		self.dir['canvas'].update_idletasks()
 		
@@ -393,6 +396,10 @@ class DesktopController:
 		tk.Button(pop,text='Set Shadow Options',font=Font(size=8,family='Courier'),
 			command=lambda: Lighting.set_shadow_values(\
 			int(e1.get()),int(e2.get()),float(e3.get()),int(e4.get()),float(e5.get()), can ) ).grid(column=5,row=0)
+		sampling = tk.StringVar()
+		sampling.set(can.config('sampling'))
+		tk.OptionMenu(pop,sampling,*sorted(ltk.SAMPLING_MODES),
+			command=lambda mode: can.config(sampling=mode)).grid(column=6,row=0)
 		bar.assign_to_bar(widget=pop,label='shadow')
 			
 if __name__ == '__main__':
@@ -5,12 +5,17 @@
 	The interface attempts to follow Tkinter syntax as much as possible without
 	introducing significant inconvenience.
 	
-	All shapes on modules added are also returned; they can be modified locally,
+	All shapes on modules added are also returned (composite shapes, such as
+	boxes and cylinders, come back wrapped in a module of their own, since the
+	shape factory shares their geometry between copies); they can be modified locally
+	(assigning their coordinates, normals, color or texture, or writing to
+	their arrays in place, redraws them; see Shape),
 	or the scene can be changed by modifying the GTM/VTM, or by switching cameras.
 	
-	The interface redraws itself using an estimation method of determining
-	when it is "dirty", based on the likewise dirtiness of the recursively
-	descending elements in its primary scene module.
+	The interface redraws itself when it is "dirty": elements notify the
+	modules that carry them when they change, the notification propagates
+	up to the primary scene module, and from there to the interface, which
+	schedules a single redraw at no more than its target frame rate.
 	
 	include __future__ (Notes on soon-to-be features)
 			
@@ -28,9 +33,13 @@ from PIL import Image, ImageTk
 # Basic imports
 import signal
 import time
+import os
+
+import Lilac
 
 # package imports
 from Module.Module import Module
+from Module.Instance import Instance
 from Module.ModuleList import ModuleList as mlist
 
 from Module.Matrices.Matrix import ViewTransformationMatrix, IdentityMatrix
@@ -42,6 +51,55 @@ from Module.Lighting.Lighting import Lighting
 
 from Module.Visitors.FlipVisitor import FlipVisitor
 
+# The sampling modes of the library, see LTk
+SAMPLING_MODES = { 'uniform' : 0, 'adaptive' : 1, 'progressive' : 2 }
+# The transparency modes of the library, see LTk
+TRANSPARENCY_MODES = { 'layered' : 0, 'k-buffer' : 1 }
+
+class FrameBuffer:
+	""" This class holds the persistent pixel and depth buffers of an LTk.
+	
+		The buffers are allocated once. A frame is drawn into the back pixel
+		buffer after it is cleared in place, and the buffers are swapped when
+		the frame is done, so that the front buffer always holds the last
+		complete frame. Each pixel buffer is shared, without a copy, with an
+		'RGBX' PIL image.
+		
+		Presenting a frame still copies it once: Tk photo images only take
+		'RGB' or 'RGBA' blocks, and the library's pixels carry no alpha, so
+		PhotoImage.paste converts the frame into a newly allocated 'RGB'
+		block every time it is pasted.
+	"""
+	
+	def __init__( self, width, height, background, depth = 1e3 ):
+		""" Initializes the buffers, cleared to the background color """
+		self.depth = depth
+		self.zbuffer = np.empty((height,width),np.float32)
+		self.__pixels = [ np.empty((height,width),np.uint32) for i in range(2) ]
+		self.__images = [ Image.frombuffer('RGBX',(width,height),pixels,
+			'raw','RGBX',0,1) for pixels in self.__pixels ]
+		for pixels in self.__pixels:
+			Lilac.clear_image( -1, pixels, self.zbuffer, background, depth )
+		self.__swap_fields()
+		
+	def clear( self, background ):
+		""" Clears the back buffer and the depth buffer in place and returns
+			the back buffer
+		"""
+		Lilac.clear_image( -1, self.back, self.zbuffer, background, self.depth )
+		return self.back
+		
+	def swap( self ):
+		""" Makes the back buffer the front buffer and vice versa """
+		self.__pixels.reverse()
+		self.__images.reverse()
+		self.__swap_fields()
+		
+	def __swap_fields( self ):
+		""" Points the public fields at the current front and back buffers """
+		(self.front,self.back) = self.__pixels
+		self.image = self.__images[0]
+		
 class LTk:
 	""" This class is a Tk agent for doing cool graphics """
 		
@@ -71,24 +129,50 @@ class LTk:
 				- height : the suggested height of the widget
 				- pixels : the data array (must be a flat contiguous numpy array)
 				- update: whether to automatically refresh the canvas
+				- target_fps : the most automatic refreshes per second (0 for no limit)
 				- background : the background color (in hex)
+				- lighting_threads : the number of threads that draw lighting,
+					shadows, reflections and transparency (all cores by default)
+				- lighting_seed : the seed of the jitter of shadow and
+					reflection rays
+				- sampling : how shadow and reflection rays are sampled;
+					'uniform' traces them all at every pixel, 'adaptive' only
+					near the edges of shadows and reflections, and
+					'progressive' a few more each frame, redrawing the still
+					scene until it converges
+				- samples_per_frame : the rays per pixel of a progressive frame
+				- transparency : how transparent modules are blended;
+					'layered' blends them through the traced layers, and
+					'k-buffer' keeps the nearest fragments of each pixel
+					and blends them in depth order whatever order the
+					modules are drawn in (they then cast no traced shadows)
+				- fragments_per_pixel : the fragments each pixel keeps in
+					the 'k-buffer' mode
 		
 		"""
 		self.__opts = {}
+		self.__refresh_pending = False
+		self.__refining = False
+		self.__last_refresh = 0
 		# We use lambda because we don't want to create an unnessary Tkinter window or widget if given
 		defaults = { 'root' : lambda:tk.Tk(), 'width' : lambda:750, 'height' : lambda:750, 
 					'bg' : lambda:'white', 'modules' : lambda : mlist([Module()]),
 					'update' : lambda:True, 'redraws':lambda:False,
 					'fps' : lambda:0, 'start_time' : lambda : time.time(),
+					'target_fps' : lambda:60,
 					'background' : lambda : 0xFFFFFF, 'interupt' : lambda:False,
-					'frame_number': lambda : 0, 'selective_shadows' : lambda:False}
+					'frame_number': lambda : 0, 'selective_shadows' : lambda:False,
+					'lighting_threads' : lambda : min(os.cpu_count() or 1,64),
+					'lighting_seed' : lambda : 0,
+					'sampling' : lambda : 'uniform', 'samples_per_frame' : lambda : 1,
+					'transparency' : lambda : 'layered', 'fragments_per_pixel' : lambda : 4}
 		# For every key in the defaults, use yours if provided otherwise mine
 		self.__opts = { key : options[key] if key in options else defaults[key]() for key in defaults.keys() }
 		
 		self.__init_widgets() # Initialize widgets
 		self.__init_image() # Initialize image
 		self.__init_draw_space() # Initialize the dictionary of drawing information
-		self.__auto_refresh() # set auto refresh
+		self.__watch_scene() # set auto refresh
 		
 		
 	# -- EXTERNAL FUNCTIONS -- #
@@ -110,6 +194,10 @@ class LTk:
 			return self.__opts[queries[0]]
 		for opt_name,new_opt in new_options.items():
 			self.__opts[opt_name] = new_opt
+			if opt_name == 'modules': self.__watch_scene()
+			if opt_name in ('lighting_threads','lighting_seed','sampling',
+				'samples_per_frame','transparency','fragments_per_pixel'):
+				self.__init_lighting_pool()
 			
 	def mainloop( self ):
 		""" Enters a mainloop on the root widget """
@@ -216,9 +304,13 @@ class LTk:
 			- color : r g b a values for the cylinder
 			- id : the identifier of the parent module
 			- sides : the number of sides to use in drawing the cylinder
+
+			Returns a module holding the cylinder, which can be colored, 
+			transformed and extended like any other; a transformation added to
+			it applies to the cylinder once moved to the front with wrap_queue.
 		"""
-		return self.__opts['modules'][id].add_element(shape_factory.gen_shape('cylinder',
-			x0=x0,y0=y0,width=width, height=height, color=color, sides=sides))
+		return self.__add_composite( shape_factory.gen_shape('cylinder',
+			x0=x0,y0=y0,width=width, height=height, color=color, sides=sides), id )
 
 	def create_box( self, x0, y0, z0, width, height, depth, 
 					color = [[100,0,0,0] for i in range(6)], id=0 ):
@@ -234,10 +326,27 @@ class LTk:
 			Optional Parameters
 			- color : r g b a values for the sides of the rectangle
 			- id : the identifier of the parent module
+
+			Returns a module holding the box, which can be colored, 
+			transformed and extended like any other; a transformation added to
+			it applies to the box once moved to the front with wrap_queue.
 		"""
-		return self.__opts['modules'][id].add_element(shape_factory.gen_shape('box',
+		return self.__add_composite( shape_factory.gen_shape('box',
 			x0=x0, y0=y0, z0=z0, width=width, depth=depth, height=height, 
-			color=color))
+			color=color), id )
+			
+	def __add_composite( self, shape, id ):
+		""" Adds a composite shape from the shape factory to the module of the
+			given id, wrapped in a module of its own, and returns that module.
+			
+			While the factory caches, the shape is an Instance of a geometry
+			shared with every other copy; the wrapper gives each copy the 
+			methods of a module (body_color, add_element, translate, 
+			wrap_queue...) without touching the others.
+		"""
+		module = Module()
+		module.add_element( shape )
+		return self.__opts['modules'][id].add_element( module )
 			
 	def create_module( self, parent_id = 0 ):
 		""" Adds a module to the interface as a sub-module of
@@ -248,6 +357,13 @@ class LTk:
 		mod.index = len(self.__opts['modules']) - 1
 		return self.__opts['modules'][parent_id].add_element(mod)
 			
+	def create_instance( self, geometry, parent_id = 0 ):
+		""" Adds an instance of the given module or shape to the module of the
+			given id. Instances share their geometry, so adding many copies
+			of an object costs one transformation each (see Instance).
+		"""
+		return self.__opts['modules'][parent_id].add_element(Instance(geometry))
+			
 	def create_rotation( self, cth, sth, rotation,id=0 ):
 		""" Adds the given transformation to the scene.
 			Parameters:
@@ -297,28 +413,33 @@ class LTk:
 			
 	def set_auto_update( self, flag ):
 		""" Toggles whether to automatically redraw the canvas when possible """
-		if flag and not self.__opts['update']:
-			self.__auto_refresh()
-		self.__opts['update'] = flag			
+		self.__opts['update'] = flag
+		if flag: self.__request_refresh()
 			
 	def update_idletasks( self ):
 		""" Redraws the canvas with the current projection.
 			
 			The canvas is automatically updated; this function forces the
-			procedure at a particular interval.
+			procedure at a particular interval. As the scene may have changed
+			in any way, progressive sampling starts over (see __draw_frame).
+		"""
+		self.__draw_frame( refine = False )
+		
+	def __draw_frame( self, refine ):
+		""" Draws a frame of the scene. The rays that progressive sampling
+			has gathered are kept only if refine is set and the scene is not
+			dirty, i.e., for the idle frames that refine a still scene; 
+			otherwise they are dropped, since a moved occluder changes the
+			shadows of pixels whose depth has not changed.
 		"""
-		(can,width,height,gtm,vtm,ds,bg,lighting) = \
-			self.config('canvas','width','height','GTM',
-				'camera','ds','background','lighting')
-		can.delete('all') # clear the canvas
+		if not refine or self.__opts['modules'][0]._is_dirty():
+			Lilac.reset_sampling()
+		(gtm,vtm,ds,bg,lighting,framebuffer) = \
+			self.config('GTM','camera','ds','background','lighting','framebuffer')
 		
+		# draw into the cleared back buffer
 		t0 = time.time()
-		self.__opts['pixels'] = np.ones((width,height),np.uint32) * bg
-		from random import randint
-		for i in range(200): self.__opts['pixels'][randint(0,700),randint(0,700)] = 0xFFFFFF
-
-		self.__opts['zbuffer'] = np.ones((width,height),np.float32) * 1e3;
-		pix = self.__opts['pixels']
+		self.__opts['pixels'] = framebuffer.clear( bg )
 		self.__opts['lighting'].reset_trace_buffer()
 		
 		# Update the canvas with our module
@@ -338,25 +459,23 @@ class LTk:
 		
 		self.__opts['modules'][0]._clean()
 		
-		# redraw the canvas
-		self.__opts['image'] = Image.frombuffer('RGBA',(width,height),
-			pix,'raw','RGBA',0,1).convert("RGB")
-		self.__opts['photo_image'] = ImageTk.PhotoImage(self.__opts['image'])
-		can.create_image(width/2,height/2-20,image=self.__opts['photo_image'])
-		self.__opts['redraws'] += 1
+		# present the finished frame
+		framebuffer.swap()
+		self.force_redraw()
 		self.__opts['fps'] = int(60 / (time.time() - t0))
+		
+		# draw idle frames until progressive sampling converges
+		self.__refining = not Lilac.is_sampling_converged()
+		if self.__refining: self.__request_refresh()
 	
 	def force_redraw( self ):
 		""" Forces the canvas to immediately redrwa without changing
-			the pixels
+			the pixels. The front buffer is converted to 'RGB' as it is 
+			pasted (see FrameBuffer).
 		"""
-		
-		(width,height,pix,can) = self.config('width','height','pixels','canvas')
-		can.delete('all')
-		self.__opts['image'] = Image.frombuffer('RGBA',(width,height),
-			pix,'raw','RGBA',0,1).convert("RGB")
-		self.__opts['photo_image'] = ImageTk.PhotoImage(self.__opts['image'])
-		can.create_image(width/2,height/2-20,image=self.__opts['photo_image'])
+		framebuffer = self.__opts['framebuffer']
+		self.__opts['image'] = framebuffer.image
+		self.__opts['photo_image'].paste(framebuffer.image)
 		self.__opts['redraws'] += 1
 	
 	def schedule( self, time, event, recurring = False ):
@@ -396,7 +515,7 @@ class LTk:
 		"""
 		image, i = self.config('image','frame_number')
 		s = ''.join(['0' for j in range(6-len(str(i)))]+[str(i)])
-		image.save('images/gif_base/'+filename+'_'+s+'.png','PNG')
+		image.convert('RGB').save('images/gif_base/'+filename+'_'+s+'.png','PNG')
 		self.config(frame_number = (i+1))
 
 	
@@ -424,44 +543,59 @@ class LTk:
 			
 			This is an internal function called at instantiation.
 		"""
-		# Create a pixel array to store our data
+		# Create the persistent buffers that store our data
 		(width,height,bg) = self.config('width','height','background')
-		pixels = self.__opts['pixels'] = np.ones((width,height),np.uint32) * bg
-		self.__opts['zbuffer'] = np.ones((width,height),np.float32) * 1e3
-		pixels.shape = height,width
+		framebuffer = self.__opts['framebuffer'] = FrameBuffer(width,height,bg)
+		self.__opts['pixels'] = framebuffer.front
+		self.__opts['zbuffer'] = framebuffer.zbuffer
 		
 		# Handle Seg faults; seg faults in python are the reason I have trust issues
 		def sig_handler(s,f):
 			raise Exception("I'm so so so sorry... seg fault")
 		signal.signal(signal.SIGSEGV,sig_handler)
 		
-		# Create an image from the pixel array
-		self.__opts['image'] = Image.frombuffer('RGBA',(width,height),pixels,
-											'raw','RGBA',0,1).convert('RGB')
-		self.__opts['photo_image'] = ImageTk.PhotoImage(self.__opts['image'])
+		# Create the one photo image that frames are pasted into
+		self.__opts['image'] = framebuffer.image
+		self.__opts['photo_image'] = ImageTk.PhotoImage('RGB',(width,height))
+		self.__opts['photo_image'].paste(framebuffer.image)
 		
 		# Draw the image to the canvas
 		self.__opts['canvas'].create_image(width/2,height/2-20,
 			image=self.__opts['photo_image'])		
 			
+	def __watch_scene( self ):
+		""" Subscribes the interface to changes of the primary scene module 
+			and draws it if it is already dirty
+		"""
+		self.__opts['modules'][0]._add_observer( self.__request_refresh )
+		self.__request_refresh()
+		
+	def __request_refresh( self ):
+		""" Schedules a refresh in response to a change in the scene. Requests
+			made while one is pending are coalesced into it, and the refresh is
+			held back so that refreshes occur at most at the target frame rate
+		"""
+		if self.__refresh_pending or not self.__opts['update']: return
+		self.__refresh_pending = True
+		fps = self.__opts['target_fps']
+		wait = self.__last_refresh + (1/fps if fps > 0 else 0) - time.time()
+		self.__opts['root'].after( max(0,int(wait*1000)), self.__auto_refresh )
+		
 	def __auto_refresh( self ):
-		""" Automatically refreshes the canvas """
+		""" Refreshes the canvas, if the scene is still dirty """
+		self.__refresh_pending = False
 		if not self.__opts['update']: return
-					
-		else:
-			# Display our performance stats
-			dt = int(time.time() - self.__opts['start_time'])
-			self.__opts['root'].title(''.join(['Lilac : ',
-				str(self.__opts['fps']), ' fps','. Time: ',str(dt),
-				'. Redraws: ',str(self.__opts['redraws'])]))
-			
-		# update the canvas
-		mod_is_dirty = self.__opts['modules'][0]._is_dirty()
-		if mod_is_dirty: 
-			self.update_idletasks()
-
-		# set to do it again
-		self.__opts['root'].after( 1, self.__auto_refresh )
+		
+		# update the canvas, or keep refining a still progressive frame
+		if self.__opts['modules'][0]._is_dirty() or self.__refining:
+			self.__last_refresh = time.time()
+			self.__draw_frame( refine = True )
+			
+		# Display our performance stats
+		dt = int(time.time() - self.__opts['start_time'])
+		self.__opts['root'].title(''.join(['Lilac : ',
+			str(self.__opts['fps']), ' fps','. Time: ',str(dt),
+			'. Redraws: ',str(self.__opts['redraws'])]))
 		
 	def __init_draw_space( self ):
 		""" Initializes the drawing information required by Modular
@@ -471,6 +605,19 @@ class LTk:
 			'camera' : View2D().setView2D(), 'ds' : DS(), 'lighting' : Lighting() } )
 		self.texture = True # needs to be field for for fastest access
 		self.fill = True # needs to be field for for fastest access
+		self.__init_lighting_pool()
+		
+	def __init_lighting_pool( self ):
+		""" Sets the number of threads, the random seed, the sampling mode
+			and the transparency mode of the lighting passes, which draw in
+			the library without holding the GIL
+		"""
+		Lilac.set_lighting_threads( self.__opts['lighting_threads'] )
+		Lilac.set_lighting_seed( self.__opts['lighting_seed'] )
+		Lilac.set_sampling_mode( SAMPLING_MODES[self.__opts['sampling']],
+			self.__opts['samples_per_frame'] )
+		Lilac.set_transparency_mode( TRANSPARENCY_MODES[self.__opts['transparency']],
+			self.__opts['fragments_per_pixel'] )
 	
 	def __apply_shadows( self ):
 		""" Applies shadows to the canvas based on the root lighting,
@@ -0,0 +1,103 @@
+"""
+	This file contains a module element that places a shared geometry into
+	a scene.
+
+	Copying an object into a scene duplicates its whole Module tree, with
+	every shape's arrays, for each copy. An instance instead refers to one
+	geometry (a Module or a Shape) and carries only what differs between
+	copies: a transformation and, optionally, a draw state. The geometry is
+	applied as though it were a sub-module preceded by the instance's
+	transformation and draw state.
+
+	When compiled, consecutive instances of the same geometry and draw state
+	are gathered into one InstanceSet (see RenderList.add_instance), whose
+	polygons are drawn for every instance in a single call into the library.
+
+	Date: 10/18/2026
+"""
+
+from Module.ModuleElement import ModuleElement
+from Module.Matrices.Matrix import ViewTransformationMatrix
+from Module.RenderList import RenderList
+from Module.ClassUtils import Overrides
+
+class Instance(ModuleElement):
+	""" This class places a geometry shared with other instances under its
+		own transformation and draw state
+	"""
+	__id__ = 0
+
+	def __init__( self, geometry, transform = None, draw_state = None ):
+		""" Initializes an instance of the given Module or Shape. The
+			transformation is a ViewTransformationMatrix (the identity if not
+			given) and the draw state, if given, is applied on top of the one
+			in effect where the instance is found.
+		"""
+		ModuleElement.__init__(self)
+		self.geometry = geometry
+		self.transform = ViewTransformationMatrix() if transform is None else transform
+		self.draw_state = draw_state
+		geometry._add_observer( self._dirty )
+		self.transform._add_observer( self._dirty )
+		if draw_state is not None: draw_state._add_observer( self._dirty )
+
+		self.id = [ geometry.id[0] if isinstance(geometry.id,list) else 'Instance',
+			str(Instance.__id__) ]
+		Instance.__id__ += 1
+		self.invisible = False
+		self._dirty()
+
+	def scale( self, sx, sy, sz ):
+		""" Scales the instance by sx, sy and sz """
+		self.transform.scale(sx,sy,sz)
+		self._dirty()
+
+	def rotate( self, cth, sth, axis ):
+		""" Rotates the instance along the given axis by the angle given as
+			its cosine and sine
+		"""
+		Mtx = ViewTransformationMatrix
+		{'x':Mtx.rotateX,'y':Mtx.rotateY,'z':Mtx.rotateZ}[axis](self.transform,cth,sth)
+		self._dirty()
+
+	def translate( self, tx, ty, tz ):
+		""" Translates the instance by tx, ty and tz """
+		self.transform.translate(tx,ty,tz)
+		self._dirty()
+
+	@Overrides(ModuleElement)
+	def apply_to_scene( self, environment ):
+		""" Draws the instance, as Module.apply_to_scene draws a module """
+		if self.ignore: return
+		render_list = RenderList()
+		self._compile( dict( environment, global_transformation_matrix =
+			ViewTransformationMatrix() ), render_list )
+		render_list.batch_polygons()
+		(ltk,vtm,gtm,l) = (environment[key] for key in ('ltk',
+			'view_transformation_matrix','global_transformation_matrix','lighting'))
+		render_list.draw( ltk, vtm, gtm, l )
+
+	@Overrides(ModuleElement)
+	def _compile( self, environment, render_list ):
+		""" Records the instance into the render list """
+		if self.ignore: return
+		self.geometry._add_observer( self._dirty ) # for legacy imports
+		self.transform._add_observer( self._dirty )
+		if self.draw_state is not None: self.draw_state._add_observer( self._dirty )
+		render_list.add_instance( self, environment )
+
+	@Overrides(ModuleElement)
+	def _clean( self ):
+		""" Cleans the instance, its transformation and its geometry """
+		ModuleElement._clean(self)
+		self.transform._clean()
+		self.geometry._clean()
+
+	@Overrides(ModuleElement)
+	def accept( self, visitor ):
+		""" Implements the visitor pattern for this instance """
+		return visitor.visit_instance(self)
+
+	def __repr__( self ):
+		""" Returns a concise string representation of the instance """
+		return '<'+self.id[0]+' instance : '+self.id[1]+'>'
@@ -0,0 +1,83 @@
+"""
+	This file contains a module element that draws one of several resolutions
+	of an object, chosen by the size of the object on the image.
+
+	A finely tessellated sphere or cylinder costs as much to transform, light
+	and scan convert when it covers a handful of pixels as when it fills the
+	view. A level of detail holds several precomputed resolutions of the same
+	object, ordered from the coarsest to the finest, and every frame draws the
+	coarsest one whose faces are still small on the image. The choice is made
+	from the projected radius of the object's bounding box (see DetailSet),
+	so it costs eight vertex transformations per object and frame.
+
+	Date: 10/18/2026
+"""
+
+from Module.ModuleElement import ModuleElement
+from Module.Matrices.Matrix import ViewTransformationMatrix
+from Module.RenderList import RenderList, DetailSet
+from Module.ClassUtils import Overrides
+
+class LevelOfDetail(ModuleElement):
+	""" This class draws one of its levels, each a Module or a Shape,
+		according to its projected size
+	"""
+	__id__ = 0
+
+	def __init__( self, levels, radii = None, tolerance = 8 ):
+		""" Initializes the element with the given levels, ordered from the
+			coarsest to the finest.
+
+			Arguments:
+				- levels : the resolutions of the object
+				- radii : optionally, the largest projected radius, in pixels,
+					at which each level is drawn; the finest level is drawn
+					beyond them all
+				- tolerance : if the radii are not given, a level is drawn
+					while its faces are about this many pixels across or less
+		"""
+		ModuleElement.__init__(self)
+		self.levels = list(levels)
+		self.radii = radii
+		self.tolerance = tolerance
+		[ level._add_observer( self._dirty ) for level in self.levels ]
+
+		self.id = ['Detail',str(LevelOfDetail.__id__)]
+		LevelOfDetail.__id__ += 1
+		self.invisible = False
+		self._dirty()
+
+	@Overrides(ModuleElement)
+	def apply_to_scene( self, environment ):
+		""" Draws the element, as Module.apply_to_scene draws a module """
+		if self.ignore: return
+		render_list = RenderList()
+		self._compile( dict( environment, global_transformation_matrix =
+			ViewTransformationMatrix() ), render_list )
+		render_list.batch_polygons()
+		(ltk,vtm,gtm,l) = (environment[key] for key in ('ltk',
+			'view_transformation_matrix','global_transformation_matrix','lighting'))
+		render_list.draw( ltk, vtm, gtm, l )
+
+	@Overrides(ModuleElement)
+	def _compile( self, environment, render_list ):
+		""" Records the levels into the render list as one DetailSet """
+		if self.ignore: return
+		render_list.add_shape( DetailSet( self.levels, environment['draw_state'].copy(),
+			self.radii, self.tolerance, environment.get('cull_back_faces',False) ),
+			environment )
+
+	@Overrides(ModuleElement)
+	def _clean( self ):
+		""" Cleans the element and its levels """
+		ModuleElement._clean(self)
+		[ level._clean() for level in self.levels ]
+
+	@Overrides(ModuleElement)
+	def accept( self, visitor ):
+		""" Implements the visitor pattern for this element """
+		return visitor.visit_level_of_detail(self)
+
+	def __repr__( self ):
+		""" Returns a concise string representation of the element """
+		return '<'+self.id[0]+' : '+self.id[1]+', '+str(len(self.levels))+' levels>'
@@ -0,0 +1,80 @@
+"""
+	This file contains a function that shades many points at once.
+
+	The library's shade function (lib/Lighting/Shade.c) lights one point per
+	call, from nine separate arrays, so lighting a mesh costs a call into the
+	library for each polygon. This function applies the same lighting model
+	to arrays of points, normals and colors with a handful of array
+	operations per light, and returns every shaded color at once.
+
+	Lights are given as the library takes them: an Lx4 array of rgba colors,
+	their types (AMBIENT or POINT, as Lighting.Ambient and Lighting.Point),
+	and, for point lights, their positions and sharpness.
+
+	Date: 10/18/2026
+"""
+
+import numpy as np
+
+AMBIENT = 1
+POINT = 2
+
+def shade( base, surface, positions, normals, view, lights, light_types,
+		light_positions = None, sharpness = None, one_sided = True ):
+	""" Returns the colors of points lit by the given lights.
+
+		Arguments:
+			- base : the ...x4 rgba body colors of the points (0 to 255)
+			- surface : the rgba surface color, one for all of the points or
+				one per point
+			- positions : the ...x3 (or ...x4) positions of the points
+			- normals : the ...x3 (or ...x4) normals of the points
+			- view : the view vector of the camera
+			- lights : the Lx4 rgba colors of the lights
+			- light_types : the L types of the lights
+			- light_positions : the Lx3 (or Lx4) positions of the lights,
+				needed for point lights
+			- sharpness : the L specular exponents of the lights, needed for
+				point lights
+			- one_sided : if False, points lit from behind are shaded as if
+				their normals were flipped
+
+		The result has the shape of base; its alpha is that of base and its
+		colors are truncated to integers, as the library truncates them.
+	"""
+	base = np.asarray(base,dtype=float)
+	body = base[...,:3] / 255
+	specular = np.broadcast_to( np.asarray(surface,dtype=float)[...,:3] / 255, body.shape )
+	lights = np.asarray(lights,dtype=float).reshape(-1,4)[:,:3] / 255
+	total = np.zeros( body.shape )
+
+	if any( light_type == POINT for light_type in light_types ):
+		points = np.asarray(positions,dtype=float)[...,:3]
+		normal = unit( np.asarray(normals,dtype=float)[...,:3] )
+		view = np.asarray(view,dtype=float)[:3]
+
+	for j,(light,light_type) in enumerate(zip(lights,light_types)):
+		if light_type == AMBIENT:
+			total += light * body
+		elif light_type == POINT:
+			l = unit( np.asarray(light_positions[j],dtype=float)[:3] - points )
+			h = unit( (l + view) / 2 )
+			diffuse = (l*normal).sum(axis=-1)
+			highlight = (h*normal).sum(axis=-1)
+			if not one_sided:
+				flip = np.where( diffuse < 0, -1, 1 )
+				(diffuse,highlight) = (diffuse*flip,highlight*flip)
+			highlight = highlight ** int(sharpness[j])
+			total += light * (body*diffuse[...,np.newaxis] +
+				specular*highlight[...,np.newaxis])
+
+	colors = base.copy()
+	colors[...,:3] = np.trunc( total * 255 )
+	return colors
+
+def unit( vectors ):
+	""" Returns the given vectors (along the last axis) normalized, leaving
+		vectors of length zero as they are
+	"""
+	length = np.sqrt( (vectors*vectors).sum(axis=-1) )[...,np.newaxis]
+	return vectors / np.where( length != 0, length, 1 )
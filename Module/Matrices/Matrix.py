@@ -46,7 +46,10 @@ class ViewTransformationMatrix(ModuleElement):
 		Getters and setters are not provided as there are no side-effects associated
 		with simply pulling a value or assigning it to the internal transformation.
 		Where links to that transform should not be assigned, direct access
-		is encouraged in this setting.
+		is encouraged in this setting. The methods that change the transformation
+		(and item assignment) dirty the matrix, so that the modules carrying it 
+		drop their compiled render lists; code assigning the transform directly
+		should call _dirty itself.
 		
 		I probably should have done my algebra a little better to avoid weird
 		transpositions in a few functions. Fixme.Also, Vtm, Ltm, Gtm, etc.,
@@ -68,10 +71,12 @@ class ViewTransformationMatrix(ModuleElement):
 	def clear( self ):
 		""" Clears the transformation """
 		self.transform = zeros(4)
+		self._dirty()
 		
 	def identity( self ):
 		""" Sets the transformation to the identity."""
 		self.transform = id(4)
+		self._dirty()
 		
 	def copy( self ):
 		""" Returns a copy of the matrix transformation """
@@ -80,10 +85,12 @@ class ViewTransformationMatrix(ModuleElement):
 	def transpose( self ):
 		""" Transposes the transformation """
 		self.transform = self.transform.transpose()
+		self._dirty()
 		
 	def multiply( self, matrix ):
 		""" Multiplies the transform by the given matrix """
 		self.transform = matrix.dot(self.transform)
+		self._dirty()
 		
 	def form_point( self, point ):
 		""" Solves mtx * point = X for the given point and transformation
@@ -141,11 +148,13 @@ class ViewTransformationMatrix(ModuleElement):
 		""" Premultiply the matrix by a scale matrix parametrized by sx and sy """
 		self.transform = array([ [sx,0,0,0],[0,sy,0,0],[0,0,1,0],
 			[0,0,0,1] ]).dot( self.transform )
+		self._dirty()
 	
 	def scale( self, sx, sy, sz ):
 		""" Premultiply the matrix by a scale matrix """
 		self.transform = array([ [sx,0,0,0],[0,sy,0,0],[0,0,sz,0],
 			[0,0,0,1] ]).dot( self.transform )
+		self._dirty()
 
 			
 	def rotateZ( self, cth, sth ):
@@ -155,6 +164,7 @@ class ViewTransformationMatrix(ModuleElement):
 		"""
 		self.transform = array([[cth,-sth,0,0],[sth,cth,0,0],[0,0,1,0],
 			[0,0,0,1]]).dot(self.transform)
+		self._dirty()
 			
 	def translate2D( self, tx, ty ):
 		""" Premultiply the matrix by a 2D translation matrix parametrized
@@ -162,6 +172,7 @@ class ViewTransformationMatrix(ModuleElement):
 		"""
 		self.transform = array([[1,0,0,tx],[0,1,0,ty],[0,0,1,0],
 			[0,0,0,1]]).dot(self.transform)
+		self._dirty()
 			
 	def shear2D(self,shx,shy):
 		""" Premultiply the transformation by the 2D shear matrix parametrized 
@@ -169,16 +180,19 @@ class ViewTransformationMatrix(ModuleElement):
 		"""
 		self.transform = array([[1,shx,0,0],[shy,1,0,0],[0,0,1,0],
 			[0,0,0,1]]).dot(self.transform)
+		self._dirty()
 			
 	def shearZ( self, shx, shy ):
 		""" Premultiply the matrix b a shear Z matrix parametrized by shx and shy """
 		self.transform = array([[1,0,shx,0],[0,1,shy,0],[0,0,1,0],
 			[0,0,0,1]]).dot(self.transform)
+		self._dirty()
 			
 	def perspective( self, d ):
 		""" Premultiply the matrix by a perspective matrix parameterized by d """
 		self.transform = array([[1,0,0,0],[0,1,0,0],[0,0,1,0],
 			[0,0,1/d,0]]).dot(self.transform)
+		self._dirty()
 
 			
 	def rotateX( self, cth, sth ):
@@ -193,6 +207,7 @@ class ViewTransformationMatrix(ModuleElement):
 		"""
 		self.transform = array([[1,0,0,0],[0,cth,-sth,0],[0,sth,cth,0],
 			[0,0,0,1]]).dot(self.transform)
+		self._dirty()
 			
 	def rotateY( self, cth, sth ):
 		""" Premultiply the matrix by y-axis rotation matrix parametrized by
@@ -202,6 +217,7 @@ class ViewTransformationMatrix(ModuleElement):
 		"""
 		self.transform = array([[cth,0,sth,0],[0,1,0,0],[-sth,0,cth,0],
 			[0,0,0,1]]).dot(self.transform)
+		self._dirty()
 			
 	def rotateXYZ( self, u, v, w ):
 		""" Premultiply the matrix by an xyz-axis rotation matrix parameterized
@@ -209,11 +225,13 @@ class ViewTransformationMatrix(ModuleElement):
 		"""
 		self.transform = array([[u[0],u[1],u[2],0],[v[0],v[1],v[2],0],
 							[w[0],w[1],w[2],0],[0,0,0,1]]).dot(self.transform)
+		self._dirty()
 							
 	def translate( self, tx, ty, tz ):
 		""" Translates the internalized transform about the given axes """
 		self.transform = array([[1,0,0,tx],[0,1,0,ty],[0,0,1,tz],
 			[0,0,0,1]]).dot(self.transform)
+		self._dirty()
 			
 	@Overrides(ModuleElement)
 	def apply_to_scene( self, environment ):
@@ -238,6 +256,7 @@ class ViewTransformationMatrix(ModuleElement):
 	def __setitem__( self, indices, values ):
 		""" Supports direct transformation item assignment """
 		self.transform[indices] = values
+		self._dirty()
 
 class IdentityMatrix( ViewTransformationMatrix ):
 	""" This matrix is the same as its parent Matrix class, except that
@@ -6,19 +6,18 @@
 """
 
 from Module.Shapes.Shape import NULL_SHAPE
+from Module.Shapes.IndexedMesh import IndexedMesh
 from Module.Matrices.Matrix import ViewTransformationMatrix, IdentityMatrix
 from Module.Lighting.DrawState import DrawState
 import numpy as np
 
 from Module.ModuleElement import ModuleElement
+from Module.RenderList import RenderList
 from Module.ClassUtils import Overrides
-
-from tkinter.ttk import Progressbar, Label
-from tkinter import Toplevel
+from Module.Visitors.MergeVisitor import MergeVisitor
 
 import Lilac
 from random import randint
-import time
 
 class Module(ModuleElement):
 	""" This class holds any element that can be iteratively added to the scene.
@@ -26,6 +25,8 @@ class Module(ModuleElement):
 		ModuleElement
 	"""
 	__id__ = 0
+	__render_list__ = None # class-level default for unpickled modules
+	cull_back_faces = None # inherited from the parent unless set
 	
 	def __init__( self ):
 		ModuleElement.__init__(self)
@@ -38,33 +39,88 @@ class Module(ModuleElement):
 	def draw_to_image( self, ltk, view_transformation_matrix = ViewTransformationMatrix(), 
 			global_transformation_matrix = ViewTransformationMatrix(),
 			draw_state = None, lighting = None):
-		""" The call to a top-level module that iterates through its elements
-			and requests that they modify the scene environment in some way.
+		""" The call to a top-level module that draws its elements onto the
+			image.
 			
-			This method sets up the environment that module elements are allowed
-			to modify. In the case of shapes, this modification would be a
-			change in pixel values; in the case of camera changes, the change might
-			be of a rotation to the VTM.
+			The module is compiled into a render list (see compile) the first
+			time it is drawn, and again only when it or one of its descendants
+			has been dirtied since it was last compiled, which drops the list
+			(see _dirty); otherwise the recorded list is simply replayed under
+			the given view and global transformations.
 		"""
+		render_list = self.__render_list__
+		signature = (id(self.__elements__),len(self.__elements__),id(draw_state))
+		if render_list is None or render_list.signature != signature:
+			render_list = self.__render_list__ = self.compile( draw_state )
+			render_list.signature = signature
+		render_list.draw( ltk, view_transformation_matrix, 
+			global_transformation_matrix, lighting )
+		
+	def compile( self, draw_state = None ):
+		""" Flattens the module into a RenderList.
 		
-		# set up the drawing environment
-		local_transformation_matrix = ViewTransformationMatrix()
-		environment = locals()
-		Lilac.set_polygon_fill(ltk.fill)
-		[ shape.apply_to_scene( environment ) for shape in self.__elements__ ]
+			The tree is walked once with a compile environment that the
+			elements modify as they would while drawing; shapes are recorded
+			with the transformation and draw state in effect where they are
+			found, rather than drawn, and runs of plain polygons are then
+			packed into batches.
+			
+			The elements are cleaned once they are compiled, so that any later
+			change to one of them, even one that was already dirty, is 
+			propagated up to drop the list again.
+		"""
+		if draw_state is None: draw_state = DrawState()
+		environment = { 'local_transformation_matrix' : ViewTransformationMatrix(),
+			'global_transformation_matrix' : ViewTransformationMatrix(),
+			'draw_state' : draw_state.copy(), 'polygon_id' : None,
+			'cull_back_faces' : bool(self.cull_back_faces) }
+		render_list = RenderList()
+		self.__adopt_elements()
+		[ element._compile( environment, render_list ) for element in self.__elements__ ]
+		[ element._clean() for element in self.__elements__ ]
+		render_list.batch_polygons()
+		return render_list
 	
 	@Overrides(ModuleElement)
 	def apply_to_scene( self, environment ):
 		""" Applies this module to the environment """
 		if self.ignore: return
-		(gtm,ltm) = (environment[key] for key in ('global_transformation_matrix',
-			'local_transformation_matrix'))
+		render_list = RenderList()
+		self._compile( dict( environment, global_transformation_matrix = 
+			ViewTransformationMatrix() ), render_list )
+		render_list.batch_polygons()
+		(ltk,vtm,gtm,l) = (environment[key] for key in ('ltk',
+			'view_transformation_matrix','global_transformation_matrix','lighting'))
+		render_list.draw( ltk, vtm, gtm, l )
+		
+	@Overrides(ModuleElement)
+	def _compile( self, environment, render_list ):
+		""" Records the elements of this module into the render list under
+			a copy of the environment, so that their changes do not leak to
+			the parent.
+		"""
+		if self.ignore: return
+		(gtm,ltm,ds) = (environment[key] for key in ('global_transformation_matrix',
+			'local_transformation_matrix','draw_state'))
 		new_gtm = ViewTransformationMatrix()
 		new_gtm.transform = np.dot(gtm.transform,ltm.transform)
-		(ltk,vtm,ds,l) = (environment[key] for key in ('ltk',
-			'view_transformation_matrix', 'draw_state','lighting'))
-		Lilac.set_polygon_id( randint(1,10000) )
-		self.draw_to_image( ltk, vtm, new_gtm, ds.copy(), l )		
+		cull_back_faces = environment.get('cull_back_faces',False) \
+			if self.cull_back_faces is None else self.cull_back_faces
+		local_environment = { 'local_transformation_matrix' : ViewTransformationMatrix(),
+			'global_transformation_matrix' : new_gtm,
+			'draw_state' : ds.copy(), 'polygon_id' : randint(1,10000),
+			'cull_back_faces' : cull_back_faces }
+		render_list.open_span()
+		self.__adopt_elements()
+		[ element._compile( local_environment, render_list ) for element in self.__elements__ ]
+		render_list.close_span()
+		
+	def __adopt_elements( self ):
+		""" Makes the module an observer of each of its elements, so that 
+			their changes propagate upward. This also covers elements placed 
+			into the element list directly, rather than with add_element.
+		"""
+		[ element._add_observer( self._dirty ) for element in self.__elements__ ]
 
 	def add_shape( self, shape ):
 		""" Attempts to add the given shape to the module. Returns it for
@@ -72,6 +128,8 @@ class Module(ModuleElement):
 		"""
 		if shape.coordinates is not None:
 			self.__elements__.append( shape )
+			shape._add_observer( self._dirty )
+			self._dirty()
 			return shape
 		else:
 			raise ShapeImposterException("All shape classes must have coordinates")	
@@ -80,15 +138,17 @@ class Module(ModuleElement):
 		""" Adds a non-shape element to the module """
 		if element == self: raise MobiusModulusException("Modules cannot be self-referential")
 		self.__elements__.append( element )
+		element._add_observer( self._dirty )
+		self._dirty()
 		return element
 	
 	@Overrides(ModuleElement)
-	def _is_dirty( self ):
+	def _dirty( self ):
+		""" Drops the compiled render list, which no longer matches the
+			module, and sets the dirty flag
 		"""
-			Returns True if any of the elements are dirty and necessitate 
-			a redraw
-		"""
-		return any((el._is_dirty() for el in self.__elements__))
+		self.__render_list__ = None
+		ModuleElement._dirty(self)
 		
 	@Overrides(ModuleElement)
 	def _clean( self ):
@@ -96,6 +156,7 @@ class Module(ModuleElement):
 			Cleans all elements on the canvas, indicating that they do not need
 			to be redrawn
 		"""
+		ModuleElement._clean(self)
 		[ el._clean() for el in self.__elements__ ]
 		
 	def scale( self, sx, sy, sz ):
@@ -108,6 +169,7 @@ class Module(ModuleElement):
 		transform = ViewTransformationMatrix()
 		transform.scale(sx,sy,sz)
 		self.__elements__.append(transform)
+		self._dirty()
 		
 	def rotate( self, cth, sth, axis ):
 		""" Rotates the module along the given axis by the
@@ -119,6 +181,7 @@ class Module(ModuleElement):
 		m = Mtx()
 		{'x':Mtx.rotateX,'y':Mtx.rotateY,'z':Mtx.rotateZ}[axis](m,cth,sth)
 		self.__elements__.append(m)
+		self._dirty()
 		
 	def translate( self, tx, ty, tz ):
 		""" Translates the module by tx, ty, dz, i.e., all shapes
@@ -129,6 +192,7 @@ class Module(ModuleElement):
 		transform = ViewTransformationMatrix()
 		transform.translate(tx,ty,tz)
 		self.__elements__.append(transform)
+		self._dirty()
 		
 	def identity( self ):
 		""" Adds the identity reset matrix to the pipeline,
@@ -136,24 +200,40 @@ class Module(ModuleElement):
 			reset when indicator is reached by the draw queue
 		"""
 		self.__elements__.append(IdentityMatrix())
+		self._dirty()
+
+	def set_back_face_culling( self, cull = True ):
+		""" Sets whether the polygons of this module, and of the modules below
+			it that do not set otherwise, are dropped when they face away from
+			the viewer (see Shape.facing). Only closed surfaces should be 
+			culled; polygons meant to be seen from both sides can be marked
+			two sided instead. None restores inheriting from the parent.
+			Returns the module for chaining.
+		"""
+		self.cull_back_faces = cull
+		self._dirty()
+		return self # for chaining
 
 	def body_color( self, color ):
 		""" Updates the body color of the module for all elements
 			inserted by calls after this call
 		"""
 		self.__elements__.append(DrawState(base_color=color))
+		self._dirty()
 		
 	def surface_color( self, color ):
 		""" Updates the surface color of the module for all elements
 			inserted by calls after this call
 		"""
 		self.__elements__.append(DrawState(surface_color=color))
+		self._dirty()
 		
 	def opacity( self, alpha ):
 		""" Updates the alpha level of the module for all elements inserted
 			by calls after this call
 		"""
 		self.__elements__.append(DrawState(alpha=alpha))
+		self._dirty()
 		
 	def wrap_queue( self ):
 		""" Pushes the module queue so that the last element becomes the first
@@ -161,10 +241,18 @@ class Module(ModuleElement):
 		"""
 		self.__elements__.insert(0,self.__elements__[-1])
 		self.__elements__.pop()
+		self._dirty()
 		
 	def __repr__( self ):
 		""" Returns a concise string representation of the module """
 		return '<'+self.id[0]+' : '+self.id[1]+'>'
+		
+	@Overrides(ModuleElement)
+	def __getstate__( self ):
+		""" Leaves the compiled render list out of pickles """
+		state = ModuleElement.__getstate__(self)
+		state.pop('__render_list__',None)
+		return state
 	
 	@Overrides(ModuleElement)
 	def accept( self, visitor ):
@@ -172,110 +260,67 @@ class Module(ModuleElement):
 		return visitor.visit_module(self)
 		
 	def optimize( self ):
-		""" Looks for patterns that can be consolidated """
-		# fixme: export to visitor pattern
-
-		removed_element_stack = []
-		edited_elements_stack = {}
-		cur_el = 0
-		nex_el = 1
-		cur = self.__elements__[0]
-		while nex_el < len(self.__elements__):
-			# if the same, increment the validator
-			if cur_el == nex_el:
-				nex_el += 1
-				continue				
-				
-			# get the corresponding elements	
-			cur = self.__elements__[cur_el]
-			nex = self.__elements__[nex_el]
-				
-			if not ispoly(cur): # current is not a polygon
-				cur_el += 1
-				nex_el += 1
-				cur = self.__elements__[cur_el]
-			
-			elif not ispoly(nex): # next one is not a polygon
-				cur_el = next_el
-				nex_el += 1
-			else: # both are polygons spaced only by contiguous polygons
-				if not cur_el in edited_elements_stack:
-					# initialize local optimization stacks
-					cur._coordump = [cur.coordinates]
-					cur._normdump = [cur.normals]
-					cur._colordump = [cur.texture]
-					# mark that we've seen this one
-					edited_elements_stack[cur_el] = 1
-
-				cur._coordump.append(nex.coordinates)
-				cur._normdump.append(nex.normals)
-				cur._colordump.append(nex.texture)
-									
-				# save the position of the removed polygon
-				removed_element_stack.append(nex_el) # don't concurrently modify loop
-				
-				nex_el += 1
+		""" Merges runs of compatible polygons of this module and the modules
+			below it into stacked polygons, which are each drawn with one call
+			into the library (see MergeVisitor). Returns the number of draw 
+			calls saved.
+		"""
+		return MergeVisitor().merge( self )
 
-		# consolidate optimized elements
-		for index_of_optimized_item in edited_elements_stack.keys():
-			cur = self.__elements__[index_of_optimized_item]
-			cur.coordinates = np.array(cur._coordump)
-			cur.normals = np.array(cur._normdump)
-			cur.texture = np.array(cur._colordump)
-				
-		# remove consolidated items		
-		for index_of_removed_item in reversed(removed_element_stack):			
-			del self.__elements__[index_of_removed_item] 	
+	def triangulate( self ):
+		""" Replaces the polygons and indexed meshes of this module and of the
+			modules below it with triangles (see Polygon.triangulate), so that
+			each run of them is drawn as one batch of triangles whatever their
+			numbers of vertices. Returns the module for chaining.
+		"""
+		elements = []
+		for element in self.__elements__:
+			if isinstance(element,Module): elements.append( element.triangulate() )
+			elif isinstance(element,IndexedMesh): elements.append( element.triangulate() )
+			elif ispoly(element) and hasattr(element,'triangulate'):
+				elements.extend( element.triangulate() )
+			else: elements.append( element )
+		if len(elements) != len(self.__elements__) or \
+				any( a is not b for a,b in zip(elements,self.__elements__) ):
+			self.__elements__[:] = elements
+			self._dirty()
+		return self # for chaining
 
-	def average_normals( self ):
-		""" Applies Gouraud normalization to the module		
+	def average_normals( self, precision = 1e-6 ):
+		""" Applies Gouraud normalization to the module, i.e., gives every 
+			vertex of its polygons the average of the normals of the polygons
+			that share it.
+			
+			Vertices are welded by hashing their coordinates quantized to the
+			given precision (see IndexedMesh.weld), so the normals are summed
+			in one vectorized pass rather than by comparing every vertex
+			against every other vertex.
 		"""
-		# Set up updater
-		top = Toplevel()
-		pb = Progressbar(top,orient ="horizontal",length = 200, mode ="determinate")
-		pb['maximum'] = len(self.__elements__)
-		pb['value'] = 10
-		pb.grid(row=0,column=0)
-		tx = Label(top)
-		tx.grid(row=1,column=0)
-		top.update_idletasks()
-		top.lift()
-		t0 = time.time()
-				
-		# run the loop, if we're visible and phong shading
-		if not self.invisible == 'gouroud':
-			try:
-				buf = np.array([0,0,0,1])
-				for i,polygon in enumerate(self.__elements__):
-					if not ispoly(polygon): continue
-					polygon._onorms = np.array([polygon.normals.astype(float)+buf for i in range(len(polygon.coordinates))])
-					
-					# Update the user as to what's going on
-					if i % 50 == 0 and i > 0:
-						pb['value'] = i
-						tmp = i/len(self.__elements__)
-						estimation =  int(tmp*(time.time()-t0) * (1-tmp)/tmp)
-						tx.configure(text=str(int(100*i/len(self.__elements__)))+"%"+' Estimated time: '+str(estimation)+'s' )
-						top.update_idletasks()
-						
-					for c,coordinate in enumerate(polygon.coordinates):
-						for j,opolygon in enumerate(self.__elements__):
-							if i == j or not ispoly(opolygon): continue
-							for k,ocoordinate in enumerate(opolygon.coordinates):
-								if all(coordinate == ocoordinate): # same vertex, finally
-									polygon._onorms[c] += (opolygon.normals+buf)
-					polygon._onorms /= polygon._onorms[:,3,None]
-					
-				for polygon in self.__elements__:
-					if ispoly(polygon): 
-						polygon.normals = polygon._onorms
-						del polygon._onorms
-			except IndexError as ie: pass
-		
-		top.destroy()
-		
 		if self.invisible == 'gouroud':
 			self.invisible = False
+			return self # for chaining
+		
+		polygons = [ el for el in self.__elements__ if ispoly(el) and 
+			len(el.coordinates.shape) == 2 ]
+		if not polygons: return self
+		
+		# one row per vertex of every polygon, and the normal it contributes
+		counts = [ len(polygon.coordinates) for polygon in polygons ]
+		vertices = np.concatenate([ polygon.coordinates for polygon in polygons ])
+		contributions = np.concatenate([ np.broadcast_to(polygon.normals,
+			(count,len(polygon.normals)))[:count] if len(polygon.normals.shape) == 1
+			else polygon.normals[:count] for polygon,count in zip(polygons,counts) ])
+		
+		# weld the vertices, then sum and average the normals over each weld
+		(_,weld) = IndexedMesh.weld( vertices, precision )
+		sums = np.zeros((weld.max()+1,4))
+		np.add.at( sums[:,:3], weld, np.asarray(contributions,dtype=float)[:,:3] )
+		sums[:,3] = np.bincount( weld )
+		averages = sums / sums[:,3,None]
+		
+		for polygon,normals in zip(polygons,np.split(averages[weld],np.cumsum(counts)[:-1])):
+			polygon.normals = normals
+		self._dirty()
 		return self # for chaining
 		
 class MobiusModulusException(Exception): pass
@@ -21,19 +21,43 @@ class ModuleElement(object):
 	
 	def __init__( self ):
 		self.__is_dirty = False
+		self.__observers = []
 		self.ignore = False
 		self.quick = False
 		
 	def _is_dirty( self ):
 		""" This should return true whenever the canvas needs to be redrawn
 			due to this element. Individual methods are responsible for setting
-			this flag when they feel it is necessary
+			this flag when they feel it is necessary. As changes propagate 
+			upward (see _dirty), a module is dirty whenever any element below
+			it is, without looking at them.
 		"""
 		return self.__is_dirty
 		
 	def _dirty( self ):
-		""" Sets the dirty flag to true """
+		""" Sets the dirty flag to true. The first time the element is dirtied
+			after it was last cleaned, its observers (the modules that carry
+			it, or an Ltk drawing it) are notified, so that the change
+			propagates upward without anyone polling for it.
+		"""
+		if self.__is_dirty: return
 		self.__is_dirty = True
+		[ observer() for observer in self._observers() ]
+		
+	def _observers( self ):
+		""" Returns the callables notified when the element is dirtied """
+		try:
+			return self.__observers
+		except AttributeError: # for legacy imports
+			self.__observers = []
+			return self.__observers
+		
+	def _add_observer( self, observer ):
+		""" Registers a callable, taking no arguments, to be notified when
+			the element is dirtied
+		"""
+		observers = self._observers()
+		if observer not in observers: observers.append( observer )
 		
 	def _clean( self ):
 		""" Unsets the dirty flag to false """
@@ -50,6 +74,24 @@ class ModuleElement(object):
 			This method must be overwritten by implementing classes
 		"""
 		return
+		
+	def _compile( self, environment, render_list ):
+		""" Records the module element into a render list (see Module.compile).
+			
+			By default an element is treated as drawing state, like a matrix
+			or a draw state: it is applied to the compile environment and the
+			render list is told that the state has changed.
+		"""
+		self.apply_to_scene( environment )
+		render_list.invalidate_state()
+	
+	def __getstate__( self ):
+		""" Leaves the observers out of pickles; modules re-attach themselves
+			when elements are added or compiled
+		"""
+		state = self.__dict__.copy()
+		state.pop('_ModuleElement__observers',None)
+		return state
 	
 	@abstractmethod
 	def accept( self, visitor ): 
@@ -0,0 +1,412 @@
+"""
+	This file contains a class that holds a compiled, flattened form of a
+	Module tree.
+
+	Drawing a Module by walking it means building an environment dictionary,
+	a new transformation matrix and a copy of the draw state for every
+	sub-module, every frame, before a single pixel is touched. The render list
+	does that walk once, when the tree changes, and records each run of shapes
+	together with the transformation and draw state that were in effect when
+	the run was reached. A redraw only iterates over the recorded runs.
+
+	Instances of a shared geometry (see Instance) are gathered into instance
+	sets, which draw the geometry once for all of their instances. Levels of
+	detail (see LevelOfDetail) are gathered into detail sets, which draw one
+	of their levels according to their size on the image.
+
+	The list also records which runs each module of the tree produced. Each
+	module and each run is given a bounding box, computed when the list is
+	first drawn, so that a redraw skips every module and run whose box lies
+	out of view without transforming any of its shapes.
+
+	Date: 10/18/2026
+"""
+
+import Lilac
+import numpy as np
+from Module.Matrices.Matrix import ViewTransformationMatrix
+from Module.Shapes.Shape import Shape
+from Module.Shapes.Polygon import Polygon
+from Module.Shapes.IndexedMesh import IndexedMesh
+
+class RenderGroup:
+	""" A run of consecutive shapes that share a local transformation, a draw
+		state, a polygon identity and whether back faces are culled
+	"""
+
+	def __init__( self, local_transformation_matrix, draw_state, polygon_id,
+			cull_back_faces = False ):
+		""" Initializes an empty group """
+		self.local_transformation_matrix = local_transformation_matrix
+		self.draw_state = draw_state
+		self.polygon_id = polygon_id
+		self.cull_back_faces = cull_back_faces
+		self.shapes = []
+		self.instance_sets = {}
+		self.__transforms = None
+		self.__bounds = False # not yet computed
+		
+	def transforms( self, view_transformation_matrix, global_transformation_matrix ):
+		""" Returns the world (gtm*ltm) and composite (vtm*gtm*ltm) matrices 
+			of the group. They are recomputed only when the view or global
+			transformation differs from the one seen by the previous call.
+		"""
+		(vtm,gtm) = (view_transformation_matrix.transform,
+			global_transformation_matrix.transform)
+		cache = self.__transforms
+		if cache is None or not (np.array_equal(cache[0],vtm) and 
+				np.array_equal(cache[1],gtm)):
+			world = ViewTransformationMatrix()
+			world.transform = gtm.dot(self.local_transformation_matrix.transform)
+			composite = ViewTransformationMatrix()
+			composite.transform = vtm.dot(world.transform)
+			cache = self.__transforms = (vtm.copy(),gtm.copy(),world,composite)
+		return cache[2:]
+
+	def bounds( self ):
+		""" Returns the bounding box of the group's shapes transformed by its
+			local transformation, i.e., in the coordinates of the render list,
+			or None if one of them cannot be bounded. The box is computed 
+			once.
+		"""
+		if self.__bounds is False:
+			boxes = [ shape.bounds() for shape in self.shapes ]
+			self.__bounds = None if not boxes or any(box is None for box in boxes) \
+				else Shape.box( np.array([ Shape.corners(box) for box in boxes ]).dot(
+					self.local_transformation_matrix.transform.transpose()) )
+		return self.__bounds
+
+	def __repr__( self ):
+		""" Returns a concise string representation of the group """
+		return '<RenderGroup : '+str(len(self.shapes))+' shapes>'
+
+class RenderList:
+	""" This class records the shapes of a Module tree in draw order.
+
+		The list is built by Module.compile; shapes are added through
+		add_shape while the tree is walked with a compile environment, and
+		the state elements of the tree (matrices, draw states) call
+		invalidate_state whenever they change that environment.
+	"""
+
+	def __init__( self, signature = None ):
+		""" Initializes an empty render list. The signature is an opaque
+			value used by the owner to recognize when the list is stale.
+		"""
+		self.groups = []
+		self.spans = []
+		self.signature = signature
+		self.__state = None
+		self.__open_spans = []
+		self.__bounded_spans = None
+
+	def invalidate_state( self ):
+		""" Marks that the compile environment has changed, so that the next
+			shape added starts a new group
+		"""
+		self.__state = None
+
+	def open_span( self ):
+		""" Marks the start of the runs of a module (see close_span) """
+		self.invalidate_state()
+		self.__open_spans.append( len(self.groups) )
+		
+	def close_span( self ):
+		""" Marks the end of the runs of the module whose span was last 
+			opened, recording the span so that it can be culled as a whole
+		"""
+		self.invalidate_state()
+		start = self.__open_spans.pop()
+		if len(self.groups) - start > 1:
+			self.spans.append( (start,len(self.groups)) )
+			
+	def bounds( self ):
+		""" Returns the bounding box of everything in the list, or None if
+			something in it cannot be bounded
+		"""
+		boxes = [ group.bounds() for group in self.groups ]
+		if not boxes or any(box is None for box in boxes): return None
+		return Shape.box( np.array(boxes) )
+		
+	def hidden( self, transform, width, height ):
+		""" Returns a boolean mask of the groups that lie out of view under
+			the given transformation (vtm*gtm) of the list's coordinates, 
+			because their own box or the box of a module holding them does
+		"""
+		if self.__bounded_spans is None:
+			boxes = [ group.bounds() for group in self.groups ]
+			spans = [ (start,end) for (start,end) in [ (i,i+1) for i in range(len(boxes)) ]
+				+ self.spans if all( box is not None for box in boxes[start:end] ) ]
+			self.__bounded_spans = (spans, np.array([ Shape.corners( Shape.box(
+				np.array(boxes[start:end]) ) ) for (start,end) in spans ]))
+		(spans,corners) = self.__bounded_spans
+		hidden = np.zeros( len(self.groups), dtype=bool )
+		if not spans: return hidden
+		outside = Shape.outside( corners.dot(transform.transpose()), width, height )
+		for (start,end),out in zip(spans,outside):
+			if out: hidden[start:end] = True
+		return hidden
+			
+	def add_shape( self, shape, environment ):
+		""" Records the shape with the transformation and draw state found in
+			the given compile environment
+		"""
+		self.__group( environment ).shapes.append(shape)
+		
+	def add_instance( self, instance, environment ):
+		""" Records an instance found in the given compile environment. The
+			instances of a geometry that share a draw state and are found
+			under the same environment are gathered into one InstanceSet.
+		"""
+		group = self.__group( environment )
+		key = (id(instance.geometry),id(instance.draw_state))
+		if key not in group.instance_sets:
+			draw_state = environment['draw_state'].copy()
+			if instance.draw_state is not None:
+				instance.draw_state.apply_to_scene( dict( environment, 
+					draw_state = draw_state ) )
+			group.instance_sets[key] = InstanceSet( instance.geometry, draw_state,
+				group.cull_back_faces )
+			group.shapes.append( group.instance_sets[key] )
+		group.instance_sets[key].transforms.append( instance.transform.transform.copy() )
+		
+	def __group( self, environment ):
+		""" Returns the group recording shapes under the given compile
+			environment, starting one if the environment has changed
+		"""
+		if self.__state is None:
+			(gtm,ltm,ds) = (environment[key] for key in ('global_transformation_matrix',
+				'local_transformation_matrix','draw_state'))
+			transform = ViewTransformationMatrix()
+			transform.transform = gtm.transform.dot(ltm.transform)
+			self.__state = RenderGroup( transform, ds.copy(), environment['polygon_id'],
+				environment.get('cull_back_faces',False) )
+			self.groups.append(self.__state)
+		return self.__state
+
+	def batch_polygons( self ):
+		""" Packs the polygons of each group that share a number of vertices 
+			and a normal layout into a single batched polygon (see 
+			Polygon.batch), so that they are drawn with one call into the
+			library. A batch takes the place of its first polygon; since the
+			polygons are depth buffered, only exact depth ties can be drawn
+			differently than in the original order.
+		"""
+		for group in self.groups:
+			shapes = []
+			runs = {}
+			for shape in group.shapes:
+				if isinstance(shape,Polygon) and shape.batchable(group.draw_state):
+					key = (len(shape.coordinates),len(shape.normals.shape),shape.two_sided)
+					if key not in runs:
+						runs[key] = []
+						shapes.append(key)
+					runs[key].append(shape)
+				else:
+					shapes.append(shape)
+			group.shapes = [ shape if not isinstance(shape,tuple) else 
+				runs[shape][0] if len(runs[shape]) == 1 else
+				Polygon.batch(runs[shape],group.draw_state) for shape in shapes ]
+	
+	def draw( self, ltk, view_transformation_matrix, global_transformation_matrix,
+			lighting ):
+		""" Draws every recorded shape onto the image of the given Ltk.
+		
+			Besides the usual keys, the environment handed to the shapes holds
+			the group's 'world_transformation_matrix' (gtm*ltm) and 
+			'composite_transformation_matrix' (vtm*gtm*ltm), so that shapes 
+			transform each vertex once rather than once per matrix.
+		"""
+		environment = { 'ltk' : ltk, 'lighting' : lighting,
+			'view_transformation_matrix' : view_transformation_matrix,
+			'global_transformation_matrix' : global_transformation_matrix }
+		Lilac.set_polygon_fill(ltk.fill)
+		hidden = self.hidden( view_transformation_matrix.transform.dot(
+			global_transformation_matrix.transform ), *ltk.config('width','height') )
+		polygon_id = None
+		for group,out in zip(self.groups,hidden):
+			if out: continue
+			if group.polygon_id is not None and group.polygon_id != polygon_id:
+				polygon_id = group.polygon_id
+				Lilac.set_polygon_id( polygon_id )
+			environment['local_transformation_matrix'] = group.local_transformation_matrix
+			environment['draw_state'] = group.draw_state
+			environment['cull_back_faces'] = group.cull_back_faces
+			(environment['world_transformation_matrix'],
+				environment['composite_transformation_matrix']) = group.transforms(
+					view_transformation_matrix, global_transformation_matrix )
+			for shape in group.shapes:
+				shape.apply_to_scene( environment )
+
+	def num_faces( self ):
+		""" Returns the number of polygons in the list, counting the faces of
+			meshes and the polygons of every instance
+		"""
+		count = 0
+		for shape in (shape for group in self.groups for shape in group.shapes):
+			if isinstance(shape,(InstanceSet,DetailSet)): count += shape.num_faces()
+			elif isinstance(shape,IndexedMesh): count += len(shape.faces)
+			elif isinstance(shape,Polygon): count += len(shape.coordinates) \
+				if len(shape.coordinates.shape) == 3 else 1
+		return count
+
+	def __len__( self ):
+		""" Returns the number of recorded shapes, counting a batch as one """
+		return sum(len(group.shapes) for group in self.groups)
+
+class InstanceSet:
+	""" The instances of a geometry gathered by a render list. The geometry 
+		is compiled once, under the draw state of the instances; its 
+		polygons and indexed meshes are then drawn for every instance in a 
+		single call, and its other shapes once per instance.
+	"""
+	
+	def __init__( self, geometry, draw_state, cull_back_faces = False ):
+		""" Initializes an empty set of instances of the geometry """
+		self.geometry = geometry
+		self.transforms = []
+		self.__bounds = False # not yet computed
+		self.render_list = RenderList()
+		identity = lambda : ViewTransformationMatrix()
+		geometry._compile( { 'local_transformation_matrix' : identity(),
+			'global_transformation_matrix' : identity(), 
+			'draw_state' : draw_state, 'polygon_id' : None,
+			'cull_back_faces' : cull_back_faces }, self.render_list )
+		self.render_list.batch_polygons()
+		
+	def bounds( self ):
+		""" Returns the bounding box of all of the instances, or None if the
+			geometry cannot be bounded
+		"""
+		if self.__bounds is False:
+			box = self.render_list.bounds()
+			self.__bounds = None if box is None else Shape.box( np.einsum( 'kij,vj->kvi',
+				np.array(self.transforms), Shape.corners(box) ) )
+		return self.__bounds
+		
+	def num_faces( self ):
+		""" Returns the number of polygons drawn for all of the instances """
+		return len(self.transforms) * self.render_list.num_faces()
+		
+	def apply_to_scene( self, environment ):
+		""" Draws the instances. The environment is that of the group 
+			holding the set, as set up by RenderList.draw.
+		"""
+		self.draw( environment, self.transforms )
+		
+	def draw( self, environment, transforms ):
+		""" Draws the geometry under each of the given transformations, which
+			are relative to the world transformation of the environment. 
+			Instance sets within the geometry are drawn under the product of
+			their transformations and these, so that their polygons are also 
+			drawn for every instance in a single call.
+		"""
+		(ltk,lighting,vtm,ltm,wtm,ctm) = (environment[key] for key in ('ltk',
+			'lighting','view_transformation_matrix','local_transformation_matrix',
+			'world_transformation_matrix','composite_transformation_matrix'))
+		for group in self.render_list.groups:
+			ds = group.draw_state
+			matrices = [ transform.dot(group.local_transformation_matrix.transform) 
+				for transform in transforms ]
+			for shape in group.shapes:
+				if isinstance(shape,InstanceSet):
+					shape.draw( environment, [ matrix.dot(transform) 
+						for matrix in matrices for transform in shape.transforms ] )
+					continue
+				polygon = InstanceSet.stack( shape, ds, matrices, 
+					ctm.transform if group.cull_back_faces else None )
+				if polygon is not None:
+					polygon.expand_application( ltk, ds, lighting, polygon, wtm, ctm )
+					continue
+				for matrix in matrices:
+					local = ViewTransformationMatrix()
+					local.transform = ltm.transform.dot(matrix)
+					world = ViewTransformationMatrix()
+					world.transform = wtm.transform.dot(matrix)
+					composite = ViewTransformationMatrix()
+					composite.transform = vtm.transform.dot(world.transform)
+					shape.apply_to_scene( dict( environment, draw_state = ds, 
+						cull_back_faces = group.cull_back_faces,
+						local_transformation_matrix = local, 
+						world_transformation_matrix = world,
+						composite_transformation_matrix = composite ) )
+					
+	@staticmethod
+	def stack( shape, draw_state, matrices, transform = None ):
+		""" Returns a batched polygon (see Polygon.batch) holding a copy of 
+			the polygons of the shape transformed by each of the given 
+			matrices, or None if the shape cannot be drawn as a batch.
+			
+			If the composite transformation of the matrices is given, the
+			polygons that face away from the viewer (see Shape.facing) are
+			left out. They are found in the shape's own coordinates, since
+			normals are transformed as points.
+		"""
+		if isinstance(shape,IndexedMesh) and shape.batchable(draw_state):
+			polygon = shape.batch( draw_state )
+		elif isinstance(shape,Polygon) and len(shape.coordinates.shape) == 3:
+			polygon = shape
+		elif isinstance(shape,Polygon) and shape.batchable(draw_state):
+			polygon = Polygon.batch( [shape], draw_state )
+		else:
+			return None
+		matrices = np.array(matrices)
+		coordinates = np.einsum('kij,nvj->knvi',matrices,polygon.coordinates)
+		normals = np.einsum('kij,n...j->kn...i',matrices,polygon.normals)
+		colors = polygon.colors( draw_state )
+		texture = np.broadcast_to(colors,(len(matrices),)+colors.shape)
+		flatten = lambda array : array.reshape((-1,)+array.shape[2:])
+		if transform is not None and not polygon.two_sided:
+			facing = np.array([ Shape.facing( polygon.coordinates, polygon.normals,
+				transform.dot(matrix) ) for matrix in matrices ])
+			flatten = lambda array : array[facing]
+		return Polygon( coords = flatten(coordinates), normals = flatten(normals),
+			texture = flatten(texture), two_sided = polygon.two_sided )
+
+class DetailSet:
+	""" The levels of a LevelOfDetail gathered by a render list, ordered 
+		from the coarsest to the finest. Each level is compiled once. When 
+		drawn, the set measures the radius of its bounding box on the image 
+		and draws the coarsest level whose radius limit is not exceeded.
+	"""
+	
+	def __init__( self, levels, draw_state, radii = None, tolerance = 8,
+			cull_back_faces = False ):
+		""" Initializes the set. The radii are the largest projected radii, 
+			in pixels, at which each level is drawn; the finest level is 
+			drawn beyond them all. If they are not given, a level is drawn 
+			while its faces are roughly at most tolerance pixels across, i.e.,
+			while the radius is at most tolerance*sqrt(F)/2 for F faces.
+		"""
+		self.levels = [ InstanceSet( level, draw_state, cull_back_faces ) for level in levels ]
+		[ level.transforms.append( np.identity(4) ) for level in self.levels ]
+		self.radii = list(radii) if radii is not None else [ tolerance * 
+			np.sqrt(level.num_faces()) / 2 for level in self.levels ]
+		
+	def bounds( self ):
+		""" Returns the bounding box of the finest level """
+		return self.levels[-1].bounds()
+		
+	def num_faces( self ):
+		""" Returns the number of polygons of the finest level """
+		return self.levels[-1].num_faces()
+		
+	def select( self, composite_transformation_matrix ):
+		""" Returns the index of the level to draw under the given composite
+			transformation. The finest level is drawn if the set cannot be
+			bounded or crosses the viewer's plane.
+		"""
+		box = self.bounds()
+		if box is None: return len(self.levels) - 1
+		corners = Shape.corners(box).dot( composite_transformation_matrix.transform.transpose() )
+		if np.any(corners[:,3] <= 0): return len(self.levels) - 1
+		(x,y) = (corners[:,0]/corners[:,3], corners[:,1]/corners[:,3])
+		radius = max( x.max() - x.min(), y.max() - y.min() ) / 2
+		for i,limit in enumerate(self.radii):
+			if radius <= limit: return i
+		return len(self.levels) - 1
+		
+	def apply_to_scene( self, environment ):
+		""" Draws the level suited to the size of the set on the image """
+		level = self.select( environment['composite_transformation_matrix'] )
+		self.levels[level].apply_to_scene( environment )
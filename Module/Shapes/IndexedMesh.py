@@ -0,0 +1,222 @@
+"""
+	This file contains an IndexedMesh class, a polygonal mesh whose faces
+	share their vertices.
+
+	A mesh built from Polygons stores every vertex once per face that uses it,
+	along with a normal array and a Python object per face. The indexed mesh
+	stores one array of vertices, one of vertex normals and optionally one of
+	vertex texture coordinates, and describes its faces as rows of indices
+	into them. It is drawn with a single batched call into the library.
+
+	Date: 10/18/2026
+"""
+
+import numpy as np
+from Module.Shapes.Shape import Shape
+from Module.Shapes.Polygon import Polygon
+from Module.ClassUtils import Overrides
+
+class IndexedMesh(Shape):
+	""" This class defines a mesh of faces with V vertices each, given as
+		an FxV int32 array of indices into an Nx4 array of vertices
+	"""
+	two_sided = False # class-level default for legacy imports
+
+	def __init__( self, vertices = np.zeros((0,4)), faces = np.zeros((0,3)),
+			normals = None, uvs = None, color = [0,0,0,0], colors = None,
+			two_sided = False ):
+		""" Initializes the mesh.
+
+			Arguments:
+				- vertices : the Nx4 homogeneous vertices
+				- faces : the FxV indices of the vertices of each face
+				- normals : the Nx4 vertex normals; averaged from the faces if
+					not given (see vertex_normals)
+				- uvs : optional Nx2 texture coordinates, in anchor units
+					(0 to 255), used when the mesh is drawn with a texture
+				- color : the color of the mesh, overridden by the draw state
+				- colors : optional Fx4 face colors, or FxVx4 colors of the
+					corners of each face, which override the draw state as a
+					polygon's texture does
+				- two_sided : whether the faces are kept when seen from behind
+					(see Polygon)
+		"""
+		Shape.__init__(self)
+		self.coordinates = np.asarray(vertices,dtype=float)
+		self.faces = np.asarray(faces,dtype=np.int32)
+		self.normals = IndexedMesh.vertex_normals(self.coordinates,self.faces) \
+			if normals is None else np.asarray(normals,dtype=float)
+		self.uvs = uvs if uvs is None else np.asarray(uvs,dtype=int)
+		self.color = color
+		self.colors = colors if colors is None else np.asarray(colors,dtype=float)
+		self.two_sided = two_sided
+
+	@property
+	def vertices( self ):
+		""" The vertices of the mesh, an alias of its coordinates """
+		return self.coordinates
+
+	@Overrides(Shape)
+	def apply_to_scene( self, environment ):
+		""" Draws the mesh onto a canvas. When a texture or bump map is to be
+			applied and the mesh has texture coordinates, the faces are drawn
+			one at a time as textured polygons; otherwise the whole mesh is
+			drawn in one batch.
+		"""
+		if len(self.faces) == 0: return
+		(ltk,ds,lighting) = (environment[key] for key in ('ltk','draw_state','lighting'))
+		(wtm,ctm) = (environment[key] for key in ('world_transformation_matrix',
+			'composite_transformation_matrix'))
+
+		if ltk.texture and not self.batchable(ds):
+			[ polygon.apply_to_scene(environment) for polygon in self.polygons() ]
+			return
+
+		batch = self.batch( ds )
+		batch.expand_application( ltk,ds,lighting,batch,wtm,ctm,
+			environment.get('cull_back_faces',False) )
+
+	@Overrides(Shape)
+	def bounds( self ):
+		""" Returns the bounding box of the mesh's vertices """
+		return Shape.box( self.coordinates ) if len(self.coordinates) else None
+		
+	def batchable( self, draw_state ):
+		""" Returns True if the mesh can be drawn in one batch under the given
+			draw state, i.e., unless it is to be textured
+		"""
+		return self.uvs is None or (draw_state['texture'] == [None, None] and
+			draw_state['bumpmap'] == [None, None])
+			
+	def batch( self, draw_state ):
+		""" Expands the mesh into a polygon whose coordinates are an FxVx4
+			array, as packed by Polygon.batch, with its colors resolved against
+			the given draw state
+		"""
+		coordinates = self.coordinates[self.faces]
+		color = draw_state['base_color']
+		if color == [None]: color = self.color
+		colors = np.asarray(color,dtype=float)[np.newaxis] if self.colors is None \
+			else self.colors
+		if colors.ndim != 3:
+			colors = np.repeat( np.broadcast_to(colors,(len(self.faces),4))[:,np.newaxis],
+				self.faces.shape[1], axis=1 )
+		return Polygon( coords = coordinates, normals = self.normals[self.faces],
+			texture = colors, two_sided = self.two_sided )
+
+	def polygons( self ):
+		""" Returns the faces of the mesh as a list of Polygons """
+		polygons = []
+		for i,face in enumerate(self.faces):
+			anchor = None if self.uvs is None else np.column_stack(( self.uvs[face],
+				-np.ones((len(face),2),dtype=int) )).flatten()
+			texture = [] if self.colors is None else self.colors[i]
+			polygons.append( Polygon( coords = self.coordinates[face],
+				color = self.color, normals = self.normals[face], texture = texture,
+				anchor = anchor, two_sided = self.two_sided ) )
+		return polygons
+
+	def triangulate( self ):
+		""" Returns the mesh with each of its faces, which must be convex,
+			fanned into triangles from its first vertex. The vertices are 
+			shared with this mesh.
+		"""
+		num_vertices = self.faces.shape[1]
+		if num_vertices <= 3: return self
+		faces = np.concatenate([ self.faces[:,[0,i,i+1]] for i in range(1,num_vertices-1) ],
+			axis=1).reshape(-1,3)
+		colors = self.colors
+		if colors is not None and colors.ndim == 3:
+			colors = np.concatenate([ colors[:,[0,i,i+1]] for i in range(1,num_vertices-1) ],
+				axis=1).reshape(-1,3,4)
+		elif colors is not None:
+			colors = np.repeat( colors, num_vertices-2, axis=0 )
+		return IndexedMesh( self.coordinates, faces, self.normals, self.uvs, self.color, 
+			colors, self.two_sided )
+
+	@staticmethod
+	def vertex_normals( vertices, faces ):
+		""" Returns Nx4 vertex normals averaged from the normals of the faces
+			that share each vertex. A face's normal follows the right hand
+			rule over its first three vertices.
+		"""
+		normals = np.zeros((len(vertices),4))
+		if len(faces) == 0: return normals
+		corners = vertices[faces[:,:3],:3]
+		face_normals = np.cross( corners[:,1] - corners[:,0], corners[:,2] - corners[:,0] )
+		for column in faces.transpose():
+			np.add.at( normals[:,:3], column, face_normals )
+		length = np.sqrt((normals[:,:3]**2).sum(axis=1))
+		normals[:,:3] /= np.where(length > 0, length, 1)[:,np.newaxis]
+		return normals
+
+	@staticmethod
+	def weld( rows, precision = 1e-6 ):
+		""" Welds the rows of an NxK array that are equal once quantized to
+			the given precision. Returns the indices of the first row of each
+			weld and, for each row, the index of its weld.
+		"""
+		keys = np.round( np.asarray(rows,dtype=float) / precision ).astype(np.int64)
+		(_,first,weld) = np.unique( keys, axis=0, return_index=True, return_inverse=True )
+		return (first,weld.reshape(-1))
+
+	@staticmethod
+	def from_faces( coordinates, normals = None, uvs = None, precision = 1e-6 ):
+		""" Builds a mesh from an FxVx4 array of face coordinates, and
+			optionally FxVx4 normals and FxVx2 texture coordinates for each
+			corner of each face. Corners are welded into shared vertices
+			where all of their attributes agree.
+		"""
+		coordinates = np.asarray(coordinates,dtype=float)
+		(num_faces,num_vertices) = coordinates.shape[:2]
+		rows = [ coordinates.reshape(-1,4) ]
+		if normals is not None: rows.append( np.asarray(normals,dtype=float).reshape(-1,4) )
+		if uvs is not None: rows.append( np.asarray(uvs,dtype=float).reshape(-1,2) )
+		(first,weld) = IndexedMesh.weld( np.hstack(rows), precision )
+		return IndexedMesh( vertices = rows[0][first],
+			faces = weld.reshape(num_faces,num_vertices),
+			normals = None if normals is None else rows[1][first],
+			uvs = None if uvs is None else rows[-1][first] )
+
+	@staticmethod
+	def from_polygons( polygons, precision = 1e-6 ):
+		""" Builds a mesh from polygons with the same number of vertices,
+			keeping their normals, anchors and colors. The colors are kept per
+			face, unless one of the polygons has a texture color per vertex.
+			The polygons are not modified.
+		"""
+		num_vertices = len(polygons[0].coordinates)
+		normals = [ np.broadcast_to(polygon.normals,(num_vertices,4))
+			if len(polygon.normals.shape) == 1 else polygon.normals[:num_vertices]
+			for polygon in polygons ]
+		anchors = [ getattr(polygon,'anchor',None) for polygon in polygons ]
+		uvs = None if any(anchor is None for anchor in anchors) else \
+			[ np.reshape(anchor,(-1,4))[:num_vertices,:2] for anchor in anchors ]
+		mesh = IndexedMesh.from_faces( [ polygon.coordinates for polygon in polygons ],
+			normals, uvs, precision )
+		mesh.color = polygons[0].color
+		if any(len(polygon.texture) != 0 for polygon in polygons):
+			colors = [ np.asarray(polygon.texture if len(polygon.texture) != 0
+				else polygon.color,dtype=float) for polygon in polygons ]
+			if any(color.ndim == 2 for color in colors):
+				colors = [ np.broadcast_to(color,(num_vertices,4)) if color.ndim == 1
+					else color[:num_vertices] for color in colors ]
+			mesh.colors = np.array(colors)
+		return mesh
+
+	@Overrides(Shape)
+	def copy( self ):
+		""" Returns a deep copy of the mesh """
+		return IndexedMesh( self.coordinates.copy(), self.faces.copy(),
+			self.normals.copy(), None if self.uvs is None else self.uvs.copy(),
+			self.color[:], None if self.colors is None else self.colors.copy(),
+			self.two_sided )
+
+	@Overrides(Shape)
+	def accept( self, visitor ):
+		""" Implements the visitor pattern for this mesh """
+		return visitor.visit_mesh(self)
+
+	def __repr__( self ):
+		""" Returns a useful representation of this mesh for display """
+		return "<IndexedMesh : "+str(len(self.faces))+" faces>"
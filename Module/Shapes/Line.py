@@ -7,6 +7,7 @@
 
 import numpy as np
 from Module.Shapes.Shape import Shape
+from Module.ClassUtils import Overrides
 import Lilac
 
 class Line(Shape):
@@ -25,14 +26,17 @@ class Line(Shape):
 			s = "Color data must be in rgba form; line shape must be 2 x 4"
 			raise PlanarThinkingException(s)
 	
+	@Overrides(Shape)
+	def bounds( self ):
+		""" Returns the bounding box of the line """
+		return Shape.box( self.coordinates )
+		
 	def apply_to_scene( self, environment ):
 		""" Draws the line onto a canvas """
 		ltk = environment['ltk']
 
-		# transform the polygon from world coordinates to scene coordinates
-		line = environment['local_transformation_matrix'].form_line( self )
-		line = environment['global_transformation_matrix'].form_line( line )
-		line = environment['view_transformation_matrix'].form_line( line )
+		# transform the line from world coordinates to scene coordinates
+		line = environment['composite_transformation_matrix'].form_line( self )
 		line.homoginize()
 		
 		coords = line.coordinates.astype(int)
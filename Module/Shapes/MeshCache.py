@@ -0,0 +1,110 @@
+"""
+	This file contains a persistent cache for the arrays of generated meshes.
+
+	Generators look their meshes up by the name of the generator, the
+	parameters it was given and a version number that the generator bumps
+	whenever its output changes. The key is hashed into the name of a
+	directory in which each array is stored as a .npy file, and arrays are
+	loaded back memory-mapped, so a cached mesh costs a few page faults
+	rather than a regeneration or an unpickling. The most recently used
+	entries are also kept in memory.
+
+	The cache is best effort: if the directory cannot be written the meshes
+	are simply regenerated, and an unreadable entry is regenerated and
+	replaced.
+
+	Date: 10/18/2026
+"""
+
+import os
+import shutil
+import hashlib
+from collections import OrderedDict
+import numpy as np
+
+# the default cache lives with the package's objects, wherever it is run from
+cache_directory = os.path.join( os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+	'Objects', 'cache' )
+
+class MeshCache:
+	""" This class caches dictionaries of named arrays on disk, keyed by
+		(generator, parameters, version), with LRU eviction in memory
+	"""
+
+	def __init__( self, directory = cache_directory, capacity = 16 ):
+		""" Initializes a cache storing its entries in the given directory
+			(by default Module/Objects/cache, found from this file rather than
+			the working directory) and keeping at most capacity entries in 
+			memory
+		"""
+		self.directory = directory
+		self.capacity = capacity
+		self.__entries = OrderedDict()
+
+	@staticmethod
+	def key( generator, parameters, version ):
+		""" Returns the content address of a mesh: a hash of the generator,
+			its parameters (in sorted order) and its version
+		"""
+		description = repr(( generator, sorted(parameters.items()), version ))
+		return hashlib.sha1( description.encode('utf-8') ).hexdigest()
+
+	def fetch( self, generator, parameters, version, build ):
+		""" Returns the arrays of the given mesh. They are looked up in
+			memory, then on disk, and are otherwise produced by calling build,
+			which must return a dictionary of numpy arrays, and stored.
+
+			The returned arrays are shared by everyone who fetches the mesh.
+			They are read-only, and must be copied before they are modified.
+		"""
+		key = MeshCache.key( generator, parameters, version )
+		if key in self.__entries:
+			self.__entries.move_to_end( key )
+			return self.__entries[key]
+
+		arrays = self.__load( key )
+		if arrays is None:
+			arrays = build()
+			self.__store( key, arrays )
+			[ array.setflags( write = False ) for array in arrays.values() ]
+
+		self.__entries[key] = arrays
+		while len(self.__entries) > self.capacity:
+			self.__entries.popitem( last = False )
+		return arrays
+
+	def clear( self ):
+		""" Forgets the entries held in memory; the disk is left alone """
+		self.__entries.clear()
+
+	def __load( self, key ):
+		""" Returns the memory-mapped arrays of an entry on disk, or None if
+			there is no readable entry
+		"""
+		path = os.path.join( self.directory, key )
+		try:
+			return { name[:-4] : np.load( os.path.join(path,name), mmap_mode='r' )
+				for name in os.listdir(path) if name.endswith('.npy') } or None
+		except (OSError, ValueError):
+			return None
+
+	def __store( self, key, arrays ):
+		""" Writes the arrays of an entry to disk. The entry is written under
+			a temporary name and renamed into place, so that readers never
+			see a partial entry; the temporary entry is removed if it cannot
+			be.
+		"""
+		path = os.path.join( self.directory, key )
+		staging = path + '.' + str(os.getpid())
+		try:
+			os.makedirs( staging, exist_ok = True )
+			for name,array in arrays.items():
+				np.save( os.path.join(staging,name+'.npy'), np.ascontiguousarray(array) )
+			if os.path.isdir( path ): # replace an unreadable entry
+				[ os.remove(os.path.join(path,name)) for name in os.listdir(path) ]
+				os.rmdir( path )
+			os.rename( staging, path )
+		except OSError:
+			shutil.rmtree( staging, ignore_errors = True )
+
+mesh_cache = MeshCache()
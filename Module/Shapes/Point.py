@@ -28,9 +28,7 @@ class Point(Shape):
 
 		# transform the polygon from world coordinates to scene coordinates
 		if self.__dt__:
-			pnt = environment['local_transformation_matrix'].form_point( self )
-			pnt = environment['global_transformation_matrix'].form_point( pnt )
-			pnt = environment['view_transformation_matrix'].form_point( pnt )
+			pnt = environment['composite_transformation_matrix'].form_point( self )
 			pnt.homoginize()
 		else: pnt = self
 		
@@ -28,13 +28,13 @@ class PointCloud(Shape):
 		
 		ltk = environment['ltk']
 
-		# transform the polygon from world coordinates to scene coordinates
-		environment['local_transformation_matrix'].form_pointcloud( self )
-		environment['global_transformation_matrix'].form_pointcloud( self )
-		environment['view_transformation_matrix'].form_pointcloud( self )
-		self.homoginize()
-		
-		coords = self.coordinates.astype(int)
+		# transform a copy of the cloud from world coordinates to scene 
+		# coordinates, leaving the cloud itself untouched
+		coords = self.coordinates.dot(environment[
+			'composite_transformation_matrix'].transform.transpose())
+		coords[:,:2] /= coords[:,3,np.newaxis]
+		coords[:,2] *= -1
+		coords = coords.astype(int)
 		
 		Lilac.create_point_cloud(ltk.config('pixels'),coords,self.color,
 							self.radii)	
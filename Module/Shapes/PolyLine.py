@@ -10,6 +10,7 @@
 
 import numpy as np
 from Module.Shapes.Shape import Shape
+from Module.ClassUtils import Overrides
 import Lilac
 
 class PolyLine(Shape):
@@ -28,14 +29,17 @@ class PolyLine(Shape):
 			s = "Color data must be in rgba form; points in line must be dim 4"
 			raise PolygomousLinearityException(s)
 	
+	@Overrides(Shape)
+	def bounds( self ):
+		""" Returns the bounding box of the lines """
+		return Shape.box( np.vstack(( self.coordinates, self.coordinates_ends )) )
+		
 	def apply_to_scene( self, environment ):
 		""" Draws the polyline onto a canvas """
 		ltk = environment['ltk']
 
-		# transform the polygon from world coordinates to scene coordinates
-		line = environment['local_transformation_matrix'].form_polyline( self )
-		line = environment['global_transformation_matrix'].form_polyline( line )
-		line = environment['view_transformation_matrix'].form_polyline( line )
+		# transform the polyline from world coordinates to scene coordinates
+		line = environment['composite_transformation_matrix'].form_polyline( self )
 		line.homoginize()
 		
 		coords = line.coordinates.astype(int)
@@ -9,6 +9,7 @@ import numpy as np
 from Module.Shapes.Shape import Shape
 import Lilac
 from Module.ClassUtils import Overrides
+from Module.Lighting.Shading import shade
 
 overwrite = {}
 
@@ -17,17 +18,21 @@ class Polygon(Shape):
 	
 	__texture__ = 0
 	__bump__ = 0
+	two_sided = False # class-level default for legacy imports
 	 
 	def __init__( self, coords = np.array([[0,0,0,1]]),
 						color = [0,0,0,0], normals = np.array([0,0,0,1]),
-						texture=[], anchor=None):
-		""" Initializes the polygon """
+						texture=[], anchor=None, two_sided=False):
+		""" Initializes the polygon. A two sided polygon is never culled as a
+			back face (see Shape.facing), e.g., a wing seen from either side.
+		"""
 		Shape.__init__(self)
 		self.coordinates = coords
 		self.color = color
 		self.normals = normals
 		self.texture = texture
 		self.anchor = anchor
+		self.two_sided = two_sided
 						
 
 	@Overrides(Shape)			
@@ -40,16 +45,27 @@ class Polygon(Shape):
 			self.anchor = None
 		
 		(ltk,ds,lighting) = (environment[key] for key in ('ltk','draw_state','lighting'))
-		poly = self.copy()
-		(ltm,gtm,vtm) = (environment[key] for key in ('local_transformation_matrix',
-			'global_transformation_matrix','view_transformation_matrix'))
+		(wtm,ctm) = (environment[key] for key in ('world_transformation_matrix',
+			'composite_transformation_matrix'))
 
+		cull_back_faces = environment.get('cull_back_faces',False)
 		if len(self.coordinates.shape) != 2:
-			return self.expand_application( ltk,ds,lighting,poly,ltm,gtm,vtm)
-			
+			return self.expand_application( ltk,ds,lighting,self,wtm,ctm,cull_back_faces)
+		
+		# cull the polygon in canonical view space before it is lit or scanned
+		width,height = ltk.config('width','height')
+		(visible,coordinates) = Shape.cull( self.coordinates.dot(
+			ctm.transform.transpose())[np.newaxis], width, height )
+		if not visible[0]: return
+		if cull_back_faces and not self.two_sided and not Shape.facing( 
+				self.coordinates[np.newaxis], np.asarray(self.normals)[np.newaxis], 
+				ctm.transform )[0]:
+			return
+		
 		# transform the polygon from world coordinates to scene coordinates
-		ltm.form_polygon( poly )
-		gtm.form_polygon( poly )
+		poly = Polygon( coords = self.coordinates, color = self.color,
+			normals = self.normals, texture = self.texture )
+		wtm.form_polygon( poly )
 		
 		# color precedence order is defined, draw-state, texture in ascending
 		Lilac.set_alpha(ds['alpha'][0]) # alpha value for alpha blending
@@ -74,80 +90,183 @@ class Polygon(Shape):
 			
 			Lilac.enable_normal_interpollation( -1, p, len(poly.normals) )
 
-			
-		vtm.form_polygon( poly )
-		poly.homoginize()
-				
-		width,height = ltk.config('width','height')
 		texpack = ds['texture']
 		bumpmap = ds['bumpmap']
 		(tex_defined,bump_defined) = ( el != [None, None] for el in( texpack,bumpmap) )
-		if not poly.clip( width, height ): 
-			# Texture or bumpmap if (1) Lilac has textures included or we
-			# are in the overwrite texture-flag map, (2) we have anchors
-			# defined, and (3) there is either a bump map or texture resource
-			if (ltk.texture or self in overwrite) and self.anchor != None and (tex_defined or bump_defined):
-				Lilac.set_anchor_points(-1,self.anchor,len(poly.coordinates))
-				(same_tex,same_bump) = (Polygon.__texture__ == id(texpack[0]),
-											Polygon.__bump__ == id(bumpmap[0]))
+		
+		# Texture or bumpmap if (1) Lilac has textures included or we
+		# are in the overwrite texture-flag map, (2) we have anchors
+		# defined, and (3) there is either a bump map or texture resource
+		if (ltk.texture or self in overwrite) and self.anchor != None and (tex_defined or bump_defined):
+			Lilac.set_anchor_points(-1,self.anchor,len(poly.coordinates))
+			(same_tex,same_bump) = (Polygon.__texture__ == id(texpack[0]),
+										Polygon.__bump__ == id(bumpmap[0]))
 
-				if tex_defined and not same_tex:
-					Lilac.set_texture(-1,texpack[0],texpack[1][1],texpack[1][0],texpack[1][2])
-					Polygon.__texture__ = id(texpack[0])
-				elif not tex_defined:
-					Lilac.release_textures()
-					Polygon.__texture__ = 0
-					
-				# if we have a texture and it isn't the old texture do A
-				# if we do not have a texture do B
-				#	we do not have a texture
-					
-				if bump_defined and not same_bump:
-					Lilac.set_bump_map(-1,bumpmap[0],bumpmap[1][1],bumpmap[1][0],bumpmap[1][2])
-					Polygon.__bump__ = id(bumpmap[0])
-				elif not bump_defined:
-					Lilac.release_bump_map()
-					Polygon.__bump__ = 0
-			else:
-				Lilac.release_anchors_and_textures()
-				Polygon.__bump__ = Polygon.__texture__ = 0
+			if tex_defined and not same_tex:
+				Lilac.set_texture(-1,texpack[0],texpack[1][1],texpack[1][0],texpack[1][2])
+				Polygon.__texture__ = id(texpack[0])
+			elif not tex_defined:
+				Lilac.release_textures()
+				Polygon.__texture__ = 0
+				
+			# if we have a texture and it isn't the old texture do A
+			# if we do not have a texture do B
+			#	we do not have a texture
 				
-			Lilac.create_polygon( -1, ltk.config('pixels'),
-				poly.coordinates.astype(np.float32),  
-				ltk.config('zbuffer'), color/255, nx, ny, nz )
+			if bump_defined and not same_bump:
+				Lilac.set_bump_map(-1,bumpmap[0],bumpmap[1][1],bumpmap[1][0],bumpmap[1][2])
+				Polygon.__bump__ = id(bumpmap[0])
+			elif not bump_defined:
+				Lilac.release_bump_map()
+				Polygon.__bump__ = 0
+		else:
+			Lilac.release_anchors_and_textures()
+			Polygon.__bump__ = Polygon.__texture__ = 0
+			
+		Lilac.create_polygon( -1, ltk.config('pixels'),
+			coordinates[0].astype(np.float32),  
+			ltk.config('zbuffer'), color/255, nx, ny, nz )
 	
-	def expand_application( self, ltk,ds,lighting,poly,ltm,gtm,vtm ):
+	def expand_application( self, ltk,ds,lighting,poly,wtm,ctm,cull_back_faces=False ):
 		""" Applies the polygon to the scene under conditions in which
-			it wraps many local shapes
+			it wraps many local shapes, i.e., its coordinates are an NxVx4 
+			array of N polygons with V vertices each (see Polygon.batch and
+			MergeVisitor). Unless the polygon is two sided, polygons facing
+			away from the viewer are dropped when cull_back_faces is set. The
+			input polygon is not modified.
 		"""
-		# convert to scene coordinates
-		Lilac.preprocess_transformation(0,
-				poly.coordinates, poly.normals,
-				gtm.transform.astype(float),ltm.transform.astype(float))		
+		num_vertices = poly.coordinates.shape[1]
 		
+		# apply the composite transformation, homoginize and cull, so that 
+		# culled polygons are neither lit nor scanned. The library's 
+		# process_view_transform clamps vertices to the image, which distorts
+		# partially visible polygons, so this step stays here
+		width,height = ltk.config('width','height')
+		(visible,view) = Shape.cull( poly.coordinates.dot(ctm.transform.transpose()),
+			width, height )
+		if cull_back_faces and not poly.two_sided and visible.any():
+			visible &= Shape.facing( poly.coordinates, poly.normals, ctm.transform )
+		if not visible.any(): return
+		everything = visible.all()
+		texture = poly.colors( ds )
+		(coordinates,normals,texture) = (poly.coordinates,poly.normals,texture) \
+			if everything else (poly.coordinates[visible],poly.normals[visible],
+				texture[visible])
 		
-		# define the color scope
-		color = np.array(lighting.multishade(poly.texture,ds['surface_color'],
-			poly,ltk.config('camera').camera.config('vrp')))
+		# convert the visible polygons to scene coordinates
+		world = wtm.transform.transpose()
+		scene = Polygon( coords = coordinates.dot(world), 
+			normals = normals.dot(world), texture = texture )
+		
+		# the draw state is shared by the whole batch
+		Lilac.set_alpha(ds['alpha'][0])
+		Lilac.set_beta(ds['beta'][0])
+		Lilac.set_surface_color(*ds['surface_color'][:3])
+		Lilac.release_anchors_and_textures()
+		Polygon.__bump__ = Polygon.__texture__ = 0
+		
+		# normals are either one per polygon or one per vertex; the C
+		# library and the lighting expect one per vertex
+		normals = scene.normals
+		if len(normals.shape) == 2:
+			normals = np.repeat(normals[:,None,:],num_vertices,axis=1)
+		
+		# light every vertex of the batch at once
+		(lights,light_types,light_positions,sharpness) = \
+			lighting.get_lighting_parameters()
+		color = shade( texture, ds['surface_color'], scene.coordinates,
+			normals, ltk.config('camera').camera.config('vrp'), lights,
+			light_types, light_positions, sharpness )
 		
-		# apply the view transformation, homoginize, clip, and remove hidden
-		# surfaces		
-		Lilac.process_view_transform(0,
-				poly.coordinates, 
-				vtm.transform.astype(float))
-
 		pixels = ltk.config('pixels')
 		zbuffer = ltk.config('zbuffer')
 
-		# one-pass scan-line for the whole module
+		# one call scans every visible polygon
 		Lilac.create_polygons( -1, pixels,
-				poly.coordinates.astype(np.float32),  zbuffer, color/255 )
+				(view if everything else view[visible]).astype(np.float32), 
+				zbuffer, np.ascontiguousarray(color/255,dtype=float),
+				normals.astype(np.float32) )
+				
+	def triangulate( self ):
+		""" Returns the polygon, which must be convex, as a list of triangles
+			fanned from its first vertex. Each triangle carries the normals, 
+			anchors and texture colors of its corners, and a polygon with one
+			normal gives it to every corner, so that all triangles share the 
+			(3,4) layout that batches them together (see Polygon.batch).
+			Other shapes and stacked polygons are returned as they are.
+		"""
+		num_vertices = len(self.coordinates)
+		if type(self) is not Polygon or len(self.coordinates.shape) != 2 or num_vertices < 3:
+			return [ self ]
+		fan = np.column_stack(( np.zeros(num_vertices-2,dtype=int), 
+			np.arange(1,num_vertices-1), np.arange(2,num_vertices) ))
+		
+		normals = np.asarray(self.normals)
+		normals = np.broadcast_to(normals,(num_vertices,len(normals))) \
+			if len(normals.shape) == 1 else normals[:num_vertices]
+		anchor = getattr(self,'anchor',None)
+		anchor = None if anchor is None else np.reshape(anchor,(-1,4))[:num_vertices]
+		texture = np.asarray(self.texture)
+		return [ Polygon( coords = self.coordinates[corners], color = self.color,
+			normals = normals[corners].copy(), 
+			texture = texture[corners] if len(texture.shape) == 2 else self.texture,
+			anchor = None if anchor is None else anchor[corners].flatten(),
+			two_sided = self.two_sided ) for corners in fan ]
+		
+	def colors( self, draw_state ):
+		""" Returns the NxVx4 colors of a polygon wrapping N polygons. A 
+			merged polygon without a texture (see MergeVisitor) takes the 
+			base color of the draw state, or its own color, as a lone polygon
+			would.
+		"""
+		if len(self.texture) != 0: return self.texture
+		color = draw_state['base_color']
+		if color == [None]: color = self.color
+		return np.broadcast_to( np.asarray(color,dtype=float), self.coordinates.shape )
+		
+	@Overrides(Shape)
+	def bounds( self ):
+		""" Returns the bounding box of the polygon (or of a batch) """
+		return Shape.box( self.coordinates )
+		
+	def batchable( self, draw_state ):
+		""" Returns True if the polygon can be drawn as part of a batch (see
+			Polygon.batch) under the given draw state; textured polygons are
+			drawn one at a time.
+		"""
+		try: anchor = self.anchor
+		except AttributeError: anchor = None
+		return type(self) is Polygon and len(self.coordinates.shape) == 2 and \
+			(anchor is None or (draw_state['texture'] == [None, None] and 
+				draw_state['bumpmap'] == [None, None]))
+			
+	@staticmethod
+	def batch( polygons, draw_state ):
+		""" Packs polygons of the same number of vertices into one polygon 
+			whose coordinates are an NxVx4 array, which is drawn in a single
+			pass by expand_application. Colors are resolved against the draw
+			state as apply_to_scene would resolve them.
+		"""
+		coordinates = np.array([ polygon.coordinates for polygon in polygons ],
+			dtype=float)
+		num_vertices = coordinates.shape[1]
+		normals = np.array([ polygon.normals if len(polygon.normals.shape) == 1
+			else polygon.normals[:num_vertices] for polygon in polygons ],dtype=float)
+		colors = np.empty(coordinates.shape)
+		base_color = draw_state['base_color']
+		for i,polygon in enumerate(polygons):
+			color = base_color if base_color != [None] else polygon.color
+			if len(polygon.texture) != 0: color = polygon.texture
+			colors[i] = np.asarray(color,dtype=float)
+		return Polygon( coords = coordinates, normals = normals, texture = colors,
+			two_sided = polygons[0].two_sided )
 	
 	@Overrides(Shape)
 	def copy( self ):
 		""" Returns a deep copy of the Polygon """
 		return Polygon( coords = self.coordinates.copy(), color = self.color[:],
-							normals = self.normals.copy(), texture=self.texture)
+							normals = self.normals.copy(), texture=self.texture,
+							two_sided = self.two_sided)
 			
 			
 	@Overrides(Shape)
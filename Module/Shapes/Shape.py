@@ -9,14 +9,99 @@
 
 from abc import ABCMeta, abstractmethod
 from Module.ModuleElement import ModuleElement
+import numpy as np
 from numpy import newaxis
 from Module.ClassUtils import Overrides
 
+class TrackedArray(np.ndarray):
+	""" A view of an array held by a shape, as its tracked attributes return
+		them, that dirties the shape when it is written to in place. Views
+		of a tracked array (slices, reshapes) dirty the same shape; arrays
+		computed from it, and copies of it, are plain arrays.
+	"""
+	
+	def __array_finalize__( self, obj ):
+		""" Inherits the owner of the array this one views, if any """
+		self.owner = getattr(obj,'owner',None) if self.base is not None else None
+		
+	def __array_ufunc__( self, ufunc, method, *inputs, **kwargs ):
+		""" Applies the ufunc to plain views of its operands, so that its 
+			results are plain arrays, and dirties the owners of the tracked
+			arrays it writes to (in-place operators, out= arguments)
+		"""
+		plain = lambda array : array.view(np.ndarray) if isinstance(array,TrackedArray) else array
+		outputs = kwargs.get('out',())
+		if outputs: kwargs['out'] = tuple( plain(array) for array in outputs )
+		result = getattr(ufunc,method)( *[ plain(array) for array in inputs ], **kwargs )
+		if not outputs: return result
+		[ array._changed() for array in outputs if isinstance(array,TrackedArray) ]
+		return outputs[0] if len(outputs) == 1 else outputs
+		
+	def __setitem__( self, key, value ):
+		""" Writes to the array and dirties its owner """
+		np.ndarray.__setitem__( self, key, value )
+		self._changed()
+		
+	def _changed( self ):
+		""" Notifies the owner, if any, that the array was written to """
+		owner = getattr(self,'owner',None)
+		if owner is not None: owner()
+		
+def _written( name ):
+	""" Returns the method of the given name of a tracked array, which
+		writes to the array, dirtying the array's owner once it is applied
+	"""
+	method = getattr(np.ndarray,name)
+	def write( self, *args, **kwargs ):
+		result = method( self, *args, **kwargs )
+		self._changed()
+		return result
+	write.__name__ = name
+	return write
+	
+for name in ('fill','put','sort','partition','itemset'):
+	if hasattr(np.ndarray,name): setattr( TrackedArray, name, _written(name) )
+	
+def tracked( name ):
+	""" Returns a property for the attribute of a shape of the given name
+		that dirties the shape when the attribute is assigned. Arrays are
+		kept as they are given and returned as tracked arrays, so that in 
+		place writes dirty the shape too; other values, such as colors
+		given as lists, are only tracked on assignment.
+	"""
+	key = '_tracked_' + name
+	def get( self ):
+		try:
+			value = self.__dict__[key]
+		except KeyError:
+			raise AttributeError(name)
+		if type(value) is not np.ndarray: return value
+		view = value.view(TrackedArray)
+		view.owner = self._dirty
+		return view
+	def set( self, value ):
+		self.__dict__[key] = value.view(np.ndarray) if \
+			isinstance(value,np.ndarray) else value
+		self._dirty()
+	return property( get, set, doc = "The tracked " + name + " of the shape" )
+
 class Shape(ModuleElement):
-	""" This is the parent of all shapes drawn in Lilac.c """
+	""" This is the parent of all shapes drawn in Lilac.c.
+	
+		The coordinates, normals, color and texture of a shape are tracked
+		(see tracked): assigning them, or writing to their arrays in place,
+		dirties the shape, so that the compiled render lists holding it are
+		dropped and the change is drawn.
+	"""
 	
 	__metaclass__ = ABCMeta
 	__id__ = 0
+	__tracked__ = ('coordinates','normals','color','texture')
+	
+	coordinates = tracked('coordinates')
+	normals = tracked('normals')
+	color = tracked('color')
+	texture = tracked('texture')
 	
 	@Overrides(ModuleElement)
 	@abstractmethod
@@ -27,6 +112,11 @@ class Shape(ModuleElement):
 		"""
 		return
 		
+	@Overrides(ModuleElement)
+	def _compile( self, environment, render_list ):
+		""" Records the shape into the render list instead of drawing it """
+		render_list.add_shape( self, environment )
+		
 	def __init__( self ):
 		""" Creates a new Shape. Must be called first in constructor. """
 		ModuleElement.__init__(self)
@@ -35,6 +125,15 @@ class Shape(ModuleElement):
 		self.id = self.__id__
 		Shape.__id__ += 1
 		
+	def __setstate__( self, state ):
+		""" Restores a pickled shape. Shapes pickled before their attributes
+			were tracked hold them as plain attributes, which are moved to
+			where the tracked attributes keep them.
+		"""
+		for name in Shape.__tracked__:
+			if name in state: state['_tracked_' + name] = state.pop(name)
+		self.__dict__.update( state )
+		
 	def __repr__( self ):
 		""" Returns a useful string representation of the Shape """
 		return "<"+str(self.__class__)+" : "+str(self.coordinates)+">"
@@ -47,18 +146,114 @@ class Shape(ModuleElement):
 		"""
 		return
 		
+	def bounds( self ):
+		""" Returns the axis aligned bounding box of the shape in its own
+			coordinates, as a 2x3 array of its least and greatest corners, or
+			None if the shape cannot be bounded, e.g., if it is drawn with a
+			size in pixels. This should be overwritten by bounded shapes.
+		"""
+		return None
+		
 	def clip (self, width, height ):
 		""" Returns true if all of the coordinates are out of bounds """
-
-		truth = all([ coord[0] > width or coord[0] < 0 or coord[1] > height or \
-			coord[1] < 0 for coord in self.coordinates ])
-		return truth
+		return bool(Shape.offscreen( self.coordinates, width, height ))
 		
 	def homoginize( self ):
 		""" Divides each coordinate by its homogenous component """
-		self.coordinates[:,0] /= self.coordinates[:,3]
-		self.coordinates[:,1] /= self.coordinates[:,3]
-		self.coordinates[:,2] *= -1
+		self.coordinates[...,:2] /= self.coordinates[...,3,newaxis]
+		self.coordinates[...,2] *= -1
+		
+	@staticmethod
+	def offscreen( coordinates, width, height ):
+		""" Returns, for an array of homoginized coordinates whose last two 
+			axes are vertices and bands (Vx4, NxVx4, ...), whether each shape
+			lies wholly outside of the image, i.e., whether all of its 
+			vertices lie past the same edge of the image. A convex shape 
+			whose vertices lie past different edges may still cross the
+			image, e.g., one that covers it.
+		"""
+		(x,y) = (coordinates[...,0],coordinates[...,1])
+		return np.all(x < 0,axis=-1) | np.all(x > width,axis=-1) | \
+			np.all(y < 0,axis=-1) | np.all(y > height,axis=-1)
+		
+	@staticmethod
+	def box( points ):
+		""" Returns the bounding box (see bounds) of an array of points whose
+			last axis holds their x, y and z coordinates
+		"""
+		points = np.reshape( points, (-1,points.shape[-1]) )[:,:3]
+		return np.array([ points.min(axis=0), points.max(axis=0) ],dtype=float)
+		
+	@staticmethod
+	def corners( box ):
+		""" Returns the eight corners of a bounding box as an 8x4 array of 
+			homogeneous coordinates
+		"""
+		return np.array([ [box[i][0],box[j][1],box[k][2],1] 
+			for i in (0,1) for j in (0,1) for k in (0,1) ],dtype=float)
+			
+	@staticmethod
+	def outside( coordinates, width, height ):
+		""" For an NxVx4 array of the view-transformed (not homoginized)
+			vertices of N convex volumes, returns whether each volume lies
+			wholly out of view: behind the viewer, or in front of it and past
+			one edge of the image. The test is conservative; a volume that
+			crosses the viewer's plane is never reported outside.
+		"""
+		hcomp = coordinates[...,3]
+		with np.errstate(divide='ignore',invalid='ignore'):
+			projected = coordinates[...,:2] / hcomp[...,newaxis]
+		past = Shape.offscreen( projected, width, height )
+		return np.all(hcomp <= 0,axis=-1) | (np.all(hcomp > 0,axis=-1) & past)
+		
+	@staticmethod
+	def facing( coordinates, normals, transform ):
+		""" For an NxVx4 array of the vertices of N planar polygons and their
+			normals (Nx4, or NxVx4 per vertex), returns whether each polygon
+			faces the viewer of the given 4x4 composite transformation.
+
+			The test is made in the polygons' own coordinates: the viewer is
+			the center of projection of the transformation, the point that it
+			sends to w=0 at the origin of the image (or, for a parallel
+			projection, the direction towards the image). A polygon faces the
+			viewer if the side that its normals point to is the side the
+			viewer is on; the side is taken from the polygon's geometric
+			normal, so smoothed vertex normals do not cull polygons along a
+			silhouette.
+		"""
+		center = np.linalg.svd( transform[[0,1,3]] )[2][-1]
+		points = coordinates[:,0,:3] / coordinates[:,0,3,newaxis]
+		if abs(center[3]) > 1e-12:
+			view = center[:3] / center[3] - points
+		else: # parallel projections see along a direction of decreasing depth
+			view = center[:3] * -np.sign( transform[2,:3].dot(center[:3]) )
+
+		# Newell's method, exact for repeated (padded) vertices
+		vertices = coordinates[...,:3]
+		geometric = np.cross( vertices, np.roll(vertices,-1,axis=1) ).sum(axis=1)
+		normal = normals[...,:3] if len(normals.shape) == 2 else normals[...,:3].sum(axis=1)
+		side = np.sign( (geometric*normal).sum(axis=-1) )
+		return side * (geometric*view).sum(axis=-1) >= 0
+
+	@staticmethod
+	def cull( coordinates, width, height ):
+		""" Homoginizes an NxVx4 array of view-transformed coordinates of N
+			shapes with V vertices each, and returns a boolean mask of the 
+			shapes that survive culling along with the homoginized coordinates.
+			
+			A shape is culled when all of its vertices are behind the viewer
+			or all of them are past the same edge of the image (see 
+			offscreen), so that a shape covering the image is kept. The input
+			array is not modified.
+		"""
+		coordinates = np.array(coordinates,dtype=float)
+		hcomp = coordinates[...,3]
+		with np.errstate(divide='ignore',invalid='ignore'):
+			coordinates[...,:2] /= hcomp[...,newaxis]
+		coordinates[...,2] *= -1
+		behind = np.all(hcomp <= 0,axis=-1)
+		return (~(behind | Shape.offscreen( coordinates, width, height )),
+			coordinates)
 			
 class ShapeImposterException(Exception):
 	""" Raised when something extends shape without meeting preconditions """
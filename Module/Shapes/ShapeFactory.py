@@ -18,31 +18,81 @@ from Module.Shapes.SphereGenerator import SphereGenerator
 from Module.Shapes.XwingGenerator import XwingGenerator
 
 from Module.Module import Module
+from Module.Instance import Instance
+from Module.LevelOfDetail import LevelOfDetail
 from math import cos, sin, pi
 from Module.Lighting.Colors import Colors
 
-from numpy import array as nparray	
+from numpy import array as nparray, ndarray
+from collections import OrderedDict
+from inspect import signature
 	
 from random import randint as ra
 
 from Module.Shapes.CastleU  import genCurve
 	
 class ShapeFactory:
-	""" This class applies the factory pattern to shapes
+	""" This class applies the factory pattern to shapes.
+	
+		While caching is enabled, composite shapes (those built as Modules)
+		are cached on their id and options, in a least recently used cache of 
+		cache_size entries. Each request for a cached shape is answered with
+		a new Instance of the shared geometry, so instances can be flagged,
+		transformed and carried independently while the shape is built once.
 	"""
 	
-	__cache__ = {}
+	__cache__ = OrderedDict()
+	__composites__ = ('box','cylinder','xwing','sphere','sphere lod','cylinder lod')
+	__triangulated__ = ('box','cylinder')
 	cache = True
+	cache_size = 64
 	sphere = None
-	
+	hits = 0
+	misses = 0
 	
 	def gen_shape( self, id, **opts ):
-		""" Returns a point object """
+		""" Returns a shape of the given id built with the given options """
 		if not id in self.__shape_name_map:
 			raise ShapeImposterException("Unrecognised shape: "+str(id))
-		if self.cache and not str(id) in self.__cache__:
-			self.__cache__[str(id)] = self.__shape_name_map[ id ]( **opts )
-		return (self.__cache__[str(id)] if self.cache else link( self.__shape_name_map[ id ]( **opts )).average_normals() )
+		if not self.cache:
+			return self.__build( id, opts, smooth = True )
+		if not id in self.__composites__:
+			return self.__shape_name_map[ id ]( **opts )
+		
+		key = self.__key( id, opts )
+		if key in self.__cache__:
+			self.__cache__.move_to_end( key )
+			ShapeFactory.hits += 1
+		else:
+			self.__cache__[key] = self.__build( id, opts )
+			ShapeFactory.misses += 1
+			while len(self.__cache__) > self.cache_size:
+				self.__cache__.popitem( last = False )
+				
+		return Instance( self.__cache__[key] )
+		
+	def __build( self, id, opts, smooth = False ):
+		""" Builds the shape of the given id with the given options, giving
+			it Gouraud normals if smooth. The normals are averaged before the
+			shape is triangulated, so that each face counts once at each of
+			its corners, however it is split.
+		"""
+		shape = self.__shape_name_map[ id ]( **opts )
+		if smooth: shape = link( shape ).average_normals()
+		return shape.triangulate() if id in self.__triangulated__ else shape
+		
+	def clear_cache( self ):
+		""" Empties the shape cache and resets its counters """
+		self.__cache__.clear()
+		ShapeFactory.hits = ShapeFactory.misses = 0
+		
+	def __key( self, id, opts ):
+		""" Returns the cache key of a shape: its id and its options, with 
+			defaults filled in, in a hashable form
+		"""
+		arguments = signature( self.__shape_name_map[ id ] ).bind( **opts )
+		arguments.apply_defaults()
+		return (id,normalize(arguments.arguments))
 
 	def __create_rectangle( width=.1, height=.1, x0=0, y0=0, color =[0,0,0,0] ):
 		""" Returns a rectangle shape.
@@ -169,14 +219,34 @@ class ShapeFactory:
 		""" Returns a sphere object.
 			
 			The argument resolution specifies the number of recursions to apply
-			when generating the sphere; note that because complex shapes are cached
-			for performance, this can only be applied to the first sphere
-			unless the cache is manually cleared.
+			when generating the sphere.
 		"""
 		s = SphereGenerator(recursion=resolution).mesh
 		s.id[0] = 'Sphere'
 		return s 
 		
+	def __create_sphere_lod( resolutions=(0,1,2,3,4,5,6), tolerance=8 ):
+		""" Returns a sphere drawn at one of the given recursion levels, 
+			chosen each frame by its size on the image (see LevelOfDetail)
+		"""
+		s = Module()
+		s.add_element( LevelOfDetail( [ SphereGenerator(recursion=r).mesh 
+			for r in sorted(resolutions) ], tolerance = tolerance ) )
+		s.id[0] = 'Sphere'
+		return s
+		
+	def __create_cylinder_lod( width=1, height=1, sides=(6,12,25,50,100), 
+			color = [0,0,200,0], tolerance=8 ):
+		""" Returns a cylinder drawn with one of the given numbers of sides,
+			chosen each frame by its size on the image (see LevelOfDetail)
+		"""
+		c = Module()
+		c.add_element( LevelOfDetail( [ ShapeFactory.__create_cylinder( width, 
+			height, n, color = color ).triangulate() for n in sorted(sides) ], 
+			tolerance = tolerance ) )
+		c.id[0] = 'Cylinder'
+		return c
+		
 		
 		
 		
@@ -192,6 +262,8 @@ class ShapeFactory:
 						 'polygon' : Polygon, 'rectangle' : __create_rectangle,
 						 'box' : __create_box, 'cylinder': __create_cylinder,
 						 'xwing' : __create_xwing, 'sphere': __create_sphere,
+						 'sphere lod' : __create_sphere_lod,
+						 'cylinder lod' : __create_cylinder_lod,
 						 # These are examples of other objects which have been
 						 # build for this project
 						 # 'man' : __create_man, 'apple': __create_apple,
@@ -208,8 +280,22 @@ class ShapeFactory:
 
 class ShapeImposterException(Exception): pass
 
+def normalize( value ):
+	""" Returns a hashable form of a shape option, comparing arrays and
+		containers by their contents
+	"""
+	if isinstance(value,ndarray):
+		return (value.shape,value.dtype.str,value.tobytes())
+	if isinstance(value,dict):
+		return tuple(sorted( (key,normalize(item)) for key,item in value.items() ))
+	if isinstance(value,(list,tuple)):
+		return tuple( normalize(item) for item in value )
+	return value
+
 def link( shape ):
-	try: shape.__elements__[-1].__elements__[0] = shape.__elements__[0]
+	try: 
+		shape.__elements__[-1].__elements__[0] = shape.__elements__[0]
+		shape.__elements__[-1]._dirty()
 	except: pass
 	return shape
 						
@@ -5,10 +5,14 @@
 	constructor tries to perform the most efficient construction possible at
 	each iteration, adding its own cache process on top of the ShapeFactory's
 	cache. In order of prioritization, the Generator will 1) load a sphere
-	of the requested detail from memory, 2) unpickle a sphere in memory,
-	or 3) generate the sphere dynamically. This can be computationally expensive;
-	the major limit is memory, and since this is only done as a last choice, we
-	accept Python for its implementation.
+	of the requested detail from memory, 2) memory-map a sphere from the
+	mesh cache on disk (see MeshCache), or 3) generate the sphere 
+	dynamically and store it in the mesh cache. Generation subdivides an
+	icosahedron with NumPy, one level at a time, splitting every edge of the
+	level at once; the major limit is memory.
+	
+	The sphere is carried by its module as a single IndexedMesh, so that each
+	of its vertices is stored once however many faces share it.
 		
 	Author: Matthew Levine
 	Date: 09/04/2014
@@ -20,6 +24,8 @@ from Module.ModuleElement import ModuleElement
 from Module.Module import Module
 from Module.Matrices.Matrix import ViewTransformationMatrix as Mtx
 from Module.Shapes.Polygon import Polygon
+from Module.Shapes.IndexedMesh import IndexedMesh
+from Module.Shapes.MeshCache import mesh_cache
 import Lilac
 from math import sqrt, cos, sin, pi
 import math
@@ -27,113 +33,82 @@ import math
 from Module.Shapes.ObjGenerator import ObjGenerator
 from Module.ClassUtils import Overrides
 
-import pickle
-
 G = ( 1 + sqrt(5) ) / 2
 
 class SphereGenerator(ObjGenerator):
 	""" This class defines a sphere in space """
 	 
-	__cache__ = 0
-	pickle = 0
+	__version__ = 1 # bump whenever the generated arrays change
 	 
 	def __init__( self, recursion = 3, texture = 0 ):
-		""" Initializes the polygon """
+		""" Initializes the sphere, from the mesh cache if it holds a sphere
+			of the same recursion. The mesh holds the cache's read-only 
+			arrays, memory-mapped when they were loaded from disk, so it must
+			be copied (see IndexedMesh.copy) before they are modified.
+		"""
 		ObjGenerator.__init__(self)
 		
-		if not SphereGenerator.__cache__:
-			# try to unpickle it
-			try:
-				if not SphereGenerator.pickle:
-					raise IOError("custom")
-				sp = open('Module/Objects/sphere'+str(recursion)+'.p','rb')
-				self.mesh =pickle.load(sp)
-			except IOError as e:
-				self.polygons = []
-				self.build_mesh()
-				
-				for i in range(recursion):
-					self._subdivide()
-					
-				SphereGenerator.__cache__ = self.polygons
-		else:
-			for poly in SphereGenerator.__cache__:
-				vec = np.array(poly)
-				self.mesh.add_shape(Polygon(coords=vec,normals=get_normal(vec)))
+		arrays = mesh_cache.fetch( 'sphere', { 'recursion' : recursion },
+			SphereGenerator.__version__, lambda : self._generate(recursion) )
+		self.mesh.add_shape(IndexedMesh( *( arrays[name] for name in 
+			('vertices','faces','normals','uvs') ) ))
 	
 		if texture:
 			SphereGenerator.texture_sphere(self.mesh,texture)
 			
 		self.mesh.invisible = 'gouroud'
+		
+	def _generate( self, recursion ):
+		""" Generates the arrays of the sphere's indexed mesh """
+		self.build_mesh()
+		
+		for i in range(recursion):
+			self._subdivide()
+			
+		return self._gen_arrays( self.vertices, self.faces )
 					
 	@Overrides(ObjGenerator)
 	def build_mesh( self ):
-		sides = []
-		
-		v = [
+		""" Builds the icosahedron that is subdivided into the sphere """
+		v = np.array([
 			[-1,G,0,1],[1,G,0,1],[-1,-G,0,1],[1,-G,0,1],
 			[0,-1,G,1],[0,1,G,1], [0,-1,-G,1],[0,1,-G,1],
-			[G,0,-1,1],[G,0,1,1],[-G,0,-1,1],[-G,0,1,1]  ]
+			[G,0,-1,1],[G,0,1,1],[-G,0,-1,1],[-G,0,1,1]  ],dtype=float)
 			
 		# normalize the points
-		for i,point in enumerate(v):
-			mag = sqrt(point[0]*point[0]+point[1]*point[1]+point[2]*point[2])
-			v[i] = [point[0]/mag,point[1]/mag,point[2]/mag,1]
+		v[:,:3] /= np.sqrt((v[:,:3]**2).sum(axis=1))[:,np.newaxis]
+		self.vertices = v
 		
-		sides.append([v[0],v[11],v[5]])
-		sides.append([v[0],v[5],v[1]])
-		sides.append([v[0],v[1],v[7]])
-		sides.append([v[0],v[7],v[10]])
-		sides.append([v[0],v[10],v[11]])
+		self.faces = np.array([
+			[0,11,5],[0,5,1],[0,1,7],[0,7,10],[0,10,11],
+			[1,5,9],[5,11,4],[11,10,2],[10,7,6],[7,1,8],
+			[3,9,4],[3,4,2],[3,2,6],[3,6,8],[3,8,9],
+			[4,9,5],[2,4,11],[6,2,10],[8,6,7],[9,8,1] ],dtype=np.int32)
 		
-		sides.append([v[1],v[5],v[9]])
-		sides.append([v[5],v[11],v[4]])
-		sides.append([v[11],v[10],v[2]])
-		sides.append([v[10],v[7],v[6]])
-		sides.append([v[7],v[1],v[8]])
-					
-		sides.append([v[3],v[9],v[4]])
-		sides.append([v[3],v[4],v[2]])
-		sides.append([v[3],v[2],v[6]])
-		sides.append([v[3],v[6],v[8]])
-		sides.append([v[3],v[8],v[9]])
+	def _subdivide( self ):
+		""" Splits every face into four, placing a new vertex at the midpoint
+			of each edge, pushed out onto the sphere. Each edge is split once
+			however many faces share it, so the new vertices are shared.
+		"""
+		(vertices,faces) = (self.vertices,self.faces)
 		
-		sides.append([v[4],v[9],v[5]])
-		sides.append([v[2],v[4],v[11]])
-		sides.append([v[6],v[2],v[10]])
-		sides.append([v[8],v[6],v[7]])
-		sides.append([v[9],v[8],v[1]])
+		# the edges 01, 12 and 02 of every face, keyed on their sorted ends
+		edges = np.sort(np.stack((faces[:,[0,1,0]],faces[:,[1,2,2]]),axis=-1),axis=-1)
+		keys = edges[...,0].astype(np.int64) * len(vertices) + edges[...,1]
+		(keys,midpoint) = np.unique( keys.reshape(-1), return_inverse=True )
 		
-		for side in sides:
-			self.mesh.add_shape(self._gen_poly(side,side))
-			self.polygons.append(side)
-	
-	def _getMidpoint( self, p1, p2 ):
-		point = [ p1[0]/2+p2[0]/2, p1[1]/2+p2[1]/2, p1[2]/2+p2[2]/2, 1 ]
-		mag = sqrt( point[0]*point[0] + point[1]*point[1] + point[2]*point[2] )
-		point = [point[0]/mag,point[1]/mag,point[2]/mag,1]
-		return point
-				
+		# the edge midpoints, normalized onto the sphere
+		(start,end) = (keys // len(vertices), keys % len(vertices))
+		points = vertices[start]/2 + vertices[end]/2
+		points[:,:3] /= np.sqrt((points[:,:3]**2).sum(axis=1))[:,np.newaxis]
+		points[:,3] = 1
 		
-	def _subdivide( self ):
-		faces = []
-		mesh = Module()
-		for face in self.polygons:
-			
-			a = self._getMidpoint( face[0], face[1])
-			b = self._getMidpoint( face[1], face[2] )
-			c = self._getMidpoint( face[0], face[2] )
-			
-			faces.append( [face[0],a,c] )
-			faces.append( [face[1],b,a] )
-			faces.append( [face[2],c,b] )
-			faces.append( [a,b,c])
-
-		self.polygons = faces
-		for face in faces:
-			mesh.add_shape(self._gen_poly(face,face))
-
-		self.mesh =  mesh
+		(a,b,c) = (len(vertices) + midpoint.reshape(-1,3)).transpose()
+		(v0,v1,v2) = faces.transpose()
+		self.vertices = np.vstack((vertices,points))
+		self.faces = np.stack(( np.column_stack((v0,a,c)), np.column_stack((v1,b,a)),
+			np.column_stack((v2,c,b)), np.column_stack((a,b,c)) ),axis=1).reshape(-1,3
+			).astype(np.int32)
 
 	def texture_sphere( sphere, filename ):
 		""" Statically texturizes the given sphere using the
@@ -149,8 +124,24 @@ class SphereGenerator(ObjGenerator):
 		except Exception as e:
 			raise UnshapelyException("Unidentified flying texture "+str(filename))
 								
-		# handle optimized and non-optimized form, for efficient pickling
-		if len(sphere.__elements__[0].coordinates.shape) == 2:
+		# handle indexed, optimized and non-optimized form
+		if isinstance(sphere.__elements__[0],IndexedMesh):
+			mesh = sphere.__elements__[0]
+			vn = mesh.coordinates[mesh.faces[:,0]]
+			r = np.sqrt( (vn[:,:3]**2).sum(axis=1) )
+			u = .5 + np.arctan2( vn[:,2]/r, vn[:,0]/r ) / (2 * math.pi )
+			v = .5 - np.arcsin( vn[:,1] / r ) / math.pi
+			
+			lon = (tex.shape[0] * v - 1).astype(int)
+			lat = (tex.shape[1] * u - 1).astype(int)
+			
+			colors = tex[lon,lat]
+			if len(colors.shape) == 1: # account for greyscale images
+				colors = np.column_stack([colors]*3)
+			mesh.colors = np.column_stack(( colors[:,:3], 
+				255*np.ones(len(colors)) )).astype(float)
+			mesh._dirty()
+		elif len(sphere.__elements__[0].coordinates.shape) == 2:
 			for i,poly in enumerate(sphere.__elements__):
 
 				try:
@@ -190,15 +181,17 @@ class SphereGenerator(ObjGenerator):
 					poly.texture[i] = np.array([tex[int(lat),
 						int(lon)]for i in range(3)] +[255])
 						
-	def _gen_poly( self, coords, normals ):
-		# FIXME: do this yourself, super slow right now
-		cn = coords[0]
-		r = sqrt(cn[0]*cn[0]+cn[1]*cn[1]+cn[2]*cn[2])
-		u = int(255 * (.5 + math.atan2( cn[2]/r, cn[0]/r ) / (2 * math.pi )))
-		v = int( 255 * (.5 - math.asin( cn[1] / r ) / math.pi) )
-		anchor = np.array([[u,v,-1,-1],[u-1,v,-1,-1],[u,v-1,-1,-1]]).flatten().astype(int)
-		# print(anchor)
-		return Polygon( np.array(coords),normals=get_normal(normals),anchor=anchor)
+	def _gen_arrays( self, vertices, faces ):
+		""" Returns the arrays of an indexed mesh of the sphere, whose 
+			normals are its points and whose texture coordinates are their
+			latitude and longitude
+		"""
+		cn = vertices
+		r = np.sqrt( (cn[:,:3]**2).sum(axis=1) )
+		u = 255 * (.5 + np.arctan2( cn[:,2]/r, cn[:,0]/r ) / (2 * math.pi ))
+		v = 255 * (.5 - np.arcsin( cn[:,1] / r ) / math.pi)
+		return { 'vertices' : vertices, 'faces' : faces, 
+			'normals' : get_normal(vertices), 'uvs' : np.column_stack((u,v)).astype(int) }
 		
 def get_normal( coords ):
 	""" Returns a normal from a set of coorinates """
@@ -48,7 +48,7 @@ class XwingGenerator(ObjGenerator):
 		# wing
 		wing = Module()
 		poly = Polygon( nparray( [[0,0,0,1],[0,0,5,1],[15,0,3,1],[15,0,0,1]] ),
-			normals=nparray([[0,-1,0,1]for i in range(4)]))
+			normals=nparray([[0,-1,0,1]for i in range(4)]), two_sided=True)
 		wing.add_shape( poly )
 		wing.translate(0,.5,0)
 		Polygon( nparray( [[0,0,0,1],[0,0,5,1],[15,0,3,1],[15,0,0,1]] ),
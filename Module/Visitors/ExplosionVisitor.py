@@ -16,6 +16,13 @@ class ExplosionVisitor(Visitor):
 	def visit_module( self, mod ):
 		for el in mod.__elements__: el.accept(self)
 		
+	@Overrides(Visitor)
+	def visit_instance( self, instance ):
+		""" Explodes the geometry of the instance, and so every instance
+			that shares it
+		"""
+		instance.geometry.accept(self)
+		
 	@Overrides(Visitor)
 	def visit_polygon( self, poly ):
 		x = 2 * pi * self.i / self.NE
@@ -130,7 +130,8 @@ class FieldVisitor(Visitor):
 		var = IntVar()
 		var.set(module.ignore*1)
 		tk.Checkbutton(frame,text='Ignore',variable=var,
-			command=lambda : module.__setattr__('ignore',not module.ignore)).grid(row=0,column=3)
+			command=lambda : (module.__setattr__('ignore',not module.ignore),
+				module._dirty())).grid(row=0,column=3)
 		
 		tk.Button(frame,text='Texturize',command=lambda:tex_obj(module)).grid(row=0,column=0)
 		
@@ -143,6 +144,53 @@ class FieldVisitor(Visitor):
 		
 		tk.Button(frame,text='Bump',command=lambda:bump_obj(module)).grid(row=0,column=1)
 
+	@Overrides(Visitor)
+	def visit_instance(self,instance):
+		""" Adds the fields to edit an instance's own qualities: its color,
+			if it has a draw state, and its position and rotation. Its 
+			geometry is shared with other instances and is left alone.
+		"""
+		if instance.draw_state is not None:
+			self.fields.append(tk.Label(self.window,text='Color'))
+			self.__color_mod(instance.draw_state)
+		
+		self.fields.append(tk.Label(self.window,text='Rotation'))
+		(csx,csy) = (cos(pi/50),sin(pi/50))
+		(ssx,ssy) = (cos(-pi/50),sin(-pi/50))
+		self.__move_mod(instance,
+			func_list = {0:lambda:instance.rotate(csx,csy,'x'),
+						1:lambda:instance.rotate(csx,csy,'y'),
+						2:lambda:instance.rotate(csx,csy,'z') },
+			rfunc_list = {0:lambda:instance.rotate(ssx,ssy,'x'),
+						1:lambda:instance.rotate(ssx,ssy,'y'),
+						2:lambda:instance.rotate(ssx,ssy,'z') })
+
+		self.fields.append(tk.Label(self.window,text='Translation'))
+		self.__move_mod(instance,
+			func_list = {0:lambda:instance.translate(1,0,0),
+						1:lambda:instance.translate(0,1,0),
+						2:lambda:instance.translate(0,0,1) },
+			rfunc_list = {0:lambda:instance.translate(-1,0,0),
+						1:lambda:instance.translate(0,-1,0),
+						2:lambda:instance.translate(0,0,-1) })
+
+		self.fields.append(tk.Label(self.window,text='Scale'))
+		self.__move_mod(instance,
+			func_list = {0:lambda:instance.scale(2*SC,1,1),
+						1:lambda:instance.scale(1,2*SC,1),
+						2:lambda:instance.scale(1,1,2*SC) },
+			rfunc_list = {0:lambda:instance.scale(.5/SC,1,1),
+						1:lambda:instance.scale(1,.5/SC,1),
+						2:lambda:instance.scale(1,1,.5/SC) })
+		
+		frame = tk.Frame(self.window)
+		self.fields.append(frame)
+		var = IntVar()
+		var.set(instance.ignore*1)
+		tk.Checkbutton(frame,text='Ignore',variable=var,
+			command=lambda : (instance.__setattr__('ignore',not instance.ignore),
+				instance._dirty())).grid(row=0,column=0)
+
 	def __color_mod( self, ds ):
 		try:
 			col = ds['base_color']
@@ -234,6 +282,7 @@ def tex_obj(module):
 		tex = misc.imread(file)
 		shape = tex.shape if len(tex.shape) == 3 else tuple(list(tex.shape)+[1])
 		module.__elements__[0]['texture'] = (tex.flatten().astype(int),shape)
+		module._dirty()
 	except Exception as e:
 		log = open("log.txt","a")
 		log.write("\n"+str(e))
@@ -255,6 +304,7 @@ def bump_obj(module):
 		tex = misc.imread(file)
 		shape = tex.shape if len(tex.shape) == 3 else tuple(list(tex.shape)+[1])
 		module.__elements__[0]['bumpmap'] = (tex.flatten().astype(int),shape)
+		module._dirty()
 	except Exception as e:
 		log = open("log.txt","a")
 		log.write("\n"+str(e))
@@ -19,3 +19,10 @@ class FlipVisitor(Visitor):
 	@Overrides(Visitor)
 	def visit_module( self, module ):
 		module.ignore = not module.ignore
+		module._dirty()
+		
+	@Overrides(Visitor)
+	def visit_instance( self, instance ):
+		""" Toggles the instance, leaving its shared geometry alone """
+		instance.ignore = not instance.ignore
+		instance._dirty()
@@ -0,0 +1,110 @@
+"""
+	This file contains a visitor that merges runs of polygons into stacked
+	polygons.
+
+	A module whose elements are many small polygons, as imported models are,
+	makes one call into the library per polygon when the polygons cannot be
+	batched at draw time. The visitor replaces each run of consecutive
+	compatible polygons of a module with one polygon whose coordinates are an
+	NxVx4 array, which Polygon.expand_application draws in a single call.
+	Polygons with fewer than V vertices are padded by repeating their last
+	vertex, which leaves the area they cover unchanged.
+
+	Consecutive polygons share the draw state and transformations of their
+	module, so polygons are compatible unless they are textured with
+	anchors, differ in normal layout or sidedness, or would lose the
+	precedence of the draw state's base color over their own (see
+	Polygon.apply_to_scene): polygons with a texture color are merged with
+	each other, and polygons without one only with polygons of the same
+	color.
+
+	Date: 10/18/2026
+"""
+
+import numpy as np
+from Module.Visitors.Visitor import Visitor
+from Module.Shapes.Polygon import Polygon
+from Module.ClassUtils import Overrides
+
+class MergeVisitor(Visitor):
+	""" This class merges the runs of compatible polygons of a tree of
+		modules and counts the draw calls saved
+	"""
+
+	def merge( self, root ):
+		""" Merges the polygons of the given module and of the modules below
+			it. Returns the number of draw calls saved, i.e., the number of
+			polygons merged into another.
+		"""
+		self.saved = 0
+		self.__visited = set()
+		root.accept( self )
+		return self.saved
+
+	@Overrides(Visitor)
+	def visit_module( self, module ):
+		""" Merges the runs of polygons of the module, then visits its other
+			elements
+		"""
+		if id(module) in self.__visited: return
+		self.__visited.add( id(module) )
+
+		elements = []
+		run = []
+		for element in module.__elements__ + [None]:
+			if run and MergeVisitor.key(element) != MergeVisitor.key(run[0]):
+				elements.append( run[0] if len(run) == 1 else MergeVisitor.stack(run) )
+				self.saved += len(run) - 1
+				run = []
+			if MergeVisitor.key(element) is not None: run.append( element )
+			elif element is not None: elements.append( element )
+
+		if len(elements) != len(module.__elements__):
+			module.__elements__[:] = elements
+			module._dirty()
+		[ element.accept(self) for element in elements ]
+
+	@Overrides(Visitor)
+	def visit_instance( self, instance ):
+		""" Merges the shared geometry of an instance once """
+		instance.geometry.accept( self )
+
+	@Overrides(Visitor)
+	def visit_level_of_detail( self, detail ):
+		""" Merges each of the levels """
+		[ level.accept( self ) for level in detail.levels ]
+
+	@staticmethod
+	def key( element ):
+		""" Returns the key that compatible polygons share, or None if the
+			element cannot be merged
+		"""
+		if type(element) is not Polygon or len(element.coordinates.shape) != 2 or \
+				getattr(element,'anchor',None) is not None:
+			return None
+		if len(element.texture) != 0:
+			return (len(element.normals.shape),element.two_sided,'texture')
+		return (len(element.normals.shape),element.two_sided,tuple(element.color))
+
+	@staticmethod
+	def stack( polygons ):
+		""" Returns a polygon holding the given compatible polygons, padded
+			to the greatest number of vertices among them
+		"""
+		num_vertices = max( len(polygon.coordinates) for polygon in polygons )
+		pad = lambda rows : np.concatenate(( rows, np.repeat( rows[-1:],
+			num_vertices - len(rows), axis=0 ) )) if len(rows) < num_vertices else rows
+
+		coordinates = np.array([ pad(np.asarray(polygon.coordinates,dtype=float))
+			for polygon in polygons ])
+		normals = np.array([ polygon.normals if len(polygon.normals.shape) == 1 else
+			pad(polygon.normals[:len(polygon.coordinates)]) for polygon in polygons ],
+			dtype=float)
+		if len(polygons[0].texture) == 0:
+			return Polygon( coords = coordinates, color = polygons[0].color,
+				normals = normals, two_sided = polygons[0].two_sided )
+		textures = [ np.asarray(polygon.texture,dtype=float) for polygon in polygons ]
+		texture = np.array([ pad(texture) if len(texture.shape) == 2 else
+			np.broadcast_to(texture,(num_vertices,4)) for texture in textures ])
+		return Polygon( coords = coordinates, color = polygons[0].color,
+			normals = normals, texture = texture, two_sided = polygons[0].two_sided )
@@ -14,6 +14,9 @@ texture = ['earth.jpg','jupiter.jpg','mars.jpg', 'pluto.jpg'] * 1000
 from Module.Visitors.Visitor import Visitor
 from Module.ClassUtils import Overrides
 from Module.Shapes.SphereGenerator import SphereGenerator
+from Module.Instance import Instance
+from Module.LevelOfDetail import LevelOfDetail
+from Module.Module import Module
 
 typecheck = lambda obj1, obj2 : isinstance(obj1,Polygon) # not OO cool but ok
 islist = lambda obj1 : isinstance(obj1,list) # not OO cool but ok
@@ -24,9 +27,11 @@ class SphereUpdateVisitor(Visitor):
 	"""
 	
 	def update_spheres( self, root ):		
-		SphereGenerator.__cache__ = None
 		# self.texture = texture[:]
-		self.mesh = SphereGenerator(recursion=8).mesh
+		self.mesh = Module()
+		self.mesh.add_element( LevelOfDetail( [ SphereGenerator(recursion=r).mesh
+			for r in range(2,9) ] ) )
+		self.mesh.invisible = 'gouroud'
 		root.accept( self )
 		root._dirty()			
 		
@@ -37,8 +42,12 @@ class SphereUpdateVisitor(Visitor):
 		""" Descends down a module looking for spheres """
 		function = self.mesh.apply_to_scene
 		for i,element in enumerate(module.__elements__):
-			if islist(element.id) and element.id[0] == 'Sphere':
+			if isinstance(element,Instance) and element.id[0] == 'Sphere':
+				element.geometry = self.mesh
+				element._dirty()
+			elif islist(element.id) and element.id[0] == 'Sphere':
 				module.__elements__[i].__elements__[-1] = self.mesh	
+				module.__elements__[i]._dirty()
 				# decorate the sphere's draw method to also texture the sphere
 				def application_decorator( function, mesh, textures ):
 					def inner(environment):
@@ -43,6 +43,20 @@ class TableVisitor(Visitor):
 		if not module.invisible:
 			self.display_info.append( [module,mod_len,self.master_stack[-1]] )
 
+	@Overrides(Visitor)
+	def visit_instance( self, instance ):
+		""" Gathers the information of an instance as that of a module
+			holding the elements of its geometry
+		"""
+		elements = getattr( instance.geometry, '__elements__', [instance.geometry] )
+		
+		if not ( instance in self.exclusions and self.exclusions[instance] ):
+			self.master_stack.append(instance)
+			[element.accept(self) for element in elements]
+			self.master_stack.pop()
+		if not instance.invisible:
+			self.display_info.append( [instance,len(elements),self.master_stack[-1]] )
+
 	@Overrides(Visitor)
 	def visit_polygon( self, poly ):
 		""" Adds a polygon to the table, but only displays 3 at a time
@@ -27,6 +27,18 @@ class Visitor(object):
 		""" visits a drawstate modifier """
 		return None
 	
+	def visit_instance( self, instance ):
+		""" Visits an instance of a shared geometry """
+		return None
+	
+	def visit_level_of_detail( self, detail ):
+		""" Visits an element choosing between resolutions of an object """
+		return None
+	
+	def visit_mesh( self, mesh ):
+		""" Visits an indexed mesh, by default as a generic shape """
+		return self.visit_shape(mesh)
+
 	# less specific than visit polygon
 	def visit_shape( self, shape) : 
 		""" Visitis a generic shape, less specific than polygon """
@@ -116,7 +116,7 @@ class ToolBar(tk.Frame):
 				# Save the image
 				s = ''.join(['0' for i in range(6-\
 					len(str(self.__iter)))]+[str(self.__iter)])				
-				self.canvas.config('image').save('images/gif_base/image_'+s+'.png','PNG')
+				self.canvas.config('image').convert('RGB').save('images/gif_base/image_'+s+'.png','PNG')
 				self.__iter += 1
 				
 			self.canvas.schedule(10,transform,1)
@@ -134,7 +134,7 @@ class ToolBar(tk.Frame):
 				# Save the image
 				s = ''.join(['0' for i in range(6-\
 					len(str(self.__iter)))]+[str(self.__iter)])				
-				self.canvas.config('image').save('images/desktop_controller/image_'+s+'.png','PNG')
+				self.canvas.config('image').convert('RGB').save('images/desktop_controller/image_'+s+'.png','PNG')
 				self.__iter += 1
 				
 			self.canvas.schedule(10,transform,1)
@@ -151,7 +151,7 @@ class ToolBar(tk.Frame):
 			""" Saves an image of the current canvas """
 			s = ''.join(['0' for i in range(6-\
 				len(str(self.__iter)))]+[str(self.__iter)])				
-			self.canvas.config('image').save('images/desktop_controller/image_'+s+'.png','PNG')
+			self.canvas.config('image').convert('RGB').save('images/desktop_controller/image_'+s+'.png','PNG')
 			self.__iter += 1
 		def pickleit(event=None):
 			""" Saves a pickled version of the current scene """
@@ -179,9 +179,11 @@ class ToolBar(tk.Frame):
 				# self.canvas.config('modules')[0].__elements__ = obj.__elements__
 				if len(obj.__elements__) == 3:
 					obj = obj.__elements__[-1]
-					try: obj.__elements__[-1].__elements__[0] = obj.__elements__[0]
+					try: 
+						obj.__elements__[-1].__elements__[0] = obj.__elements__[0]
+						obj.__elements__[-1]._dirty()
 					except:pass
-				self.canvas.config('modules')[0].__elements__.append( obj )
+				self.canvas.config('modules')[0].add_element( obj )
 					
 				self.canvas.update_idletasks()
 				pop.destroy()
@@ -202,6 +204,7 @@ class ToolBar(tk.Frame):
 					raise e
 					return
 				self.canvas.config('modules')[0].__elements__ = obj.__elements__
+				self.canvas.config('modules')[0]._dirty()
 				# self.canvas.config('modules')[0].__elements__.append( obj )
 				self.canvas.update_idletasks()
 				pop.destroy()
@@ -222,11 +225,13 @@ class ToolBar(tk.Frame):
 			module = Module()
 			module.body_color([ int(0.7*255), int(0.2*255), int(0.1*255),255])
 			module.__elements__[0]['surface_color'] = [.3,.3,.3,1]
+			module._dirty()
 			module.scale(16,16,16)
 			shape_factory.cache = False
 			module.add_element(shape_factory.gen_shape(choice.get()))
 			try:
 				module.__elements__[-1].__elements__[0] = module.__elements__[0]
+				module.__elements__[-1]._dirty()
 			except: pass
 			# hacky but we'll fix later
 			if module.__elements__[-1].id[0] == 'Sphere':
@@ -11,21 +11,99 @@
 #ifndef _LIGHTINGH_
 #define _LIGHTINGH_
 
-typedef struct TraceElement TraceElement;
-
-struct TraceElement{
-	double nx, ny, nz;
-	double beta, alpha, depth;
-	int is_reached, r, g, b;
-	TraceElement *next;
-	TraceElement *prev; /* This is a utility, and will not always be set */
+#define MAX_LAYERS 8
+
+typedef struct TraceBuffer TraceBuffer;
+
+struct TraceBuffer{
+	float *depth;
+	float *nx, *ny, *nz;
+	int *color, *surface;
+	unsigned short *alpha, *beta;
+	int *id;
+	int *next;
+	
+	int width, height;
+	int pixels;
+	int size, limit, capacity;
+};
+
+#define LAYERED_TRANSPARENCY 0
+#define K_BUFFER_TRANSPARENCY 1
+#define MAX_FRAGMENTS 16
+
+typedef struct FragmentBuffer FragmentBuffer;
+
+struct FragmentBuffer{
+	float *depth;
+	int *color;
+	float *alpha;
+	unsigned char *count;
 	
-	int one_sided;
-	double Csr,Csg,Csb;
+	int fragments;
+	int capacity, pixel_capacity;
+	int active;
 };
 
+#define LAYER_ALPHA(buffer,layer) ((buffer)->alpha[layer] / 65535.)
+#define LAYER_BETA(buffer,layer) ((buffer)->beta[layer] / 65535.)
+
 typedef struct Lighting Lighting;
 
+typedef struct LightPoint LightPoint;
+
+struct LightPoint{
+	int lx, ly;
+	float lz;
+};
+
+typedef void (*TilePass)( Image *image, const int row_start, const int row_end,
+		const void *args );
+
+#define LIGHTING_RAND_MAX 0x7FFFFFFF
+
+#define UNIFORM_SAMPLING 0
+#define ADAPTIVE_SAMPLING 1
+#define PROGRESSIVE_SAMPLING 2
+
+#define SHADOW_SAMPLER 0
+#define REFLECTION_SAMPLER 1
+#define SAMPLER_KEY_LENGTH 12
+
+typedef struct SampleHistory SampleHistory;
+
+struct SampleHistory{
+	float depth;
+	int strata;
+	float hits;
+	float r, g, b;
+};
+
+typedef struct Sampler Sampler;
+
+struct Sampler{
+	SampleHistory *history;
+	int *coarse;
+	unsigned char *edges, *spread;
+	int radius;
+	int capacity;
+	int width, height;
+	int generation;
+	int frame;
+	double key[SAMPLER_KEY_LENGTH];
+};
+
+typedef struct DepthWalk DepthWalk;
+
+struct DepthWalk{
+	int x_major;
+	int major0, minor0;
+	int major_step, minor_step;
+	int n, m;
+	int t, level;
+	double w0, winc;
+};
+
 struct Lighting{
 	int** lights;
 	int** light_types;
@@ -68,6 +146,14 @@ void compute_point_light(
 void trace_shadow_from_point( Image *image, const int lx,
 						const int ly, const float lz );
 						
+void map_shadow_from_point( Image *image, const int lx, const int ly,
+						const float lz, const double darkness );
+
+void set_shadow_map_parameters( const int enabled, const int size,
+	const int filter, const double bias );
+
+int shadow_map_is_enabled();
+						
 void trace_reflection_from_point( Image *image, const int lx,
 						const int ly, const float lz );
 
@@ -92,4 +178,73 @@ Lighting *get_lighting_buffer();
 
 void iterate_lighting( Image *image);
 
+void set_lighting_threads( const int threads );
+
+void set_lighting_seed( const unsigned int seed );
+
+unsigned int row_random_state( const int row );
+
+int next_random( unsigned int *state );
+
+void run_tiles( TilePass pass, Image *image, const void *args );
+
+void set_sampling_mode( const int mode, const int new_samples_per_frame );
+
+void reset_sampling();
+
+int get_sampling_mode();
+
+int get_samples_per_frame();
+
+Sampler *get_sampler( const int pass );
+
+int prepare_sampler( Sampler *sampler, const Image *image, const double *key,
+	const int key_length );
+
+SampleHistory *pixel_history( Sampler *sampler, const int index, const float depth );
+
+unsigned int sampler_random_state( const Sampler *sampler, const int row );
+
+int stratum( const int s, const int n );
+
+void find_edges( Sampler *sampler, Image *image, const int radius );
+
+void report_unconverged();
+
+int sampling_converged();
+
+void set_layer_pool_size( const int layers );
+
+TraceBuffer *get_trace_buffer();
+
+int reset_trace_buffer( const int width, const int height );
+
+int insert_layer( TraceBuffer *buffer, const int pixel, const float depth );
+
+void write_layer( TraceBuffer *buffer, const int layer, const float depth,
+	const int r, const int g, const int b, const double alpha,
+	const double beta, const double nx, const double ny, const double nz,
+	const double *surface_color, const int id );
+
+void set_transparency_mode( const int mode, const int fragments );
+
+FragmentBuffer *get_fragment_buffer();
+
+int reset_fragment_buffer( const int width, const int height );
+
+void add_fragment( FragmentBuffer *buffer, const int pixel, const float depth,
+	const int r, const int g, const int b, const double alpha );
+
+void set_depth_pyramid( const int enabled );
+
+void invalidate_depth_pyramid();
+
+int update_depth_pyramid( Image *image );
+
+void start_walk( DepthWalk *walk, const int x0, const int y0, const int x1,
+	const int y1, const double w0, const double winc );
+
+int next_walk_step( DepthWalk *walk, const double tolerance, int *x, int *y,
+	double *w );
+
 #endif
\ No newline at end of file
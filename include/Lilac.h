@@ -37,7 +37,6 @@
 
 int get_width();
 int get_height();
-TraceElement* get_trace_buffer();
 Texture* get_texture_buffer();
 Texture* get_bump_map();
 
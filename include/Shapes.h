@@ -66,6 +66,9 @@ inline void plot_polygon( Image image, float* points,
 		double* colors, 
 		int num_points, int band_size, double nx, double ny, double nz );
 
+void plot_polygons( Image image, float* points, double* colors,
+		float* normals, int num_polygons, int num_edges );
+
 typedef struct Anchors Anchors;
 struct Anchors{ int num_anchors; int *anchor_points; };		
 Anchors *get_anchors();
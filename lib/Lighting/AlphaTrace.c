@@ -1,6 +1,10 @@
 /*
  * This file contains functionality to apply alpha blending to a 3D scene.
  *
+ * In the k-buffer transparency mode, the transparent fragments kept aside
+ * while drawing (see FragmentBuffer.c) are blended over the image instead
+ * of the layers of the trace buffer.
+ *
  * Author: Matthew Levine
  * Date: 10/15/2014
 */
@@ -18,6 +22,14 @@ static int background_blend_color[3] = { 255, 255, 255 };
 /* Local subroutine header, see below */
 void trace_alpha( int row, int col, Image *image );
 
+/* Local subroutine header for blending a tile of rows, run on the lighting
+ * thread pool (see LightingTiles.c)
+*/
+static void trace_alpha_rows( Image *image, const int row_start,
+						const int row_end, const void *args );
+static void resolve_fragment_rows( Image *image, const int row_start,
+						const int row_end, const void *args );
+
 /* The front end links its background changing function to this function
  * so that the alpha color is always consistent with the scene background
 */
@@ -29,16 +41,26 @@ void set_background_color( int const r, int const g, int const b ){
 
 /* Updates alpha values based on the transparency at each point */
 void trace_alpha_from_point( Image *image ){
+	FragmentBuffer *fragment_buffer = get_fragment_buffer();
+	if (fragment_buffer){
+		run_tiles( resolve_fragment_rows, image, fragment_buffer );
+		return;
+	}
+	run_tiles( trace_alpha_rows, image, NULL );
+}
+
+/* Updates the alpha values of rows [row_start,row_end) of the image */
+static void trace_alpha_rows( Image *image, const int row_start,
+						const int row_end, const void *args ){
 	
 	float* depth_buffer = image->zbuffer;
 	int width = image->width;
-	int height = image->height;
 	
 	int row,col;
 	/* iAt each point, alpha blend if relevvant
 	*/
 	float depth;
-	for (row = 0; row < height; row++){
+	for (row = row_start; row < row_end; row++){
 		for (col = 0; col < width; col++){
 			depth = depth_buffer[row*width+col];			
 			if (depth > 100) continue;
@@ -48,49 +70,86 @@ void trace_alpha_from_point( Image *image ){
 	
 }
 
+/* Blends the transparent fragments of rows [row_start,row_end) over the
+ * image, back to front, leaving out those behind each pixel's surface
+*/
+static void resolve_fragment_rows( Image *image, const int row_start,
+						const int row_end, const void *args ){
+	
+	const FragmentBuffer *buffer = (const FragmentBuffer *) args;
+	float* depth_buffer = image->zbuffer;
+	int* pixels = image->pixel_data;
+	const int width = image->width;
+	const int k = buffer->fragments;
+	
+	int row,col,i;
+	for (row = row_start; row < row_end; row++){
+		for (col = 0; col < width; col++){
+			const int index = row*width+col;
+			const int count = buffer->count[index];
+			if (!count) continue;
+			
+			const int first = index * k;
+			int color = pixels[index];
+			int rr = color & 0xFF;
+			int gg = ( color >> 8 ) & 0xFF;
+			int bb = ( color >> 16 ) & 0xFF;
+			
+			/* The fragments are sorted nearest first */
+			for (i = count - 1; i >= 0; i--){
+				const float depth = buffer->depth[first + i];
+				if (depth >= depth_buffer[index]) continue;
+				/* Don't blend a fragment drawn twice in the same place */
+				if (i && depth - buffer->depth[first + i - 1] < ALPHA_TOLERANCE) continue;
+				
+				const double alpha = buffer->alpha[first + i];
+				color = buffer->color[first + i];
+				rr = rr * alpha + (( color >> 16 ) & 0xFF) * (1-alpha);
+				gg = gg * alpha + (( color >> 8 ) & 0xFF) * (1-alpha);
+				bb = bb * alpha + (color & 0xFF) * (1-alpha);
+			}
+			
+			pixels[index] = (bb<<16)+(gg<<8)+rr;
+		}
+	}
+}
+
 /* Subroutine for computing the blended color at a particular pixel */
 void trace_alpha( int row, int col, Image *image ){
-	TraceElement* trace_buffer = get_trace_buffer();
+	TraceBuffer* trace_buffer = get_trace_buffer();
 	int* pixels = image->pixel_data;
 	const int index = row * image->width + col;
 
-	/* One challenging part of this is doing the process with as few pointers
-	 * as possible. 1 would be easy if I didn't have to double check every
-	 * pixel.
+	/* Gather the layers, which are at most MAX_LAYERS deep, so that they can
+	 * be walked from the back
 	*/
-	TraceElement *cur = &trace_buffer[index];
-	cur->prev = NULL;
-	TraceElement *next;
-
-	/* Doubly link the list */
-	while (cur->next){
-		cur->next->prev = cur;
-		cur = cur->next;
-	}
+	int layers[MAX_LAYERS];
+	int count = 0, layer, i, j;
+	for (layer = index; layer >= 0 && count < MAX_LAYERS; layer = trace_buffer->next[layer])
+		layers[count++] = layer;
 	
 	int rr = background_blend_color[0]; 
 	int gg = background_blend_color[1]; 
 	int bb = background_blend_color[2];
 	
-	/* Iterate backwards through the list */
-	while(cur){
+	/* Iterate backwards through the layers */
+	for (i = count - 1; i >= 0; i--){
+		const int cur = layers[i];
+		const float depth = trace_buffer->depth[cur];
 		int has_been_marked = 0;
 
 		/* Walk through, checking if we've seen this in a higher level pixel */
-		next = cur->prev;
-		while (next){
-			/* There's no short circuit here, which is bad */
-			has_been_marked += ( fabs(cur->depth - next->depth) < ALPHA_TOLERANCE );
-			next = next->prev;
+		for (j = i - 1; j >= 0 && !has_been_marked; j--){
+			has_been_marked = fabs(depth - trace_buffer->depth[layers[j]]) < ALPHA_TOLERANCE;
 		}
 		
 		if (!has_been_marked){
-			rr = rr * cur->alpha + (cur->r) * (1-cur->alpha);
-			gg = gg * cur->alpha + (cur->g) * (1-cur->alpha);
-			bb = bb * cur->alpha + (cur->b) * (1-cur->alpha);	
+			const double alpha = LAYER_ALPHA( trace_buffer, cur );
+			const int color = trace_buffer->color[cur];
+			rr = rr * alpha + (( color >> 16 ) & 0xFF) * (1-alpha);
+			gg = gg * alpha + (( color >> 8 ) & 0xFF) * (1-alpha);
+			bb = bb * alpha + (color & 0xFF) * (1-alpha);	
 		}
-		
-		cur = cur->prev;
 	}
 
 	
@@ -0,0 +1,282 @@
+/* This file holds the depth pyramid that speeds up the ray walks of the
+ * shadow and reflection passes.
+ *
+ * Both passes walk a Bresenham line through the trace buffer and, at every
+ * pixel of the line, look through all of the layers there for one whose
+ * depth is within a tolerance of the ray's. Most of those pixels hold
+ * nothing near the ray. The pyramid records, for every pixel, the least
+ * and greatest depth of its layers, and, for every level above, the least
+ * and greatest depth over each 2x2 block of the level below, up to a single
+ * cell covering the whole image. It is built once per frame, when a pass
+ * first needs it after the trace buffer is reset.
+ *
+ * The walks step through the pyramid rather than through every pixel (see
+ * next_walk_step). At a cell of some level, the span of the line that lies
+ * in the cell is found, along with the range of depths the ray takes over
+ * that span; if that range is farther than the tolerance from every depth
+ * in the cell, the whole span is skipped and the walk tries the next level
+ * up, and otherwise it goes down a level. Only the pixels that the pyramid
+ * cannot rule out reach the exact test of the caller, so a walk over empty
+ * space costs steps logarithmic in its length rather than linear.
+ *
+ * The line stepped through is the very line of the Bresenham walks: the
+ * minor coordinate of step t of a line n steps long, whose minor coordinate
+ * changes by m over those steps, is floor((2tm + n - 1) / 2n). The ray's
+ * inverse depth is evaluated at each step rather than summed step by step.
+ *
+ * Layers deeper than the background are left out of the pyramid, so a
+ * span is only skipped when the ray stays in front of the background.
+ *
+ * The pyramid can be turned off (see set_depth_pyramid), in which case the
+ * walks step through every pixel of their lines; the shadows and
+ * reflections drawn are the same either way.
+ *
+ * Date: 10/18/2026
+*/
+
+#include <C:\Users\Dev\Desktop\Lilac\include\Lilac.h>
+#include <float.h>
+
+/* Depths greater than this belong to pixels no polygon was drawn on */
+#define BACKGROUND_DEPTH 100
+/* Upper bound on the number of levels, enough for any image */
+#define MAX_LEVELS 32
+
+/* The least and greatest depths of the cells, level after level; level l
+   is widths[l] by heights[l] cells from offsets[l] */
+static float *least = NULL;
+static float *greatest = NULL;
+static int pyramid_capacity = 0;
+static int offsets[MAX_LEVELS];
+static int widths[MAX_LEVELS];
+static int heights[MAX_LEVELS];
+static int levels = 0;
+/* Whether the pyramid was built from the current trace buffer */
+static int pyramid_valid = 0;
+/* Whether the walks may step through the pyramid at all */
+static int pyramid_enabled = 1;
+
+/* Marks the pyramid as out of date, to be called whenever the trace buffer
+ * is reset
+*/
+void invalidate_depth_pyramid(){
+	pyramid_valid = 0;
+	levels = 0;
+}
+
+/* Sets whether the walks step through the pyramid (1) or through every
+ * pixel of their lines (0), from the next pass on
+*/
+void set_depth_pyramid( const int enabled ){
+	pyramid_enabled = enabled;
+	invalidate_depth_pyramid();
+}
+
+/* Records the depths of the pixels of rows [row_start,row_end) as the
+ * lowest level of the pyramid
+*/
+static void build_pixel_rows( Image *image, const int row_start,
+	const int row_end, const void *args ){
+
+	const TraceBuffer *trace_buffer = (const TraceBuffer *) args;
+	const int width = image->width;
+	int row,col;
+	for (row = row_start; row < row_end; row++){
+		for (col = 0; col < width; col++){
+			const int index = row * width + col;
+			float low = FLT_MAX, high = -FLT_MAX;
+
+			/* The walks never look at the first row or column */
+			if (row && col){
+				int layer;
+				for (layer = index; layer >= 0; layer = trace_buffer->next[layer]){
+					const float depth = trace_buffer->depth[layer];
+					if (depth <= BACKGROUND_DEPTH){
+						if (depth < low) low = depth;
+						if (depth > high) high = depth;
+					}
+				}
+			}
+			least[index] = low;
+			greatest[index] = high;
+		}
+	}
+}
+
+/* Builds the pyramid from the trace buffer over the image if it is out of
+ * date. Returns 0 if there is no pyramid to walk through.
+*/
+int update_depth_pyramid( Image *image ){
+	if (!pyramid_enabled) return levels = 0;
+	if (pyramid_valid) return levels;
+
+	TraceBuffer *trace_buffer = get_trace_buffer();
+	if (!trace_buffer) return levels = 0;
+
+	/* Lay out the levels, halving (rounding up) to a single cell */
+	int level = 0, cells = 0;
+	int width = image->width, height = image->height;
+	while (level < MAX_LEVELS){
+		offsets[level] = cells;
+		widths[level] = width;
+		heights[level] = height;
+		cells += width * height;
+		level++;
+		if (width == 1 && height == 1) break;
+		width = (width + 1) / 2;
+		height = (height + 1) / 2;
+	}
+
+	if (pyramid_capacity < cells){
+		float *grown = realloc( least, sizeof(float) * cells );
+		if (!grown) return levels = 0;
+		least = grown;
+		grown = realloc( greatest, sizeof(float) * cells );
+		if (!grown) return levels = 0;
+		greatest = grown;
+		pyramid_capacity = cells;
+	}
+
+	run_tiles( build_pixel_rows, image, trace_buffer );
+
+	/* Each cell above takes the extremes of the 2x2 block below it */
+	int l,i,j,a,b;
+	for (l = 1; l < level; l++){
+		const int below = offsets[l-1], above = offsets[l];
+		for (j = 0; j < heights[l]; j++){
+			for (i = 0; i < widths[l]; i++){
+				float low = FLT_MAX, high = -FLT_MAX;
+				for (b = 2*j; b <= 2*j + 1 && b < heights[l-1]; b++){
+					for (a = 2*i; a <= 2*i + 1 && a < widths[l-1]; a++){
+						const int index = below + b * widths[l-1] + a;
+						if (least[index] < low) low = least[index];
+						if (greatest[index] > high) high = greatest[index];
+					}
+				}
+				least[above + j * widths[l] + i] = low;
+				greatest[above + j * widths[l] + i] = high;
+			}
+		}
+	}
+
+	levels = level;
+	pyramid_valid = 1;
+	return levels;
+}
+
+/* Readies a walk of n steps along the Bresenham line from (x0,y0) towards
+ * (x1,y1), over which the inverse depth of the ray starts at w0 and grows by
+ * winc a step
+*/
+void start_walk( DepthWalk *walk, const int x0, const int y0, const int x1,
+	const int y1, const double w0, const double winc ){
+
+	const int dx = x1 > x0 ? x1 - x0 : x0 - x1;
+	const int dy = y1 > y0 ? y1 - y0 : y0 - y1;
+
+	walk->x_major = dx >= dy;
+	walk->major0 = walk->x_major ? x0 : y0;
+	walk->minor0 = walk->x_major ? y0 : x0;
+	walk->major_step = walk->x_major ? (x0 < x1 ? 1 : -1) : (y0 < y1 ? 1 : -1);
+	walk->minor_step = walk->x_major ? (y0 < y1 ? 1 : -1) : (x0 < x1 ? 1 : -1);
+	walk->n = walk->x_major ? dx : dy;
+	walk->m = walk->x_major ? dy : dx;
+	walk->w0 = w0;
+	walk->winc = winc;
+	walk->t = 0;
+	walk->level = 0;
+}
+
+/* Returns the inverse depth of the ray at step t */
+static double inverse_depth( const DepthWalk *walk, const long long t ){
+	return t ? walk->w0 + t * walk->winc : walk->w0;
+}
+
+/* Returns the first step at or after t at which the line leaves the cell of
+ * the given level that it is in at t
+*/
+static long long cell_exit( const DepthWalk *walk, const int level,
+	const long long t, const int major, const int minor ){
+
+	const long long n = walk->n, m = walk->m;
+
+	/* How many more steps stay in the cell along the major axis */
+	const int cell = major >> level;
+	long long exit = t + (walk->major_step > 0 ?
+		((cell + 1) << level) - major : major - (cell << level) + 1);
+
+	/* The first step whose minor coordinate, floor((2tm + n - 1) / 2n),
+	   has moved q past the start of the line, out of the cell */
+	if (m){
+		const int c = minor >> level;
+		const long long q = walk->minor_step > 0 ?
+			((long long) (c + 1) << level) - walk->minor0 :
+			walk->minor0 - ((long long) c << level) + 1;
+		const long long leave = (2 * n * q - n + 1 + 2 * m - 1) / (2 * m);
+		if (leave < exit) exit = leave;
+	}
+	return exit < n ? exit : n;
+}
+
+/* Returns whether the ray keeps farther than the tolerance from every depth
+ * of the given cell over steps [first,last]
+*/
+static int cell_is_clear( const DepthWalk *walk, const int level,
+	const int i, const int j, const long long first, const long long last,
+	const double tolerance ){
+
+	/* Cells off the image hold nothing the walks would look at */
+	if (i < 0 || j < 0 || i >= widths[level] || j >= heights[level]) return 1;
+
+	/* The depth is monotonic over the span unless the ray crosses w = 0 */
+	const double wa = inverse_depth( walk, first );
+	const double wb = inverse_depth( walk, last );
+	if (!((wa > 0 && wb > 0) || (wa < 0 && wb < 0))) return 0;
+	const double da = 1 / wa, db = 1 / wb;
+	const double dmin = da < db ? da : db;
+	const double dmax = da < db ? db : da;
+
+	/* Leave room for rounding between this and the caller's own test */
+	const double reach = tolerance + 1e-9 * (fabs(dmin) + fabs(dmax));
+	if (!(dmax < BACKGROUND_DEPTH - reach)) return 0;
+
+	const int index = offsets[level] + j * widths[level] + i;
+	return dmax < least[index] - reach || dmin > greatest[index] + reach;
+}
+
+/* Advances the walk to the next step that the pyramid cannot rule out,
+ * setting (x,y) to its pixel and w to the ray's inverse depth there.
+ * Returns 0 once the walk is over. With no pyramid built, every step of the
+ * line is returned.
+*/
+int next_walk_step( DepthWalk *walk, const double tolerance, int *x, int *y,
+	double *w ){
+
+	while (walk->t < walk->n){
+		const long long t = walk->t;
+		const int major = walk->major0 + walk->major_step * (int) t;
+		const int minor = walk->minor0 + walk->minor_step *
+			(int) ((2 * t * walk->m + walk->n - 1) / (2 * walk->n));
+
+		if (walk->level == 0 || levels == 0){
+			*x = walk->x_major ? major : minor;
+			*y = walk->x_major ? minor : major;
+			*w = inverse_depth( walk, t );
+			walk->t++;
+			if (levels > 1) walk->level = 1;
+			return 1;
+		}
+
+		const int level = walk->level;
+		const long long exit = cell_exit( walk, level, t, major, minor );
+		const int i = (walk->x_major ? major : minor) >> level;
+		const int j = (walk->x_major ? minor : major) >> level;
+		if (cell_is_clear( walk, level, i, j, t, exit - 1, tolerance )){
+			walk->t = exit;
+			if (level + 1 < levels) walk->level++;
+		}else{
+			walk->level--;
+		}
+	}
+	return 0;
+}
@@ -0,0 +1,147 @@
+/* This file holds the fragment buffer of order-independent transparency.
+ *
+ * By default, transparent polygons are drawn into the trace buffer like any
+ * other, and the transparency pass blends the layers of each pixel back to
+ * front (see AlphaTrace.c). In the k-buffer mode, the fragments of
+ * transparent polygons are instead kept aside during rasterization, in a
+ * fixed number k of slots per pixel, and the opaque scene alone is drawn,
+ * lit, shadowed and reflected. The transparency pass then blends the
+ * fragments in front of each opaque surface over it, back to front, in one
+ * pass over the image.
+ *
+ * The slots of a pixel are kept sorted, nearest first, by depth, then by
+ * alpha, then by color, which orders any two fragments that differ at all.
+ * The slots therefore hold the k nearest fragments of the pixel whatever
+ * order the polygons were drawn in, and they blend to the same color; the
+ * fragments past the k nearest are dropped. The slots are arrays of the
+ * depths, colors and alphas of the fragments, sized once for the image;
+ * a new frame only empties them.
+ *
+ * As the transparent polygons are not in the trace buffer in this mode,
+ * they cast no traced shadows and show in no reflections.
+ *
+ * Date: 10/18/2026
+*/
+
+#include <C:\Users\Dev\Desktop\Lilac\include\Lilac.h>
+#include <string.h>
+
+/* How transparent polygons are drawn and blended */
+static int transparency_mode = LAYERED_TRANSPARENCY;
+/* How many fragments each pixel keeps in the k-buffer mode */
+static int fragments_per_pixel = 4;
+
+static FragmentBuffer fragment_buffer = { 0 };
+
+/* Sets how transparent polygons are drawn and blended and, in the k-buffer
+ * mode, how many fragments each pixel keeps (at most MAX_FRAGMENTS). Values
+ * outside of their domain are not set and a warning is registered to
+ * standard output. The change takes effect from the next frame on.
+*/
+void set_transparency_mode( const int mode, const int fragments ){
+	if (mode != LAYERED_TRANSPARENCY && mode != K_BUFFER_TRANSPARENCY){
+		printf("Warning: unknown transparency mode %d\n", mode);
+	}else{
+		transparency_mode = mode;
+	}
+
+	if (fragments < 1 || fragments > MAX_FRAGMENTS){
+		printf("Warning: the fragments per pixel must be between 1 and %d\n",
+			MAX_FRAGMENTS);
+	}else{
+		fragments_per_pixel = fragments;
+	}
+}
+
+/* Returns the fragment buffer that transparent polygons are drawn into
+ * this frame, or NULL if they are drawn into the trace buffer
+*/
+FragmentBuffer *get_fragment_buffer(){
+	return fragment_buffer.active ? &fragment_buffer : NULL;
+}
+
+/* Readies the buffer for a frame of an image of the given dimensions in the
+ * current mode, emptying every pixel. Returns 0 if it could not be
+ * allocated, in which case transparent polygons are drawn into the trace
+ * buffer this frame.
+*/
+int reset_fragment_buffer( const int width, const int height ){
+	FragmentBuffer *buffer = &fragment_buffer;
+	const int pixels = width * height;
+	const int slots = pixels * fragments_per_pixel;
+
+	buffer->active = 0;
+	if (transparency_mode != K_BUFFER_TRANSPARENCY) return 1;
+
+	if (buffer->capacity < slots){
+		float *depth = realloc( buffer->depth, sizeof(float) * slots );
+		if (depth) buffer->depth = depth;
+		int *color = realloc( buffer->color, sizeof(int) * slots );
+		if (color) buffer->color = color;
+		float *alpha = realloc( buffer->alpha, sizeof(float) * slots );
+		if (alpha) buffer->alpha = alpha;
+		if (!(depth && color && alpha)){
+			printf("Warning: no memory for the fragment buffer\n");
+			return 0;
+		}
+		buffer->capacity = slots;
+	}
+	if (buffer->pixel_capacity < pixels){
+		unsigned char *count = realloc( buffer->count, pixels );
+		if (!count){
+			printf("Warning: no memory for the fragment buffer\n");
+			return 0;
+		}
+		buffer->count = count;
+		buffer->pixel_capacity = pixels;
+	}
+
+	buffer->fragments = fragments_per_pixel;
+	memset( buffer->count, 0, pixels );
+	buffer->active = 1;
+	return 1;
+}
+
+/* Returns whether fragment a belongs behind fragment b */
+static int behind( const float depth_a, const float alpha_a, const int color_a,
+	const float depth_b, const float alpha_b, const int color_b ){
+
+	if (depth_a != depth_b) return depth_a > depth_b;
+	if (alpha_a != alpha_b) return alpha_a > alpha_b;
+	return color_a > color_b;
+}
+
+/* Adds a transparent fragment to the given pixel, in its place among the
+ * pixel's nearest fragments
+*/
+void add_fragment( FragmentBuffer *buffer, const int pixel, const float depth,
+	const int r, const int g, const int b, const double alpha ){
+
+	const int k = buffer->fragments;
+	const int first = pixel * k;
+	const int color = (r<<16) + (g<<8) + b;
+	int count = buffer->count[pixel];
+
+	/* Drop the fragment if it lies behind all of a full pixel */
+	if (count == k && !behind( buffer->depth[first + k - 1],
+			buffer->alpha[first + k - 1], buffer->color[first + k - 1],
+			depth, (float) alpha, color )){
+		return;
+	}
+
+	/* Move the fragments behind it one slot back, dropping the last */
+	int slot = count < k ? count : k - 1;
+	while (slot > 0 && behind( buffer->depth[first + slot - 1],
+			buffer->alpha[first + slot - 1], buffer->color[first + slot - 1],
+			depth, (float) alpha, color )){
+		buffer->depth[first + slot] = buffer->depth[first + slot - 1];
+		buffer->alpha[first + slot] = buffer->alpha[first + slot - 1];
+		buffer->color[first + slot] = buffer->color[first + slot - 1];
+		slot--;
+	}
+
+	buffer->depth[first + slot] = depth;
+	buffer->alpha[first + slot] = (float) alpha;
+	buffer->color[first + slot] = color;
+	if (count < k) buffer->count[pixel] = count + 1;
+}
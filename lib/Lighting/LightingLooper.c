@@ -2,80 +2,134 @@
  * This file iterates through an image and does basic lighting
  * computations at each pixel
  *
+ * The image is walked in row-major order, as the pixels, the z-buffer and
+ * the trace buffer are laid out. Each row is first reduced to a list of
+ * spans of drawn pixels, so that the shading loop never visits background
+ * pixels. The span list is kept between frames and only grows when the
+ * image does; the shading output lives on the stack, so the loop makes no
+ * allocator calls.
+ *
+ * Once the spans are found, the rows are shaded in tiles on the lighting
+ * thread pool (see LightingTiles.c).
+ *
  * Author: Matthew Levine
  * Date: 11/10/2014
 */
 
 #include <C:\Users\Dev\Desktop\Lilac\include\Lilac.h>
 
+/* Depths greater than this belong to pixels no polygon was drawn on */
+#define BACKGROUND_DEPTH 100
+
+/* Span list scratch, kept in the data section between frames. Row r owns
+   width+2 entries starting at r*(width+2): the number of spans in the row
+   followed by the [start,end) columns of each span. */
+static int *spans = NULL;
+static int spans_capacity = 0;
+
+/* Fills the span list of the image, returning 0 if it could not be
+   allocated */
+static int find_spans( const float *zbuf, const int width, const int height ){
+	const int stride = width + 2;
+	if (spans_capacity < stride * height){
+		int *grown = realloc( spans, sizeof(int) * stride * height );
+		if (!grown) return 0;
+		spans = grown;
+		spans_capacity = stride * height;
+	}
+
+	int row,col;
+	for (row = 0; row < height; row++){
+		const float *depths = &zbuf[row * width];
+		int *row_spans = &spans[row * stride];
+		int count = 0;
+		col = 0;
+		while (col < width){
+			while (col < width && depths[col] > BACKGROUND_DEPTH) col++;
+			if (col == width) break;
+			row_spans[1 + 2*count] = col;
+			while (col < width && depths[col] <= BACKGROUND_DEPTH) col++;
+			row_spans[2 + 2*count] = col;
+			count++;
+		}
+		row_spans[0] = count;
+	}
+	return 1;
+}
+
+/* Shades the drawn pixels of rows [row_start,row_end) of the image */
+static void light_rows( Image *image, const int row_start, const int row_end,
+		const void *args ){
+
+	const Lighting *L = (const Lighting *) args;
+	TraceBuffer *trace_buffer = get_trace_buffer();
+	int *pixels = image->pixel_data;
+	const float *zbuf = image->zbuffer;
+	const int width = image->width;
+
+	/* shade writes its output into the slots of an int* array */
+	int *base[4];
+
+	int row,col,span,index;
+	for (row = row_start; row < row_end; row++){
+		const int *row_spans = &spans[row * (width + 2)];
+		for (span = 0; span < row_spans[0]; span++){
+			const int end = row_spans[2 + 2*span];
+			for (col = row_spans[1 + 2*span]; col < end; col++){
+				index = row * width + col;
+				const double depth = zbuf[index];
+				const int color = trace_buffer->color[index];
+				const int surface = trace_buffer->surface[index];
+				int r = ( color >> 16 ) & 0xFF;
+				int g = ( color >> 8 ) & 0xFF;
+				int b = color & 0xFF;
+
+				base[0] = 0;
+				base[1] = 0;
+				base[2] = 0;
+				base[3] = 0;
+
+				shade( L->lights, L->light_types, L->num_lights,
+						r/255., g/255., b/255.,
+						base, L->light_pos,
+						row, col, depth,
+						(( surface >> 16 ) & 0xFF)/255., (( surface >> 8 ) & 0xFF)/255.,
+						(surface & 0xFF)/255.,
+						L->view_x, L->view_y, L->view_z,
+						trace_buffer->nx[index], trace_buffer->ny[index], trace_buffer->nz[index],
+						/*el->one_sided*/1, L->sharpness );
+
+				int r1 = (int) base[0];
+				int g1 = (int) base[1];
+				int b1 = (int) base[2];
+				r1 = r1 < 0 ? 0 : r1 > 255 ? 255 : r1;
+				g1 = g1 < 0 ? 0 : g1 > 255 ? 255 : g1;
+				b1 = b1 < 0 ? 0 : b1 > 255 ? 255 : b1;
+
+				trace_buffer->color[index] = (r1 << 16) + (g1 << 8) + b1;
+				pixels[index] = trace_buffer->color[index];
+			}
+		}
+	}
+}
 
 void iterate_lighting( Image *image){
 
 	Lighting *L = get_lighting_buffer();
 	if (!L){
 		printf("Warning: No global lighting information to illustrate scene with");
-		return;	
+		return;
 	}
 
-	int *pixels = image->pixel_data;
-	double *zbuf = image->zbuffer;
-	const int width = image->width;
-	const int height = image->height;
-	
-	TraceElement *trace_buffer = get_trace_buffer();
-	if (!trace_buffer){
+	if (!get_trace_buffer()){
 		printf("Warning: no trace buffer to illustrate scene with\n");
 		return;
 	}
-	
-	float* vtm = L->vtm;
-
-	
-	int row,col,index;
-	for (col = 0; col < width; col++){
-		for (row = 0; row < height; row++){
-			index = row * width + col;
-			double depth = zbuf[index];
-
-			if (depth > 100) continue;
-			TraceElement *el = &trace_buffer[index];
-			int r = el->r;
-			int g = el->g;
-			int b = el->b;
-			
-			int **base = malloc(sizeof(int*) * 4); /* Almost a mem leak :) */
-			base[0] = 0;
-			base[1] = 0;
-			base[2] = 0;
-			base[3] = 0;
-
-			double objx,objy,objz,nx,ny,nz;
-			
-			shade( L->lights, L->light_types, L->num_lights,
-					r/255., g/255., b/255., 
-					base, L->light_pos,
-					row, col, depth,
-					el->Csr, el->Csg, el->Csb,
-					L->view_x, L->view_y, L->view_z,
-					el->nx, el->ny, el->nz,
-					/*el->one_sided*/1, L->sharpness );
-
-			int r1 = (int) base[0];
-			int g1 = (int) base[1];
-			int b1 = (int) base[2];
-			r1 = r1 < 0 ? 0 : r1 > 255 ? 255 : r1;
-			g1 = g1 < 0 ? 0 : g1 > 255 ? 255 : g1;
-			b1 = b1 < 0 ? 0 : b1 > 255 ? 255 : b1;
-			
-			el->r = r1;
-			el->g = g1;
-			el->b = b1;
-			
-
-			pixels[index] = (r1 << 16) + (g1 << 8) + b1;			
-			free(base);			
-		}
+
+	if (!find_spans( image->zbuffer, image->width, image->height )){
+		printf("Warning: no memory for the span list to illustrate scene with\n");
+		return;
 	}
-	
-}
 
+	run_tiles( light_rows, image, L );
+}
@@ -0,0 +1,136 @@
+/* This file runs the deferred lighting passes (global lighting, shadows,
+ * reflections and transparency) over an image on a pool of threads.
+ *
+ * Every pass computes each pixel from the trace buffer and from that pixel
+ * alone, so the image is cut into tiles of whole rows, which the threads
+ * take in turn from a shared counter until none are left. The calling
+ * thread works through tiles as well, so a pool of one thread is simply the
+ * old single-threaded loop.
+ *
+ * The passes that jitter their rays draw from a random stream per row rather
+ * than from the C-standard rand function, which is shared by all threads and
+ * not safe to call from them. Each stream is seeded from the lighting seed
+ * and the row, so a frame is the same for a given seed however many threads
+ * draw it and in whatever order the tiles are taken.
+ *
+ * Date: 10/18/2026
+*/
+
+#include <C:\Users\Dev\Desktop\Lilac\include\Lilac.h>
+
+/* How many rows each thread takes from the image at a time */
+#define TILE_ROWS 16
+/* Upper bound on the size of the pool */
+#define MAX_LIGHTING_THREADS 64
+
+/* How many threads draw the lighting passes */
+static int lighting_threads = 1;
+/* Seed of the random streams of the rows */
+static unsigned int lighting_seed = 0;
+
+/* The tiles of an image left to a pass, shared by the threads of the pool */
+typedef struct TileQueue TileQueue;
+
+struct TileQueue{
+	TilePass pass;
+	Image *image;
+	const void *args;
+	int next_row;
+	pthread_mutex_t lock;
+};
+
+/* Sets the number of threads that draw the lighting passes. Values outside
+ * of [1,MAX_LIGHTING_THREADS] are not set, and a warning is registered to
+ * standard output.
+*/
+void set_lighting_threads( const int threads ){
+	if (threads < 1 || threads > MAX_LIGHTING_THREADS){
+		printf("Warning: the number of lighting threads must be between 1 and %d\n",
+			MAX_LIGHTING_THREADS);
+		return;
+	}
+	lighting_threads = threads;
+}
+
+/* Sets the seed of the random streams used by the lighting passes */
+void set_lighting_seed( const unsigned int seed ){
+	lighting_seed = seed;
+}
+
+/* Returns the initial state of the random stream of the given row. The
+ * seed and the row are mixed so that neighbouring rows do not start from
+ * neighbouring states.
+*/
+unsigned int row_random_state( const int row ){
+	unsigned int x = lighting_seed ^ (0x9E3779B9u * (unsigned int) (row + 1));
+	x ^= x >> 16;
+	x *= 0x7FEB352Du;
+	x ^= x >> 15;
+	x *= 0x846CA68Bu;
+	x ^= x >> 16;
+	return x ? x : 0x9E3779B9u; /* the stream never leaves zero */
+}
+
+/* Advances a random stream (xorshift), returning a number in
+ * [0,LIGHTING_RAND_MAX]
+*/
+int next_random( unsigned int *state ){
+	unsigned int x = *state;
+	x ^= x << 13;
+	x ^= x >> 17;
+	x ^= x << 5;
+	*state = x;
+	return (int) (x >> 1);
+}
+
+/* Takes tiles from the queue and runs the pass over them until the image
+ * is done
+*/
+static void *work_tiles( void *voidqueue ){
+	TileQueue *queue = (TileQueue *) voidqueue;
+	const int height = queue->image->height;
+	int row;
+
+	while (1){
+		pthread_mutex_lock( &queue->lock );
+		row = queue->next_row;
+		queue->next_row += TILE_ROWS;
+		pthread_mutex_unlock( &queue->lock );
+
+		if (row >= height) break;
+		queue->pass( queue->image, row,
+			row + TILE_ROWS < height ? row + TILE_ROWS : height, queue->args );
+	}
+	return NULL;
+}
+
+/* Runs the pass over every row of the image on the pool of threads. This
+ * may be called without the GIL; the pass must not touch Python objects.
+*/
+void run_tiles( TilePass pass, Image *image, const void *args ){
+	const int tiles = (image->height + TILE_ROWS - 1) / TILE_ROWS;
+	const int threads = lighting_threads < tiles ? lighting_threads : tiles;
+
+	if (threads <= 1){
+		pass( image, 0, image->height, args );
+		return;
+	}
+
+	TileQueue queue;
+	queue.pass = pass;
+	queue.image = image;
+	queue.args = args;
+	queue.next_row = 0;
+	pthread_mutex_init( &queue.lock, NULL );
+
+	/* If a thread cannot be started, the others take its tiles */
+	pthread_t workers[MAX_LIGHTING_THREADS];
+	int i,started = 0;
+	for (i = 1; i < threads; i++){
+		if (!pthread_create( &workers[started], NULL, work_tiles, &queue )) started++;
+	}
+	work_tiles( &queue );
+
+	for (i = 0; i < started; i++) pthread_join( workers[i], NULL );
+	pthread_mutex_destroy( &queue.lock );
+}
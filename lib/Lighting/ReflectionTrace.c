@@ -12,6 +12,13 @@
  * the starting pixel, this threshold is nearly guaranteed to be met; therefore,
  * we do not consider surfaces to reflect other surfaces that are extremelly
  * close to them, which we find to be a realistic effect.
+ *
+ * Rather than tracing every ray at every pixel, the rays can be traced
+ * adaptively or progressively (see Sampling.c).
+ *
+ * The rays step over the stretches of the scene that hold nothing near
+ * their depth a block at a time, through a depth pyramid (see
+ * DepthPyramid.c), rather than pixel by pixel.
  * 
  * Author: Matthew Levine
  * Date: 10/12/2014
@@ -53,116 +60,341 @@ void set_reflection_meta_parameters( const double new_reflection_offset,
 
 /* Subroutine for tracing individual rays */
 int trace_refl(int const col0,int const row0,float const depth0,
-		double xrange,double yrange,double zrange,const Image *image, 
-		const int dif_sq );
+		double xrange,double yrange,double zrange,const Image *image );
+
+/* The light and sampler shared by the tiles of a pass */
+typedef struct ReflectionPass ReflectionPass;
+
+struct ReflectionPass{
+	LightPoint light;
+	Sampler *sampler;
+};
+
+/* Subroutines for tracing a tile of rows in each sampling mode, run on the
+ * lighting thread pool (see LightingTiles.c and Sampling.c)
+ */
+static void trace_reflection_rows( Image *image, const int row_start,
+	const int row_end, const void *args );
+static void trace_coarse_reflection_rows( Image *image, const int row_start,
+	const int row_end, const void *args );
+static void trace_adaptive_reflection_rows( Image *image, const int row_start,
+	const int row_end, const void *args );
+static void trace_progressive_reflection_rows( Image *image, const int row_start,
+	const int row_end, const void *args );
 
 /* Traces reflection rays over the given image from the given light source
  * (in vtm coordinate space).
 */
 void trace_reflection_from_point( Image *image, const int lx, const int ly,
 	const float lz ){
-		
-	float* depth_buffer = image->zbuffer;
-	int width = image->width;
-	int height = image->height;
+	ReflectionPass pass;
+	pass.light.lx = lx;
+	pass.light.ly = ly;
+	pass.light.lz = lz;
+	pass.sampler = get_sampler( REFLECTION_SAMPLER );
+	update_depth_pyramid( image );
 	
-	int row,col;
-	/* interpolate Bresehams from the light source to the value on the
-		 * depth buffer - if the value along the line at any point is less
-		 * than the value in the buffer, then we know this surface is hidden 
+	const int mode = get_sampling_mode();
+	if (mode == ADAPTIVE_SAMPLING && max_diffusion_depth > 1){
+		if (prepare_sampler( pass.sampler, image, NULL, 0 )){
+			run_tiles( trace_coarse_reflection_rows, image, &pass );
+			find_edges( pass.sampler, image, (area[0] > area[1] ? area[0] : area[1]) / 2 );
+			run_tiles( trace_adaptive_reflection_rows, image, &pass );
+			return;
+		}
+	}else if (mode == PROGRESSIVE_SAMPLING){
+		const double key[] = { lx, ly, lz, area[0], area[1], reflection_offset,
+			max_diffusion_depth, reflection_projection, reflection_threshold };
+		if (prepare_sampler( pass.sampler, image, key, 9 )){
+			run_tiles( trace_progressive_reflection_rows, image, &pass );
+			return;
+		}
+	}
+	run_tiles( trace_reflection_rows, image, &pass );
+}
+
+/* Traces the ray from the given layer towards the spot (xaddr,yaddr) off
+ * the light, mirrored about the layer's normal, returning the layer it
+ * reflects or -1
+*/
+static int reflect_ray( const int layer, const int row,
+	const int col, const LightPoint *light, const double xaddr,
+	const double yaddr, const Image *image ){
+	
+	const TraceBuffer *trace_buffer = get_trace_buffer();
+	const float depth = trace_buffer->depth[layer];
+					
+	/* Grab the normal */
+	double nx = trace_buffer->nx[layer];
+	double ny = trace_buffer->ny[layer];
+	double nz = trace_buffer->nz[layer];
+	/* Compute the incidence vector. We have to re-normalize the 
+	 * normal, which is a little silly.
 	*/
-	float depth;
+	double norm_n = sqrt( nx*nx + ny*ny + nz*nz );
+	nx /= norm_n;
+	ny /= norm_n;
+	nz /= norm_n;
+
+	/* Get the normalized L-vector */
+	double Lx = (light->lx+xaddr) - col;
+	double Ly = (light->ly+yaddr) - row;
+	double Lz = light->lz - 1/depth;
+	double L_norm = sqrt(Lx*Lx + Ly*Ly + Lz*Lz);
+	Lx /= L_norm;
+	Ly /= L_norm;
+	Ly /= L_norm;
+	
+	double dot_ln = 2 * (Lx*nx + Ly*ny + Lz*nz);
 	
-	TraceElement *trace_buffer = get_trace_buffer();
-	TraceElement trace;
-	int index;	
+	/* Compute the reflection vector */
+	double ox = Lx - dot_ln * nx;
+	double oy = Ly - dot_ln * ny;
+	double oz = Lz - dot_ln * nz;
+	double norm_o = sqrt(ox*ox + oy*oy + oz*oz);
+			
+	ox /= -norm_o; /* Make sure outcome is normalized */
+	oy /= norm_o; /* Flip the sign of y */
+	oz /= norm_o;
 
+	return trace_refl( col, row, depth, ox, oy, oz, image );
+}
+
+/* Traces the ray from the given layer towards a jittered spot in stratum
+ * (i,j) of the light, returning the layer it reflects or -1
+*/
+static int reflect_stratum( const int layer, const int row,
+	const int col, const LightPoint *light, const double i, const double j,
+	unsigned int *random_state, const Image *image ){
+	
+	const int xmin = (int) (area[0] * i/max_diffusion_depth);
+	const int xmax = (int) (area[0] * (i+1)/max_diffusion_depth);
+	const int ymin = (int) (area[1] * j/max_diffusion_depth);
+	const int ymax = (int) (area[1] * (j+1)/max_diffusion_depth);
+
+	double xaddr = ((double)next_random(random_state)/(double)LIGHTING_RAND_MAX) * (xmax-xmin) + xmin;
+	double yaddr = ((double)next_random(random_state)/(double)LIGHTING_RAND_MAX) * (ymax-ymin) + ymin;
+	return reflect_ray( layer, row, col, light, xaddr, yaddr, image );
+}
+
+/* Blends the given reflected color into the pixel, keeping beta of the
+ * pixel's own color
+*/
+static void blend_reflection( int *pixels, const int index, const double r,
+	const double g, const double b, const double beta ){
+	int color = pixels[index];
+	int r1 = (int) ( (beta * (color & 0xFF)) + ((1-beta) * r) );
+	int g1 = (int) ( (beta * ((color>>8) & 0xFF)) + ((1-beta) * g) );
+	int b1 = (int) ( (beta * ((color>>16) & 0xFF)) + ((1-beta) * b) );
+	pixels[index] = (b1<<16) + (g1<<8) + r1;
+}
+
+/* Blends the given packed color into the pixel, keeping beta of the pixel's
+ * own color
+*/
+static void blend_color( int *pixels, const int index, const int color,
+	const double beta ){
+	blend_reflection( pixels, index, ( color >> 16 ) & 0xFF,
+		( color >> 8 ) & 0xFF, color & 0xFF, beta );
+}
+
+/* Traces every stratum of the light from the layers of the given pixel,
+ * blending each reflection into the pixel
+*/
+static void reflect_strata( const int row, const int col, const LightPoint *light,
+	unsigned int *random_state, Image *image ){
+	
+	const int index = row * image->width + col;
+	const TraceBuffer *trace_buffer = get_trace_buffer();
+	int layer = index;
+	const double beta = pow( LAYER_BETA( trace_buffer, layer ),
+		1./(max_diffusion_depth*max_diffusion_depth) );
 	const double mdd2 = max_diffusion_depth / 2.;
-	for (row = 0; row < height; row++){
+	
+	while(layer >= 0){
+		/* Double as counting variable so that multiplication is
+		 * temporarily floating point and we don't wind up with
+		 * a zero xmax-xmin duue to numerical impricision (low areay
+		 * high diffusion) yielding mod0/floating-point-core-dump error
+		*/
+		double i,j;
+		
+		for (i = -mdd2; i < mdd2; i++){
+			for (j = -mdd2; j < mdd2; j++){
+				const int hit = reflect_stratum( layer, row, col, light,
+					i, j, random_state, image );
+				if (hit >= 0) blend_color( image->pixel_data, index,
+					trace_buffer->color[hit], beta );
+			}
+		}
+
+		/* If this pixel is transparent, compute the reflection on
+		 * the pixel behind if
+		*/
+		if (trace_buffer->alpha[layer]) layer = trace_buffer->next[layer];
+		else break;
+	}
+}
+
+/* Traces the reflection rays of rows [row_start,row_end) of the image. The
+ * rays are jittered from the random stream of each row.
+*/
+static void trace_reflection_rows( Image *image, const int row_start,
+	const int row_end, const void *args ){
+	
+	const LightPoint *light = &((const ReflectionPass *) args)->light;
+	float* depth_buffer = image->zbuffer;
+	int width = image->width;
+	TraceBuffer *trace_buffer = get_trace_buffer();
+	unsigned int random_state;
+	
+	int row,col,index;
+	for (row = row_start; row < row_end; row++){
+		random_state = row_random_state( row );
 		for (col = 0; col < width; col++){
 			index = row * width + col;
-			TraceElement *el = &trace_buffer[index];
 			/* The background doesn't reflect anything */
-			if (depth_buffer[index] > 100 || el->beta == 1) continue;
-		
-			while(el){
-				/* Double as counting variable so that multiplication is
-				 * temporarily floating point and we don't wind up with
-				 * a zero xmax-xmin duue to numerical impricision (low areay
-				 * high diffusion) yielding mod0/floating-point-core-dump error
-				*/
-				double i,j;
-				
-				for (i = -mdd2; i < mdd2; i++){
-					for (j = -mdd2; j < mdd2; j++){
-						const int xmin = (int) (area[0] * i/max_diffusion_depth);
-						const int xmax = (int) (area[0] * (i+1)/max_diffusion_depth);
-						const int ymin = (int) (area[1] * j/max_diffusion_depth);
-						const int ymax = (int) (area[1] * (j+1)/max_diffusion_depth);
-
-						double xaddr = ((double)rand()/(double)RAND_MAX) * (xmax-xmin) + xmin;
-						double yaddr = ((double)rand()/(double)RAND_MAX) * (ymax-ymin) + ymin;
+			if (depth_buffer[index] > 100 || trace_buffer->beta[index] == 0xFFFF) continue;
+			reflect_strata( row, col, light, &random_state, image );
+		}
+	}
+}
 
-						depth = el->depth;
-										
-						/* Grab the normal */
-						double nx = el->nx;
-						double ny = el->ny;
-						double nz = el->nz;
-						/* Compute the incidence vector. We have to re-normalize the 
-						 * normal, which is a little silly.
-						*/
-						double norm_n = sqrt( nx*nx + ny*ny + nz*nz );
-						nx /= norm_n;
-						ny /= norm_n;
-						nz /= norm_n;
+/* Records what the ray from the front layer of each pixel of rows
+ * [row_start,row_end) towards the center of the light reflects: its color,
+ * to a few bits, or -1 if nothing
+*/
+static void trace_coarse_reflection_rows( Image *image, const int row_start,
+	const int row_end, const void *args ){
+	
+	const ReflectionPass *pass = (const ReflectionPass *) args;
+	float* depth_buffer = image->zbuffer;
+	int *coarse = pass->sampler->coarse;
+	int width = image->width;
+	TraceBuffer *trace_buffer = get_trace_buffer();
+	
+	int row,col,index;
+	for (row = row_start; row < row_end; row++){
+		for (col = 0; col < width; col++){
+			index = row * width + col;
+			coarse[index] = -1;
+			if (depth_buffer[index] > 100 || trace_buffer->beta[index] == 0xFFFF) continue;
+			const int hit = reflect_ray( index, row, col, &pass->light, 0, 0, image );
+			if (hit >= 0){
+				const int color = trace_buffer->color[hit];
+				coarse[index] = ((color >> 21 & 7) << 6) + ((color >> 13 & 7) << 3) +
+					(color >> 5 & 7);
+			}
+		}
+	}
+}
 
-						
-						/* Get the normalized L-vector. This could be done more
-						 * efficiently in the scope of the nested loop, but that's
-						 * okay.
-						*/
-						double Lx = (lx+xaddr) - col;
-						double Ly = (ly+yaddr) - row;
-						double Lz = lz - 1/depth;
-						double L_norm = sqrt(Lx*Lx + Ly*Ly + Lz*Lz);
-						Lx /= L_norm;
-						Ly /= L_norm;
-						Ly /= L_norm;
-						
-						double dot_ln = 2 * (Lx*nx + Ly*ny + Lz*nz);
-						
-						/* Compute the reflection vector */
-						double ox = Lx - dot_ln * nx;
-						double oy = Ly - dot_ln * ny;
-						double oz = Lz - dot_ln * nz;
-						double norm_o = sqrt(ox*ox + oy*oy + oz*oz);
-								
-						ox /= -norm_o; /* Make sure outcome is normalized */
-						oy /= norm_o; /* Flip the sign of y */
-						oz /= norm_o;
+/* Traces the reflection rays of rows [row_start,row_end) of the image,
+ * tracing every stratum of the light only near the pixels whose neighbors'
+ * coarse rays disagree with their own; the other pixels reflect what their
+ * central rays do
+*/
+static void trace_adaptive_reflection_rows( Image *image, const int row_start,
+	const int row_end, const void *args ){
+	
+	const ReflectionPass *pass = (const ReflectionPass *) args;
+	float* depth_buffer = image->zbuffer;
+	int width = image->width;
+	TraceBuffer *trace_buffer = get_trace_buffer();
+	unsigned int random_state;
+	
+	int row,col,index;
+	for (row = row_start; row < row_end; row++){
+		random_state = row_random_state( row );
+		for (col = 0; col < width; col++){
+			index = row * width + col;
+			if (depth_buffer[index] > 100 || trace_buffer->beta[index] == 0xFFFF) continue;
+			
+			if (pass->sampler->edges[index]){
+				reflect_strata( row, col, &pass->light, &random_state, image );
+				continue;
+			}
+			
+			/* As many identical samples, the central ray blends by beta */
+			int layer = index;
+			const double beta = LAYER_BETA( trace_buffer, layer );
+			while (layer >= 0){
+				const int hit = reflect_ray( layer, row, col, &pass->light, 0, 0, image );
+				if (hit >= 0) blend_color( image->pixel_data, index,
+					trace_buffer->color[hit], beta );
+				if (trace_buffer->alpha[layer]) layer = trace_buffer->next[layer];
+				else break;
+			}
+		}
+	}
+}
 
-						trace_refl( col, row, depth, ox, oy, oz, image, max_diffusion_depth*max_diffusion_depth  );
+/* Traces the reflection rays of rows [row_start,row_end) of the image from
+ * the strata traced at each pixel so far, tracing a few more
+*/
+static void trace_progressive_reflection_rows( Image *image, const int row_start,
+	const int row_end, const void *args ){
+	
+	const ReflectionPass *pass = (const ReflectionPass *) args;
+	Sampler *sampler = pass->sampler;
+	float* depth_buffer = image->zbuffer;
+	int width = image->width;
+	TraceBuffer *trace_buffer = get_trace_buffer();
+	const int n = max_diffusion_depth;
+	const int strata = n*n;
+	const int per_frame = get_samples_per_frame();
+	const double mdd2 = max_diffusion_depth / 2.;
+	unsigned int random_state;
+	
+	int row,col,index,s;
+	for (row = row_start; row < row_end; row++){
+		random_state = sampler_random_state( sampler, row );
+		for (col = 0; col < width; col++){
+			index = row * width + col;
+			if (depth_buffer[index] > 100 || trace_buffer->beta[index] == 0xFFFF) continue;
+			
+			SampleHistory *history = pixel_history( sampler, index, depth_buffer[index] );
+			const int end = history->strata + per_frame < strata ?
+				history->strata + per_frame : strata;
+			for (s = history->strata; s < end; s++){
+				const int t = stratum( s, strata );
+				int layer = index;
+				while (layer >= 0){
+					const int hit = reflect_stratum( layer, row, col, &pass->light,
+						t / n - mdd2, t % n - mdd2, &random_state, image );
+					if (hit >= 0){
+						const int color = trace_buffer->color[hit];
+						history->hits++;
+						history->r += ( color >> 16 ) & 0xFF;
+						history->g += ( color >> 8 ) & 0xFF;
+						history->b += color & 0xFF;
 					}
+					if (trace_buffer->alpha[layer]) layer = trace_buffer->next[layer];
+					else break;
 				}
-				
-
-				/* If this pixel is transparent, compute the reflection on
-				 * the pixel behind if
-				*/
-				if (el->alpha) el = el->next;
-				else break;
+			}
+			history->strata = end;
+			if (end < strata) report_unconverged();
+			
+			/* Every hit of the n^2 strata blends by beta^(1/n^2), so the
+			 * hits so far stand for a blend of their mean color by
+			 * beta^(hits/strata)
+			*/
+			if (history->hits){
+				const double hits = history->hits;
+				blend_reflection( image->pixel_data, index, history->r / hits,
+					history->g / hits, history->b / hits,
+					pow( LAYER_BETA( trace_buffer, index ), hits / history->strata ) );
 			}
 		}
 	}
-	
 }
 
 /* Traces an individual ray from a pixel on the screen back to the light
  * soure. There is way more error checking here than neccessary
 */
 int trace_refl(int const col0,int const row0,float const depth0,
-	double xrange,double yrange,double zrange,const Image *image, const int dif_sq ){
+	double xrange,double yrange,double zrange,const Image *image ){
 	int x0 = col0 + reflection_offset * xrange;
 	int y0 = row0 + reflection_offset * yrange;
 	double z0 = depth0 * reflection_offset * zrange;
@@ -175,9 +407,7 @@ int trace_refl(int const col0,int const row0,float const depth0,
 	double z1 = z0 + reflection_projection * zrange;
 		
 	/* Grab the various buffers/consts */
-	TraceElement *trace_buffer = get_trace_buffer();
-	float *zbuffer = image->zbuffer;
-	int *pixels = image->pixel_data;
+	TraceBuffer *trace_buffer = get_trace_buffer();
 	const int Width = image->width;
 	const int Height = image->height;
 	
@@ -204,63 +434,35 @@ int trace_refl(int const col0,int const row0,float const depth0,
 	float const zinc = (dx>dy) ? dz/dx : dy ? dz/dy : 0;
 	if (z0) z0 = 1/z0;
 	
-	/* Compute the octant that we'll bresenham's over */
-	int const sx = x0 < x1 ? 1 : -1;
-	int const sy = y0 < y1 ? 1 : -1;
-	int err = dx + dy;
-	int e2;
-	
-	int const snt =  sizeof(int) * CHAR_BIT - 1;
-	int const max_index = Width * Height - 1;
 	int const start_index = row0 * Width + col0;
-	int const start_id = trace_buffer[start_index].is_reached;
-	int mlx, mly;
-	int index_dif,index;
+	int const start_id = trace_buffer->id[start_index];
 	
-	/* Trace the ray */
-	while (x0 != x1 || y0 != y1){
-		index = y0 * Width + x0;
-		
-		/* Edge detect without branch */
-		index_dif = max_index - index;
-		index = index + ((index_dif) & ((index_dif)>>(snt)));
-		index = -((-index) & ((-index) >> (snt)));			
+	/* Trace the ray, skipping the spans the depth pyramid rules out (see
+	 * DepthPyramid.c)
+	*/
+	DepthWalk walk;
+	int x,y;
+	double w;
+	start_walk( &walk, x0, y0, x1, y1, z0, zinc );
+	while (next_walk_step( &walk, reflection_threshold, &x, &y, &w )){
+		const int index = y * Width + x;
 		
-		if (index != start_index && x0 > 0 && y0 > 0 && x0 < Width && y0 < Height ){
-			TraceElement *el = &trace_buffer[index];
-			while (el){
-				double change = el->depth - 1/z0;
+		if (index != start_index && x > 0 && y > 0 && x < Width && y < Height ){
+			int layer = index;
+			while (layer >= 0){
+				double change = trace_buffer->depth[layer] - 1/w;
 				if (change < 0) change = -change;
-				int reach_mask = el->is_reached != start_id;
+				int reach_mask = trace_buffer->id[layer] != start_id;
 				
 				if ( change < reflection_threshold && reach_mask){			
-					double beta = pow( trace_buffer[start_index].beta, 1./dif_sq );
-					int r = el->r;
-					int g = el->g;
-					int b = el->b;
-					int color = pixels[start_index];
-					r = (int) ( (beta * (color & 0xFF)) + ((1-beta) * r) );
-					g = (int) ( (beta * ((color>>8) & 0xFF)) + ((1-beta) * g) );
-					b = (int) ( (beta * ((color>>16) & 0xFF)) + ((1-beta) * b) );
-					
-					pixels[start_index] = (b<<16) + (g<<8) + r;
-					return;
+					return layer; /* The caller blends in its color */
 				}
-				el = el->next;
+				layer = trace_buffer->next[layer];
 			}
 		}
-		
-		/* Do some book keeping */
-		e2 = err + err;
-		/* Truth value for e2 > dy and e2 < dx */
-		mly = ((e2 > dy)<<31)>>31;
-		mlx = ((e2 < dx)<<31)>>31;
-		
-		err = err + (mly&dy) + (mlx&dx);
-		x0 = x0 + (mly&sx);
-		y0 = y0 + (mlx&sy);
-		z0 += zinc;
 	}
-		
+	
+	/* We didn't reflect anything */
+	return -1;
 }
 
@@ -0,0 +1,281 @@
+/* This file holds the sampling modes of the area-light shadow and glossy
+ * reflection passes, and the state those modes keep between passes.
+ *
+ * Uniformly, both passes trace n^2 jittered rays from every pixel, one from
+ * each stratum of an n by n grid over the light. Two other modes are
+ * offered:
+ *
+ * - Adaptive sampling first traces a single ray from the center of the light
+ *   at every pixel, and then traces the full n^2 rays only near the pixels
+ *   whose neighbors saw something different (the edges of penumbras and of
+ *   reflected objects); the other pixels keep the answer of their one ray.
+ *   A penumbra reaches as far from its edge as the light is wide, so the
+ *   edges are widened by the light's radius in pixels before refining.
+ *
+ * - Progressive sampling traces a few strata per pixel each frame and keeps
+ *   their sum in a per-pixel history, so that each frame is cheap and the
+ *   image converges to the full n^2 samples over successive frames of an
+ *   unchanged scene. The history of a pixel is dropped when its depth
+ *   changes, and all of it when the light or the parameters change, or when
+ *   the front end reports that the scene changed (see reset_sampling): a
+ *   moving occluder changes the shadows of pixels whose depth stays put.
+ *
+ * The passes report whether a progressive frame left pixels to refine, so
+ * that the front end can keep drawing idle frames until they converge.
+ *
+ * Date: 10/18/2026
+*/
+
+#include <C:\Users\Dev\Desktop\Lilac\include\Lilac.h>
+
+/* Depths greater than this belong to pixels no polygon was drawn on */
+#define BACKGROUND_DEPTH 100
+/* Upper bound on how far, in pixels, the edges are widened */
+#define MAX_SPREAD 16
+
+/* The sampling mode of the passes */
+static int sampling_mode = UNIFORM_SAMPLING;
+/* How many strata a progressive frame traces per pixel */
+static int samples_per_frame = 1;
+/* Changes whenever the mode does or the scene is reset, to drop the
+ * histories
+*/
+static int sampling_generation = 0;
+/* Whether a pass has left pixels to refine since it was last asked */
+static volatile int unconverged = 0;
+
+/* The state of the shadow and reflection passes */
+static Sampler samplers[2];
+
+/* Sets the sampling mode of the shadow and reflection passes and, for
+ * progressive sampling, how many strata each frame traces per pixel. Values
+ * outside of their domain are not set and a warning is registered to
+ * standard output.
+*/
+void set_sampling_mode( const int mode, const int new_samples_per_frame ){
+	if (mode != UNIFORM_SAMPLING && mode != ADAPTIVE_SAMPLING &&
+			mode != PROGRESSIVE_SAMPLING){
+		printf("Warning: unknown sampling mode %d\n", mode);
+	}else{
+		sampling_mode = mode;
+		sampling_generation++;
+	}
+
+	if (new_samples_per_frame < 1){
+		printf("Warning: at least one sample must be taken per frame\n");
+	}else{
+		samples_per_frame = new_samples_per_frame;
+	}
+}
+
+/* Drops the progressive histories of both passes from the next pass on,
+ * as the scene has changed in ways the depth of each pixel does not show
+*/
+void reset_sampling(){
+	sampling_generation++;
+}
+
+int get_sampling_mode(){
+	return sampling_mode;
+}
+
+int get_samples_per_frame(){
+	return samples_per_frame;
+}
+
+/* Returns the state of the given pass (SHADOW_SAMPLER or REFLECTION_SAMPLER) */
+Sampler *get_sampler( const int pass ){
+	return &samplers[pass];
+}
+
+/* Readies the sampler for a pass over the image, under the given light and
+ * parameters. The histories are dropped when they change, as are the
+ * histories of pixels whose depth changes (see pixel_history). Returns 0
+ * if the buffers could not be allocated.
+*/
+int prepare_sampler( Sampler *sampler, const Image *image, const double *key,
+	const int key_length ){
+
+	const int pixels = image->width * image->height;
+	int i, changed = sampler->generation != sampling_generation ||
+		sampler->width != image->width || sampler->height != image->height;
+
+	for (i = 0; i < key_length && i < SAMPLER_KEY_LENGTH; i++){
+		changed |= sampler->key[i] != key[i];
+		sampler->key[i] = key[i];
+	}
+
+	if (sampler->capacity < pixels){
+		SampleHistory *history = realloc( sampler->history, sizeof(SampleHistory) * pixels );
+		if (!history) return 0;
+		sampler->history = history;
+		int *coarse = realloc( sampler->coarse, sizeof(int) * pixels );
+		if (!coarse) return 0;
+		sampler->coarse = coarse;
+		unsigned char *edges = realloc( sampler->edges, pixels );
+		if (!edges) return 0;
+		sampler->edges = edges;
+		unsigned char *spread = realloc( sampler->spread, pixels );
+		if (!spread) return 0;
+		sampler->spread = spread;
+		sampler->capacity = pixels;
+		changed = 1;
+	}
+
+	if (changed){
+		for (i = 0; i < pixels; i++) sampler->history[i].depth = -1;
+	}
+
+	sampler->generation = sampling_generation;
+	sampler->width = image->width;
+	sampler->height = image->height;
+	sampler->frame++;
+	return 1;
+}
+
+/* Returns the history of the given pixel, restarted if the pixel no longer
+ * has the depth that its samples were taken at
+*/
+SampleHistory *pixel_history( Sampler *sampler, const int index, const float depth ){
+	SampleHistory *history = &sampler->history[index];
+	if (history->depth != depth){
+		history->depth = depth;
+		history->strata = 0;
+		history->hits = 0;
+		history->r = 0;
+		history->g = 0;
+		history->b = 0;
+	}
+	return history;
+}
+
+/* Returns the initial state of the random stream of the given row for this
+ * frame of the sampler, so that progressive frames draw new jitter
+*/
+unsigned int sampler_random_state( const Sampler *sampler, const int row ){
+	unsigned int x = row_random_state( row ) ^ (0x9E3779B9u * (unsigned int) sampler->frame);
+	return x ? x : 0x9E3779B9u;
+}
+
+/* Returns the s-th of the n strata in the order they are progressively
+ * sampled. The strata are stepped through by a stride coprime to n, so that
+ * the first few strata are spread over the light rather than along a row
+ * of the grid.
+*/
+int stratum( const int s, const int n ){
+	int stride = (int) (n * 0.618) + 1;
+	int a,b,t;
+	while (1){ /* find a stride coprime to n */
+		for (a = stride, b = n; b; t = a % b, a = b, b = t);
+		if (a == 1) break;
+		stride++;
+	}
+	return (int) (((long long) s * stride) % n);
+}
+
+/* Returns whether any drawn neighbor of the given pixel has a coarse sample
+ * different from the pixel's own
+*/
+static int neighbors_disagree( const Sampler *sampler, const Image *image,
+	const int row, const int col ){
+
+	const int width = image->width;
+	const int *coarse = sampler->coarse;
+	const int own = coarse[row * width + col];
+	int i,j;
+	for (j = row - 1; j <= row + 1; j++){
+		if (j < 0 || j >= image->height) continue;
+		for (i = col - 1; i <= col + 1; i++){
+			if (i < 0 || i >= width) continue;
+			const int index = j * width + i;
+			if (image->zbuffer[index] > BACKGROUND_DEPTH) continue;
+			if (coarse[index] != own) return 1;
+		}
+	}
+	return 0;
+}
+
+/* Marks the edges of rows [row_start,row_end) of the image */
+static void mark_edge_rows( Image *image, const int row_start,
+	const int row_end, const void *args ){
+
+	const Sampler *sampler = (const Sampler *) args;
+	const int width = image->width;
+	int row,col;
+	for (row = row_start; row < row_end; row++){
+		for (col = 0; col < width; col++){
+			const int index = row * width + col;
+			sampler->edges[index] = image->zbuffer[index] <= BACKGROUND_DEPTH &&
+				neighbors_disagree( sampler, image, row, col );
+		}
+	}
+}
+
+/* Widens the edges of rows [row_start,row_end) along the rows, counting the
+ * edges in a window that slides along each row
+*/
+static void spread_edge_rows( Image *image, const int row_start,
+	const int row_end, const void *args ){
+
+	const Sampler *sampler = (const Sampler *) args;
+	const int width = image->width;
+	const int radius = sampler->radius;
+	int row,col;
+	for (row = row_start; row < row_end; row++){
+		const unsigned char *edges = &sampler->edges[row * width];
+		unsigned char *spread = &sampler->spread[row * width];
+		int count = 0;
+		for (col = 0; col < radius && col < width; col++) count += edges[col];
+		for (col = 0; col < width; col++){
+			if (col + radius < width) count += edges[col + radius];
+			if (col - radius > 0) count -= edges[col - radius - 1];
+			spread[col] = count > 0;
+		}
+	}
+}
+
+/* Widens the edges of rows [row_start,row_end) across the rows, from the
+ * edges already widened along them
+*/
+static void spread_edge_columns( Image *image, const int row_start,
+	const int row_end, const void *args ){
+
+	const Sampler *sampler = (const Sampler *) args;
+	const int width = image->width;
+	const int radius = sampler->radius;
+	int row,col,j;
+	for (row = row_start; row < row_end; row++){
+		const int first = row - radius > 0 ? row - radius : 0;
+		const int last = row + radius < image->height ? row + radius : image->height - 1;
+		for (col = 0; col < width; col++){
+			unsigned char near = 0;
+			for (j = first; j <= last && !near; j++) near = sampler->spread[j * width + col];
+			sampler->edges[row * width + col] = near;
+		}
+	}
+}
+
+/* Marks in sampler->edges the pixels within the given radius (in pixels)
+ * of a pixel whose coarse sample disagrees with a neighbor's, once the
+ * coarse samples are taken
+*/
+void find_edges( Sampler *sampler, Image *image, const int radius ){
+	sampler->radius = radius < 1 ? 1 : radius > MAX_SPREAD ? MAX_SPREAD : radius;
+	run_tiles( mark_edge_rows, image, sampler );
+	run_tiles( spread_edge_rows, image, sampler );
+	run_tiles( spread_edge_columns, image, sampler );
+}
+
+/* Notes that a pass has left pixels to refine */
+void report_unconverged(){
+	unconverged = 1;
+}
+
+/* Returns whether the passes drawn since the last call have converged, i.e.,
+ * whether another frame of the unchanged scene would refine them no further
+*/
+int sampling_converged(){
+	const int converged = !unconverged;
+	unconverged = 0;
+	return converged;
+}
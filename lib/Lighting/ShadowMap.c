@@ -0,0 +1,296 @@
+/* This file contains shadow mapping functions, an alternative to the ray
+ * walks of ShadowTrace.c.
+ *
+ * The ray walks step from every pixel towards the light through the depth
+ * buffer, and do so n^2 times per pixel for area lights. Here, the depth of
+ * the scene as seen from the light is recorded once into a shadow map, and
+ * each pixel is then lit or shadowed by comparing its own distance to the
+ * light with the distances stored around its direction.
+ *
+ * The map is made in the space that the ray walks trace through: the column
+ * and row of a pixel and the inverse of its depth, in which the rays of the
+ * walks are straight lines. The inverse depth is scaled so that the scene is
+ * about as deep as the image is wide. The map is a cube of six square faces
+ * around the light, so the light may be anywhere in the scene, and each face
+ * is fitted to the directions that the scene covers on it, so that its
+ * texels are not spent on empty space. Each layer of the trace buffer,
+ * hidden or not, is splatted onto the face that it lies on, over as many
+ * texels as a pixel covers at its distance, and the map keeps the nearest
+ * distance of every texel.
+ *
+ * A pixel is in shadow where the map holds something nearer to the light
+ * than the pixel by more than the bias. The lookup is filtered over the
+ * (2f+1)^2 texels around the pixel's own (percentage closer filtering),
+ * which softens the shadow edges as the jittered rays of an area light do;
+ * the fraction of the taps that are shadowed darkens the pixel by that
+ * fraction of the darkness factor.
+ *
+ * Building the map costs a splat per layer of the trace buffer, and
+ * looking it up costs (2f+1)^2 taps per pixel, whatever the light's distance
+ * and area. The lookups are made in tiles on the lighting thread pool.
+ *
+ * Date: 10/18/2026
+*/
+
+#include <C:\Users\Dev\Desktop\Lilac\include\Lilac.h>
+#include <float.h>
+
+/* Depths greater than this belong to pixels no polygon was drawn on */
+#define BACKGROUND_DEPTH 100
+/* Upper bound on the radius of a splat, in texels */
+#define MAX_SPLAT 3
+
+/* Whether shadows are mapped instead of traced */
+static int shadow_map_enabled = 0;
+/* The width of each face of the map, in texels */
+static int shadow_map_size = 512;
+/* The radius of the filter of the lookups, in texels */
+static int shadow_map_filter = 1;
+/* How much nearer than a pixel the map must be to shadow it */
+static double shadow_map_bias = 2;
+
+/* The map, kept between frames; face f owns size*size texels from
+   f*size*size */
+static float *shadow_map = NULL;
+static int shadow_map_capacity = 0;
+
+/* The light and the space the map is made in, shared by the lookups */
+typedef struct ShadowMapPass ShadowMapPass;
+
+struct ShadowMapPass{
+	double lx, ly, lw;
+	double scale;
+	double darkness;
+	/* the least direction on each face and texels per unit of direction */
+	double u0[6], v0[6];
+	double ustep[6], vstep[6];
+};
+
+/** Sets the meta-parameters for shadow mapping
+  * Parameters
+  * enabled whether shadows are mapped (1) or traced (0)
+  * size the positive width of each face of the map in texels
+  * filter the non-negative radius of the filter of the lookups in texels
+  * bias how much nearer than a pixel the map must be to shadow it
+  *
+  * As with the other meta-parameters, inputs outside of their domain are not
+  * set and a warning is registered to standard output.
+*/
+void set_shadow_map_parameters( const int enabled, const int size,
+	const int filter, const double bias ){
+
+	shadow_map_enabled = enabled;
+
+	if (size < 1){
+		printf("Warning: the shadow map size must be positive\n");
+	}else{
+		shadow_map_size = size;
+	}
+
+	if (filter < 0){
+		printf("Warning: the shadow map filter cannot be negative\n");
+	}else{
+		shadow_map_filter = filter;
+	}
+
+	shadow_map_bias = bias;
+}
+
+int shadow_map_is_enabled(){
+	return shadow_map_enabled;
+}
+
+/* Finds the face that the given point lies on, as seen from the light, and
+ * its direction on the face in [-1,1]^2, returning its distance to the light
+ * along the axis of the face
+*/
+static double project( const ShadowMapPass *pass, const double x,
+	const double y, const double w, int *face, double *u, double *v ){
+
+	const double d[3] = { x - pass->lx, y - pass->ly, (w - pass->lw) * pass->scale };
+	const double a[3] = { fabs(d[0]), fabs(d[1]), fabs(d[2]) };
+	const int axis = a[0] >= a[1] && a[0] >= a[2] ? 0 : a[1] >= a[2] ? 1 : 2;
+	const double m = a[axis] ? a[axis] : DBL_MIN;
+
+	*face = 2 * axis + (d[axis] < 0);
+	*u = d[(axis + 1) % 3] / m;
+	*v = d[(axis + 2) % 3] / m;
+	return m;
+}
+
+/* Widens the fitted range of a face to cover the given point */
+static void cover( double *low, double *high, const ShadowMapPass *pass,
+	const double x, const double y, const double w ){
+
+	int face;
+	double u,v;
+	project( pass, x, y, w, &face, &u, &v );
+	if (u < low[2*face]) low[2*face] = u;
+	if (v < low[2*face+1]) low[2*face+1] = v;
+	if (u > high[2*face]) high[2*face] = u;
+	if (v > high[2*face+1]) high[2*face+1] = v;
+}
+
+/* Records the given point into the map */
+static void splat( const ShadowMapPass *pass, const double x, const double y,
+	const double w ){
+
+	int face;
+	double u,v;
+	const double m = project( pass, x, y, w, &face, &u, &v );
+
+	/* A pixel is about a unit across, so it covers step/m texels */
+	const double ustep = pass->ustep[face];
+	const double vstep = pass->vstep[face];
+	const double reach = (ustep > vstep ? ustep : vstep) / m;
+	const int radius = reach > 2*MAX_SPLAT + 1 ? MAX_SPLAT : (int) (reach / 2);
+	const int size = shadow_map_size;
+	float *texels = &shadow_map[face * size * size];
+
+	int i,j;
+	const int u0 = (int) ((u - pass->u0[face]) * ustep);
+	const int v0 = (int) ((v - pass->v0[face]) * vstep);
+	for (j = v0 - radius; j <= v0 + radius; j++){
+		if (j < 0 || j >= size) continue;
+		for (i = u0 - radius; i <= u0 + radius; i++){
+			if (i < 0 || i >= size) continue;
+			if (m < texels[j * size + i]) texels[j * size + i] = (float) m;
+		}
+	}
+}
+
+/* Shadows the pixels of rows [row_start,row_end) of the image from the map */
+static void map_shadow_rows( Image *image, const int row_start,
+	const int row_end, const void *args ){
+
+	const ShadowMapPass *pass = (const ShadowMapPass *) args;
+	float *depth_buffer = image->zbuffer;
+	int *pixels = image->pixel_data;
+	const int width = image->width;
+	const int size = shadow_map_size;
+	const int f = shadow_map_filter;
+	const double taps = (2*f + 1) * (2*f + 1);
+
+	int row,col,i,j,face;
+	double u,v;
+	for (row = row_start; row < row_end; row++){
+		for (col = 0; col < width; col++){
+			const int index = row * width + col;
+			const float depth = depth_buffer[index];
+			/* Skip background pixels */
+			if (depth > BACKGROUND_DEPTH || depth <= 0) continue;
+
+			const double m = project( pass, col, row, 1. / depth, &face, &u, &v );
+			const float *texels = &shadow_map[face * size * size];
+			const double limit = m - shadow_map_bias;
+
+			/* Count the taps of the filter that see something nearer,
+			 * clamping them to the face
+			*/
+			int shadowed = 0;
+			const int u0 = (int) ((u - pass->u0[face]) * pass->ustep[face]);
+			const int v0 = (int) ((v - pass->v0[face]) * pass->vstep[face]);
+			for (j = v0 - f; j <= v0 + f; j++){
+				const int tj = j < 0 ? 0 : j >= size ? size - 1 : j;
+				for (i = u0 - f; i <= u0 + f; i++){
+					const int ti = i < 0 ? 0 : i >= size ? size - 1 : i;
+					shadowed += texels[tj * size + ti] < limit;
+				}
+			}
+			if (!shadowed) continue;
+
+			const double shadow = 1 - pass->darkness * shadowed / taps;
+			int color = pixels[index];
+			int b = (color & 0xFF) * shadow;
+			int g = (( color >> 8  ) & 0xFF) * shadow;
+			int r = (( color >> 16 ) & 0xFF) * shadow;
+			pixels[index] = (r<<16) + (g<<8) + b;
+		}
+	}
+}
+
+/* Updates shadows from a point light with a shadow map */
+void map_shadow_from_point( Image *image, const int lx, const int ly,
+	const float lz, const double darkness ){
+
+	TraceBuffer *trace_buffer = get_trace_buffer();
+	if (!trace_buffer){
+		printf("Warning: no trace buffer to map shadows with\n");
+		return;
+	}
+
+	const int faces = 6 * shadow_map_size * shadow_map_size;
+	if (shadow_map_capacity < faces){
+		float *grown = realloc( shadow_map, sizeof(float) * faces );
+		if (!grown){
+			printf("Warning: no memory for the shadow map\n");
+			return;
+		}
+		shadow_map = grown;
+		shadow_map_capacity = faces;
+	}
+
+	float *depth_buffer = image->zbuffer;
+	const int width = image->width;
+	const int height = image->height;
+	int index;
+
+	/* Scale the inverse depths of the scene to the size of the image */
+	double least = DBL_MAX, greatest = -DBL_MAX;
+	for (index = 0; index < width * height; index++){
+		const float depth = depth_buffer[index];
+		if (depth > BACKGROUND_DEPTH || depth <= 0) continue;
+		if (1. / depth < least) least = 1. / depth;
+		if (1. / depth > greatest) greatest = 1. / depth;
+	}
+	if (least > greatest) return; /* Nothing was drawn */
+
+	const int extent = width > height ? width : height;
+	ShadowMapPass pass;
+	pass.lx = lx;
+	pass.ly = ly;
+	pass.lw = lz ? 1. / lz : 0;
+	pass.scale = greatest > least ? extent / (greatest - least) : extent;
+	pass.darkness = darkness;
+
+	/* Fit the faces to the layers of the trace buffer, seen or hidden;
+	   face f covers [low[2f],high[2f]] x [low[2f+1],high[2f+1]] */
+	int face;
+	double low[12], high[12];
+	for (face = 0; face < 12; face++){
+		low[face] = 1;
+		high[face] = -1;
+	}
+	for (index = 0; index < width * height; index++){
+		if (depth_buffer[index] > BACKGROUND_DEPTH) continue;
+		int layer;
+		for (layer = index; layer >= 0; layer = trace_buffer->next[layer]){
+			const float depth = trace_buffer->depth[layer];
+			if (depth <= BACKGROUND_DEPTH && depth > 0)
+				cover( low, high, &pass, index % width, index / width, 1. / depth );
+		}
+	}
+	for (face = 0; face < 6; face++){
+		const double uspan = high[2*face] - low[2*face];
+		const double vspan = high[2*face+1] - low[2*face+1];
+		pass.u0[face] = low[2*face];
+		pass.v0[face] = low[2*face+1];
+		/* the last texel holds the greatest direction */
+		pass.ustep[face] = uspan > 0 ? (shadow_map_size - 1) / uspan : 0;
+		pass.vstep[face] = vspan > 0 ? (shadow_map_size - 1) / vspan : 0;
+	}
+
+	/* Record the layers into the map */
+	for (index = 0; index < faces; index++) shadow_map[index] = FLT_MAX;
+	for (index = 0; index < width * height; index++){
+		if (depth_buffer[index] > BACKGROUND_DEPTH) continue;
+		int layer;
+		for (layer = index; layer >= 0; layer = trace_buffer->next[layer]){
+			const float depth = trace_buffer->depth[layer];
+			if (depth <= BACKGROUND_DEPTH && depth > 0)
+				splat( &pass, index % width, index / width, 1. / depth );
+		}
+	}
+
+	run_tiles( map_shadow_rows, image, &pass );
+}
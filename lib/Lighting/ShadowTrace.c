@@ -32,8 +32,19 @@
  *
  * Rays are not traced from background sources (depth = cutoff).
  *
- * The C-standard rand function is assumed to be seeded by the state by the time this
- * function is called.
+ * The jitter is drawn from the random stream of each row (see LightingTiles.c),
+ * so shadows are the same for a given lighting seed, and the rows are traced
+ * in tiles on the lighting thread pool.
+ *
+ * Rather than tracing every ray at every pixel, the rays can be traced
+ * adaptively or progressively (see Sampling.c).
+ *
+ * The rays step over the stretches of the scene that hold nothing near
+ * their depth a block at a time, through a depth pyramid (see
+ * DepthPyramid.c), rather than pixel by pixel.
+ *
+ * When shadow mapping is enabled (see ShadowMap.c), the rays are not traced
+ * and the shadows are looked up from a map of the scene seen from the light.
  *
  * All State fields are globally controllable.
  * 
@@ -55,6 +66,24 @@ static int max_shadow_diffusion_depth = 1;
 /* Local prototype for tracing function */
 int trace(const int row, const int col, const float z1,
 		int x0, int y0, float z0, const Image *image);
+
+/* The light and sampler shared by the tiles of a pass */
+typedef struct ShadowPass ShadowPass;
+
+struct ShadowPass{
+	LightPoint light;
+	Sampler *sampler;
+};
+
+/* Local prototypes for tracing a tile of rows in each sampling mode */
+static void trace_shadow_rows( Image *image, const int row_start,
+						const int row_end, const void *args );
+static void trace_coarse_shadow_rows( Image *image, const int row_start,
+						const int row_end, const void *args );
+static void trace_adaptive_shadow_rows( Image *image, const int row_start,
+						const int row_end, const void *args );
+static void trace_progressive_shadow_rows( Image *image, const int row_start,
+						const int row_end, const void *args );
 		
 /** Sets the meta-parametes for shadow casting
   * Parameters
@@ -91,64 +120,214 @@ void set_shadow_meta_parameters( const int areax, const int areay, const double
 /* Updates shadows based on a visibility from a point light */
 void trace_shadow_from_point( Image *image, const int lx,
 						const int ly, const float lz ){
+	if (shadow_map_is_enabled()){
+		map_shadow_from_point( image, lx, ly, lz, darkness_factor );
+		return;
+	}
+	
+	ShadowPass pass;
+	pass.light.lx = lx;
+	pass.light.ly = ly;
+	pass.light.lz = lz;
+	pass.sampler = get_sampler( SHADOW_SAMPLER );
+	update_depth_pyramid( image );
+	
+	const int mode = get_sampling_mode();
+	if (mode == ADAPTIVE_SAMPLING && max_shadow_diffusion_depth > 1){
+		if (prepare_sampler( pass.sampler, image, NULL, 0 )){
+			run_tiles( trace_coarse_shadow_rows, image, &pass );
+			find_edges( pass.sampler, image, (area[0] > area[1] ? area[0] : area[1]) / 2 );
+			run_tiles( trace_adaptive_shadow_rows, image, &pass );
+			return;
+		}
+	}else if (mode == PROGRESSIVE_SAMPLING){
+		const double key[] = { lx, ly, lz, area[0], area[1], tolerance,
+			max_shadow_diffusion_depth, darkness_factor };
+		if (prepare_sampler( pass.sampler, image, key, 8 )){
+			run_tiles( trace_progressive_shadow_rows, image, &pass );
+			return;
+		}
+	}
+	run_tiles( trace_shadow_rows, image, &pass );
+}
+
+/* Returns 1 if the ray from the given pixel to a jittered spot in stratum
+ * (i,j) of the area light collides with the scene
+*/
+static int trace_stratum( const int row, const int col, const float depth,
+		const LightPoint *light, const double i, const double j,
+		unsigned int *random_state, const Image *image ){
+	
+	/* Grab the bounding box for the area light */
+	const int xmin = area[0] * i/max_shadow_diffusion_depth;
+	const int xmax = area[0] * (i+1)/max_shadow_diffusion_depth;
+	const int ymin = area[1] * j/max_shadow_diffusion_depth;
+	const int ymax = area[1] * (j+1)/max_shadow_diffusion_depth;
+	
+	/* Walk from this row and column to a jittered spot along
+	 * the area light's subsection
+	*/
+	const int x = light->lx + (next_random(random_state)%(xmax-xmin)) + xmin;
+	const int y = light->ly + (next_random(random_state)%(ymax-ymin)) + ymin;
+	return trace( row, col, depth, x, y, light->lz, image );
+}
+
+/* Returns how many of the n^2 strata of the area light the given pixel
+ * cannot see
+*/
+static int trace_strata( const int row, const int col, const float depth,
+		const LightPoint *light, unsigned int *random_state, const Image *image ){
+	double i,j;
+	int hits = 0;
+	
+	/* n^2 time complexity makes me sad */
+	for (i=0;i<max_shadow_diffusion_depth;i++){
+		for (j=0;j<max_shadow_diffusion_depth;j++){
+			hits += trace_stratum( row, col, depth, light, i, j, random_state, image );
+		}
+	}
+	return hits;
+}
+
+/* Darkens the given pixel in place by the shadow factor - transparency
+ * coloring is done in-loop
+*/
+static void darken( int *pixels, const int index, const double shadow ){
+	int color = pixels[index];
+	int b = (color & 0xFF) * shadow;
+	int g = (( color >> 8  ) & 0xFF) * shadow;
+	int r = (( color >> 16 ) & 0xFF) * shadow;
+	pixels[index] = (r<<16) + (g<<8) + b;
+}
+
+/* Updates the shadows of rows [row_start,row_end) of the image */
+static void trace_shadow_rows( Image *image, const int row_start,
+						const int row_end, const void *args ){
 	
+	const LightPoint *light = &((const ShadowPass *) args)->light;
 	float* depth_buffer = image->zbuffer;
 	int width = image->width;
-	int height = image->height;
-	int* pixels = image->pixel_data;
+	const double samples = max_shadow_diffusion_depth*max_shadow_diffusion_depth;
 	
 	int row,col;
 	float depth;
+	unsigned int random_state;
 
-	for (row = 0; row < height; row++){
+	for (row = row_start; row < row_end; row++){
+		random_state = row_random_state( row );
 		for (col = 0; col < width; col++){
 			const int index = row*width+col;
 			depth = depth_buffer[index];
 			/* Skip background pixels */
 			if (depth > 100) continue;
 			
-			double i,j;
-			double shadow = 1;
-			double dif_sq = darkness_factor / (max_shadow_diffusion_depth*max_shadow_diffusion_depth);
+			const int hits = trace_strata( row, col, depth, light, &random_state, image );
+			darken( image->pixel_data, index, 1 - darkness_factor * hits / samples );
+		}
+	}
+}
+
+/* Records whether the ray from each pixel of rows [row_start,row_end) to the
+ * center of the area light collides with the scene
+*/
+static void trace_coarse_shadow_rows( Image *image, const int row_start,
+						const int row_end, const void *args ){
+	
+	const ShadowPass *pass = (const ShadowPass *) args;
+	const LightPoint *light = &pass->light;
+	float* depth_buffer = image->zbuffer;
+	int *coarse = pass->sampler->coarse;
+	int width = image->width;
+	
+	int row,col;
+	for (row = row_start; row < row_end; row++){
+		for (col = 0; col < width; col++){
+			const int index = row*width+col;
+			const float depth = depth_buffer[index];
+			if (depth > 100) continue;
+			coarse[index] = trace( row, col, depth, light->lx + area[0]/2,
+				light->ly + area[1]/2, light->lz, image );
+		}
+	}
+}
+
+/* Updates the shadows of rows [row_start,row_end) of the image, tracing
+ * every stratum of the area light only near the pixels whose neighbors'
+ * coarse rays disagree with their own
+*/
+static void trace_adaptive_shadow_rows( Image *image, const int row_start,
+						const int row_end, const void *args ){
+	
+	const ShadowPass *pass = (const ShadowPass *) args;
+	float* depth_buffer = image->zbuffer;
+	const int *coarse = pass->sampler->coarse;
+	int width = image->width;
+	const double samples = max_shadow_diffusion_depth*max_shadow_diffusion_depth;
+	
+	int row,col;
+	unsigned int random_state;
+	for (row = row_start; row < row_end; row++){
+		random_state = row_random_state( row );
+		for (col = 0; col < width; col++){
+			const int index = row*width+col;
+			const float depth = depth_buffer[index];
+			if (depth > 100) continue;
 			
-			/* n^2 time complexity makes me sad */
-			for (i=0;i<max_shadow_diffusion_depth;i++){
-				for (j=0;j<max_shadow_diffusion_depth;j++){
-					/* Grab the bounding box for the area light */
-					const int xmin = area[0] * i/max_shadow_diffusion_depth;
-					const int xmax = area[0] * (i+1)/max_shadow_diffusion_depth;
-					const int ymin = area[1] * j/max_shadow_diffusion_depth;
-					const int ymax = area[1] * (j+1)/max_shadow_diffusion_depth;
-					
-					/* Walk from this row and column to a jittered spot along
-					 * the area light's subsection
-					*/
-					shadow -= trace( row, col, depth,
-						lx +(rand()%(xmax-xmin))+xmin, 
-						ly +(rand()%(ymax-ymin))+ymin,
-						lz, image  ) * dif_sq; 
-				}
+			double hidden = coarse[index];
+			if (pass->sampler->edges[index]){
+				hidden = trace_strata( row, col, depth, &pass->light,
+					&random_state, image ) / samples;
 			}
-			
-			/* Set the darkened color in place - transparency coloring is
-			 * done in-loop
-			*/
-			int color = pixels[index];
-			int b = (color & 0xFF) * shadow;
-			int g = (( color >> 8  ) & 0xFF) * shadow;
-			int r = (( color >> 16 ) & 0xFF) * shadow;
-			pixels[index] = (r<<16) + (g<<8) + b;
+			if (hidden) darken( image->pixel_data, index, 1 - darkness_factor * hidden );
 		}
 	}
+}
+
+/* Updates the shadows of rows [row_start,row_end) of the image from the
+ * strata traced at each pixel so far, tracing a few more
+*/
+static void trace_progressive_shadow_rows( Image *image, const int row_start,
+						const int row_end, const void *args ){
 	
+	const ShadowPass *pass = (const ShadowPass *) args;
+	Sampler *sampler = pass->sampler;
+	float* depth_buffer = image->zbuffer;
+	int width = image->width;
+	const int n = max_shadow_diffusion_depth;
+	const int strata = n*n;
+	const int per_frame = get_samples_per_frame();
+	
+	int row,col,s;
+	unsigned int random_state;
+	for (row = row_start; row < row_end; row++){
+		random_state = sampler_random_state( sampler, row );
+		for (col = 0; col < width; col++){
+			const int index = row*width+col;
+			const float depth = depth_buffer[index];
+			if (depth > 100) continue;
+			
+			SampleHistory *history = pixel_history( sampler, index, depth );
+			const int end = history->strata + per_frame < strata ? 
+				history->strata + per_frame : strata;
+			for (s = history->strata; s < end; s++){
+				const int t = stratum( s, strata );
+				history->hits += trace_stratum( row, col, depth, &pass->light,
+					t / n, t % n, &random_state, image );
+			}
+			history->strata = end;
+			if (end < strata) report_unconverged();
+			
+			if (history->hits) darken( image->pixel_data, index,
+				1 - darkness_factor * history->hits / history->strata );
+		}
+	}
 }
 
 int trace(const int row, const int col, const float z1,
 		int x0, int y0, float z0, const Image *image){
 	
 	/* Grab global/image image */
-	TraceElement *trace_buffer = get_trace_buffer();
-	float *zbuffer = image->zbuffer;
+	TraceBuffer *trace_buffer = get_trace_buffer();
 	int *pixels = image->pixel_data;
 	int Width = image->width;
 	int Height = image->height;
@@ -168,38 +347,25 @@ int trace(const int row, const int col, const float z1,
 	float const zinc = (dx>dy) ? dz/dx : (dy) ? dz/dy : 0;
 	if (z0!=0) z0 = 1/z0;
 	
-	/* Compute which octant we're in and initialize bresenhamm error */
-	int const sx = x0 < col ? 1 : -1;
-	int const sy = y0 < row ? 1 : -1;
-	int err = dx + dy;
-	int e2;
-	
-	/* Compute path-limiting values */
-	int const snt = sizeof(int) * CHAR_BIT - 1;
-	int const max_index = Width * Height - 1;
-	int mlx, mly;
-	int index_dif,index;
-		
-	/* Trace the path */
-	while (x0 != col || y0 != row){
-		index = y0 * Width + x0;
-	
-		/* Edge detect without branch */
-		index_dif = max_index - index;
-		index  = index + ((index_dif) & ((index_dif) >>(snt)));
-		index = -((-index) & ((-index) >> (snt)));
+	/* Walk the bresenham path from the light towards the pixel, skipping
+	 * the spans the depth pyramid rules out (see DepthPyramid.c)
+	*/
+	DepthWalk walk;
+	int x,y;
+	double w;
+	start_walk( &walk, x0, y0, col, row, z0, zinc );
+	while (next_walk_step( &walk, tolerance, &x, &y, &w )){
+		if (x > 0 && y > 0 && x < Width && y < Height){ /* Edge detection WITH branch, because seg faults are mean */
+			int layer = y * Width + x;
+			while (layer >= 0){	/* Walk through all layers at this x , y position */	
 
-		if (x0 > 0 && y0 > 0 && x0 < Width && y0 < Height){ /* Edge detection WITH branch, because seg faults are mean */
-			TraceElement *el = &trace_buffer[index];
-			while (el){	/* Walk through all elements at this x , y position */	
-
-				double change = el->depth - 1/z0;
+				double change = trace_buffer->depth[layer] - 1/w;
 				if (change < 0) change = -change;
 				
 				if (  change < tolerance ){ /* Check if there was a collision */
 					/* Get the color at the colision point */
 					int r,g,b;
-					double alpha = el->alpha;
+					double alpha = LAYER_ALPHA( trace_buffer, layer );
 					
 					/* If transparent, blend */
 					if (alpha){
@@ -210,9 +376,10 @@ int trace(const int row, const int col, const float z1,
 						
 						double alpha_p = 1 - alpha;
 						/* Blend it by its alpha value scaled by the darkness factor */
-						r = (int) ( alpha_p*r*darkness_factor + alpha*el->r );
-						g = (int) ( alpha_p*g*darkness_factor + alpha*el->g );
-						b = (int) ( alpha_p*b*darkness_factor + alpha*el->b );
+						const int hit = trace_buffer->color[layer];
+						r = (int) ( alpha_p*r*darkness_factor + alpha*(( hit >> 16 ) & 0xFF) );
+						g = (int) ( alpha_p*g*darkness_factor + alpha*(( hit >> 8 ) & 0xFF) );
+						b = (int) ( alpha_p*b*darkness_factor + alpha*(hit & 0xFF) );
 					}
 					
 					if (!alpha || alpha) return 1; /* Only return if opaque */
@@ -220,20 +387,9 @@ int trace(const int row, const int col, const float z1,
 					break; /* Stop looking at this x,y position - we found one */
 				}
 
-				el = el->next; /* Move backwards one element */
+				layer = trace_buffer->next[layer]; /* Move backwards one layer */
 			}
 		}
-		
-		/* Bresenham book keeping */
-		e2 = err + err;
-		/* Compute truth values for e2 > dy and e2 < dx */
-		mly = ((e2 > dy)<<31)>>31;
-		mlx = ((e2 < dx)<<31)>>31;
-
-		err = err + (mly&dy) + (mlx&dx);
-		x0 = x0 + (mly&sx);
-		y0 = y0 + (mlx&sy);		
-		z0 += zinc;
 	}
 
 	/* We didn't collide with anything */
@@ -0,0 +1,222 @@
+/* This file holds the trace buffer: the G-buffer that the polygons are drawn
+ * into and that the deferred lighting passes (global lighting, shadows,
+ * reflections and transparency) read back.
+ *
+ * The buffer is a structure of arrays, one array per attribute of a layer:
+ * its depth and normal as floats, its color and surface color packed as
+ * (r<<16) + (g<<8) + b, its alpha and beta in 16-bit fixed point, the id of
+ * the polygon it was drawn from, and the entry of the next layer behind it.
+ * A layer takes 36 bytes, so the passes walk contiguous arrays of only the
+ * attributes they read.
+ *
+ * Entry i of the arrays, for i below the number of pixels, is the nearest
+ * layer of pixel i. The layers drawn behind it (transparent polygons and
+ * hidden surfaces, which the shadow and reflection rays may still collide
+ * with) are taken from a pool of entries past those, sized once for the
+ * image, and linked nearest to farthest. A pixel holds at most MAX_LAYERS
+ * layers, and once the pool or the pixel is full the farthest layer is
+ * dropped. Clearing the buffer between frames only resets the nearest layer
+ * of each pixel and empties the pool; nothing is allocated or freed while a
+ * frame is drawn.
+ *
+ * Date: 10/18/2026
+*/
+
+#include <C:\Users\Dev\Desktop\Lilac\include\Lilac.h>
+
+/* The depth of a layer that no polygon was drawn on */
+#define EMPTY_DEPTH 1000
+/* Depths greater than this belong to pixels no polygon was drawn on */
+#define BACKGROUND_DEPTH 100
+
+static TraceBuffer trace_buffer = { NULL };
+/* How many layers the pool holds per pixel of the image, on average */
+static int layer_pool_size = 1;
+
+/* Sets how many hidden layers per pixel, on average, the pool holds from the
+ * next frame on. Values below zero are not set and a warning
+ * is registered to standard output.
+*/
+void set_layer_pool_size( const int layers ){
+	if (layers < 0){
+		printf("Warning: the layer pool size cannot be negative\n");
+		return;
+	}
+	layer_pool_size = layers;
+}
+
+/* Returns the trace buffer, or NULL if it was never readied */
+TraceBuffer *get_trace_buffer(){
+	return trace_buffer.depth ? &trace_buffer : NULL;
+}
+
+/* Packs a fraction in [0,1] into 16-bit fixed point */
+static unsigned short pack_fraction( const double fraction ){
+	return (unsigned short) (fraction <= 0 ? 0 : fraction >= 1 ? 0xFFFF :
+		fraction * 0xFFFF + .5);
+}
+
+/* Packs a color with channels in [0,1] as (r<<16) + (g<<8) + b */
+static int pack_color( const double r, const double g, const double b ){
+	const int rr = r <= 0 ? 0 : r >= 1 ? 255 : (int) (r * 255 + .5);
+	const int gg = g <= 0 ? 0 : g >= 1 ? 255 : (int) (g * 255 + .5);
+	const int bb = b <= 0 ? 0 : b >= 1 ? 255 : (int) (b * 255 + .5);
+	return (rr<<16) + (gg<<8) + bb;
+}
+
+/* Grows one array of the buffer to the given number of entries */
+static int grow( void **array, const int entries, const size_t size ){
+	void *grown = realloc( *array, entries * size );
+	if (!grown) return 0;
+	*array = grown;
+	return 1;
+}
+
+/* Readies the buffer for a frame of an image of the given dimensions,
+ * growing it if the image or the pool has grown, and leaves every pixel a
+ * single empty layer. Returns 0, leaving the buffer unusable, if it could
+ * not be allocated.
+*/
+int reset_trace_buffer( const int width, const int height ){
+	TraceBuffer *buffer = &trace_buffer;
+	const int pixels = width * height;
+	const int capacity = pixels * (1 + layer_pool_size);
+
+	if (buffer->capacity < capacity){
+		if (!(grow( (void **) &buffer->depth, capacity, sizeof(float) ) &&
+			grow( (void **) &buffer->nx, capacity, sizeof(float) ) &&
+			grow( (void **) &buffer->ny, capacity, sizeof(float) ) &&
+			grow( (void **) &buffer->nz, capacity, sizeof(float) ) &&
+			grow( (void **) &buffer->color, capacity, sizeof(int) ) &&
+			grow( (void **) &buffer->surface, capacity, sizeof(int) ) &&
+			grow( (void **) &buffer->alpha, capacity, sizeof(unsigned short) ) &&
+			grow( (void **) &buffer->beta, capacity, sizeof(unsigned short) ) &&
+			grow( (void **) &buffer->id, capacity, sizeof(int) ) &&
+			grow( (void **) &buffer->next, capacity, sizeof(int) ))){
+			/* What was grown is kept for the next attempt */
+			buffer->capacity = 0;
+			free( buffer->depth );
+			buffer->depth = NULL;
+			printf("Warning: no memory for the trace buffer\n");
+			return 0;
+		}
+		buffer->capacity = capacity;
+	}
+
+	buffer->width = width;
+	buffer->height = height;
+	buffer->pixels = pixels;
+	buffer->limit = capacity;
+
+	int i;
+	for (i = 0; i < buffer->pixels; i++){
+		buffer->depth[i] = EMPTY_DEPTH;
+		buffer->color[i] = 0;
+		buffer->surface[i] = 0;
+		buffer->alpha[i] = 0xFFFF;
+		buffer->beta[i] = 0xFFFF;
+		buffer->next[i] = -1;
+	}
+	buffer->size = buffer->pixels;
+	return 1;
+}
+
+/* Copies every attribute but the link of one layer to another */
+static void copy_layer( TraceBuffer *buffer, const int from, const int to ){
+	buffer->depth[to] = buffer->depth[from];
+	buffer->nx[to] = buffer->nx[from];
+	buffer->ny[to] = buffer->ny[from];
+	buffer->nz[to] = buffer->nz[from];
+	buffer->color[to] = buffer->color[from];
+	buffer->surface[to] = buffer->surface[from];
+	buffer->alpha[to] = buffer->alpha[from];
+	buffer->beta[to] = buffer->beta[from];
+	buffer->id[to] = buffer->id[from];
+}
+
+/* Returns the number of layers of the given pixel */
+static int count_layers( const TraceBuffer *buffer, const int pixel ){
+	int count = 0, layer;
+	for (layer = pixel; layer >= 0; layer = buffer->next[layer]) count++;
+	return count;
+}
+
+/* Takes an entry from the pool for another layer of the given pixel, or
+ * returns -1 if the pool or the pixel is full
+*/
+static int take_layer( TraceBuffer *buffer, const int pixel ){
+	if (buffer->size >= buffer->limit) return -1;
+	if (count_layers( buffer, pixel ) >= MAX_LAYERS) return -1;
+	return buffer->size++;
+}
+
+/* Makes room for a new layer at the given layer by pushing it, and the
+ * layers behind it, one place back. The farthest layer of the pixel is
+ * dropped if no layer can be taken for it.
+*/
+static void push_back( TraceBuffer *buffer, const int pixel, const int layer ){
+	const int taken = take_layer( buffer, pixel );
+	if (taken >= 0){
+		copy_layer( buffer, layer, taken );
+		buffer->next[taken] = buffer->next[layer];
+		buffer->next[layer] = taken;
+		return;
+	}
+
+	int chain[MAX_LAYERS];
+	int length = 0, cur;
+	for (cur = layer; cur >= 0 && length < MAX_LAYERS; cur = buffer->next[cur])
+		chain[length++] = cur;
+	while (--length > 0) copy_layer( buffer, chain[length-1], chain[length] );
+}
+
+/* Finds the place of a new layer at the given depth among the layers of
+ * the given pixel, which are kept from nearest to farthest, pushing back
+ * the layers behind it. Returns the entry to write the layer to, or -1 if
+ * the layer lies behind all of the layers of a full pixel.
+*/
+int insert_layer( TraceBuffer *buffer, const int pixel, const float depth ){
+	int cur = pixel;
+
+	if (buffer->depth[cur] > BACKGROUND_DEPTH){}/* There is no layer here */
+	/* We are in front of the nearest layer, so push it backwards */
+	else if (buffer->depth[cur] >= depth){
+		push_back( buffer, pixel, cur );
+	}
+	/* We are behind the nearest layer, so move back until we reach our place */
+	else if (depth <= EMPTY_DEPTH){
+		while (buffer->depth[cur] < depth){
+			if (buffer->next[cur] < 0){
+				const int taken = take_layer( buffer, pixel );
+				if (taken < 0) return -1;
+				buffer->depth[taken] = EMPTY_DEPTH;
+				buffer->color[taken] = 0;
+				buffer->alpha[taken] = 0xFFFF;
+				buffer->beta[taken] = 0xFFFF;
+				buffer->next[taken] = -1;
+				buffer->next[cur] = taken;
+			}
+			cur = buffer->next[cur];
+		}
+		if (buffer->depth[cur] < BACKGROUND_DEPTH) push_back( buffer, pixel, cur );
+	}
+	return cur;
+}
+
+/* Writes a layer drawn from a polygon to the given entry */
+void write_layer( TraceBuffer *buffer, const int layer, const float depth,
+	const int r, const int g, const int b, const double alpha,
+	const double beta, const double nx, const double ny, const double nz,
+	const double *surface_color, const int id ){
+
+	buffer->depth[layer] = depth;
+	buffer->color[layer] = (r<<16) + (g<<8) + b;
+	buffer->alpha[layer] = pack_fraction( alpha );
+	buffer->beta[layer] = pack_fraction( beta );
+	buffer->nx[layer] = (float) nx;
+	buffer->ny[layer] = (float) ny;
+	buffer->nz[layer] = (float) nz;
+	buffer->surface[layer] = pack_color( surface_color[0], surface_color[1],
+		surface_color[2] );
+	buffer->id[layer] = id;
+}
@@ -36,10 +36,7 @@ PyDoc_STRVAR(Lilac_Documentation,
  * ---------------------------------- */
 static int Width = 750;
 static int Height = 750;
-static int LastWidth = 0;
-static int LastHeight = 0;
 
-static TraceElement* trace_buffer = NULL;
 static Texture* texture_buffer = NULL;
 static Texture* bump_map = NULL;
 static Anchors* anchors = NULL;
@@ -80,8 +77,6 @@ struct Line {
 	int* pixel_data;
 };
  
- 
-TraceElement* get_trace_buffer(){return trace_buffer;}
 
 Texture* get_texture_buffer(){return texture_buffer;} 
 
@@ -499,13 +494,17 @@ static PyObject* lilac_create_polygon(PyObject* self, PyObject* args){
 	return output;
 }
 
-/** See: lilac_create_polygon **/
+/** See: lilac_create_polygon. The coordinates, colors and (optional) normals
+ *  are NxVx4 arrays of N polygons with V vertices each; every polygon is
+ *  scanned on its own.
+**/
 static PyObject* lilac_create_polygons(PyObject* self, PyObject* args){
 	
 	int* pixel_data; /* The pointer to the throughput data */
 	float* points;
 	float* zbuffer;
 	double* color_buffer;
+	float* normals = NULL;
 	
 	int num_polygons, num_edges;
 	int dummy;
@@ -515,16 +514,20 @@ static PyObject* lilac_create_polygons(PyObject* self, PyObject* args){
 	PyArrayObject* numpy_tmp_array2; /* Coordinate map */
 	PyArrayObject* numpy_tmp_array3; /* Z-buffer map */
 	PyArrayObject* numpy_tmp_array4; /* Color map, added for shading */
+	PyObject* normal_object = NULL;  /* Optional normal map */
 
 	/* Load in the arguments */
-	if (PyArg_ParseTuple(args, "iOOOO", &dummy,
+	if (PyArg_ParseTuple(args, "iOOOO|O", &dummy,
 					&numpy_tmp_array1,&numpy_tmp_array2,
-					&numpy_tmp_array3, &numpy_tmp_array4 )){
+					&numpy_tmp_array3, &numpy_tmp_array4, &normal_object )){
 			/* Point our data to the data in the numpy pixel array */
 			pixel_data		= (int*)  numpy_tmp_array1->data;
 			points			= (float*) numpy_tmp_array2->data;
 			zbuffer			= (float*) numpy_tmp_array3->data;
 			color_buffer	= (double*) numpy_tmp_array4->data;
+			if (normal_object && normal_object != Py_None){
+				normals = (float*) ((PyArrayObject*) normal_object)->data;
+			}
 
 			num_polygons = numpy_tmp_array2->dimensions[0];			
 			num_edges = numpy_tmp_array2->dimensions[1];
@@ -539,8 +542,8 @@ static PyObject* lilac_create_polygons(PyObject* self, PyObject* args){
 	image.pixel_data = pixel_data;
 	image.zbuffer = zbuffer;
 	
-	plot_polygon( image, points, color_buffer, num_polygons*num_edges, 4,0,0,0 );
-	return Py_BuildValue("");;
+	plot_polygons( image, points, color_buffer, normals, num_polygons, num_edges );
+	return Py_BuildValue("");
 }
 
 /** Completes phase one of pre-processing large multi-polygonal modules.
@@ -575,7 +578,7 @@ static PyObject* lilac_preproces_phase_1(PyObject* self, PyObject* args){
 	
 			num_edges = numpy_tmp_array1->dimensions[1];
 			num_polygons = numpy_tmp_array1->dimensions[0];
-			if (!(numpy_tmp_array1->dimensions[2] == 4 && num_edges == 3)){
+			if (numpy_tmp_array1->nd != 3 || numpy_tmp_array1->dimensions[2] != 4){
 				printf("Polygon one-pass preconditions not met\n");
 				return NULL;
 			}
@@ -624,7 +627,7 @@ static PyObject* lilac_homoginize_polygons(PyObject* self, PyObject* args){
 static PyObject* lilac_apply_shadows(PyObject* self, PyObject* args){
 	
 	int* pixels; 
-	double* depths; 
+	float* depths; 
 	
 	int dummy;
 	
@@ -639,7 +642,7 @@ static PyObject* lilac_apply_shadows(PyObject* self, PyObject* args){
 				&numpy_tmp_array2, &lx, &ly, &lz)){
 
 			pixels = (int*) numpy_tmp_array1->data;
-			depths = (double*) numpy_tmp_array2->data;
+			depths = (float*) numpy_tmp_array2->data;
 			
 
 	}else {return NULL;}
@@ -650,7 +653,10 @@ static PyObject* lilac_apply_shadows(PyObject* self, PyObject* args){
 	image.pixel_data = pixels;
 	image.zbuffer = depths;
 
-	trace_shadow_from_point( &image, lx, ly, lz ); 
+	/* The pass runs on the lighting thread pool without the GIL */
+	Py_BEGIN_ALLOW_THREADS
+	trace_shadow_from_point( &image, lx, ly, lz );
+	Py_END_ALLOW_THREADS
 	return  Py_BuildValue("");
 }
 
@@ -660,7 +666,7 @@ static PyObject* lilac_apply_shadows(PyObject* self, PyObject* args){
 static PyObject* lilac_apply_reflections(PyObject* self, PyObject* args){
 	
 	int* pixels; 
-	double* depths; 
+	float* depths; 
 	
 	int dummy;
 	
@@ -675,7 +681,7 @@ static PyObject* lilac_apply_reflections(PyObject* self, PyObject* args){
 				&numpy_tmp_array2, &lx, &ly, &lz)){
 
 			pixels = (int*) numpy_tmp_array1->data;
-			depths = (double*) numpy_tmp_array2->data;
+			depths = (float*) numpy_tmp_array2->data;
 			
 
 	}else {return NULL;}
@@ -686,7 +692,10 @@ static PyObject* lilac_apply_reflections(PyObject* self, PyObject* args){
 	image.pixel_data = pixels;
 	image.zbuffer = depths;
 
-	trace_reflection_from_point( &image, lx, ly, lz ); 
+	/* The pass runs on the lighting thread pool without the GIL */
+	Py_BEGIN_ALLOW_THREADS
+	trace_reflection_from_point( &image, lx, ly, lz );
+	Py_END_ALLOW_THREADS
 	return  Py_BuildValue("");
 }
 
@@ -696,7 +705,7 @@ static PyObject* lilac_apply_reflections(PyObject* self, PyObject* args){
 static PyObject* lilac_apply_transparency(PyObject* self, PyObject* args){
 	
 	int* pixels; 
-	double* depths; 
+	float* depths; 
 	
 	int dummy;
 	
@@ -709,7 +718,7 @@ static PyObject* lilac_apply_transparency(PyObject* self, PyObject* args){
 				&numpy_tmp_array2 )){
 
 			pixels = (int*) numpy_tmp_array1->data;
-			depths = (double*) numpy_tmp_array2->data;
+			depths = (float*) numpy_tmp_array2->data;
 			
 
 	}else {return NULL;}
@@ -720,7 +729,10 @@ static PyObject* lilac_apply_transparency(PyObject* self, PyObject* args){
 	image.pixel_data = pixels;
 	image.zbuffer = depths;
 
-	trace_alpha_from_point( &image ); 
+	/* The pass runs on the lighting thread pool without the GIL */
+	Py_BEGIN_ALLOW_THREADS
+	trace_alpha_from_point( &image );
+	Py_END_ALLOW_THREADS
 	return  Py_BuildValue("");
 }
 
@@ -863,6 +875,86 @@ static PyObject* lilac_set_shadow_meta_paramers(PyObject* self, PyObject* args){
 	return Py_BuildValue("");
 }
 
+/* Sets the number of threads of the lighting passes */
+static PyObject* lilac_set_lighting_threads(PyObject* self, PyObject* args){
+	int threads;
+	if (!PyArg_ParseTuple(args, "i", &threads )){return NULL;}
+	set_lighting_threads(threads);
+	
+	return Py_BuildValue("");
+}
+
+/* Sets the seed of the random streams of the lighting passes */
+static PyObject* lilac_set_lighting_seed(PyObject* self, PyObject* args){
+	unsigned int seed;
+	if (!PyArg_ParseTuple(args, "I", &seed )){return NULL;}
+	set_lighting_seed(seed);
+	
+	return Py_BuildValue("");
+}
+
+/* Sets the meta-parameters of shadow mapping */
+static PyObject* lilac_set_shadow_map_parameters(PyObject* self, PyObject* args){
+	
+	int enabled,size,filter;
+	double bias;
+	
+	if (!PyArg_ParseTuple(args, "iiid", &enabled,&size,&filter,&bias))
+	{return NULL;}
+
+	set_shadow_map_parameters( enabled,size,filter,bias );
+
+	return Py_BuildValue("");
+}
+
+/* Sets whether the ray walks step through the depth pyramid */
+static PyObject* lilac_set_depth_pyramid(PyObject* self, PyObject* args){
+	int enabled;
+	if (!PyArg_ParseTuple(args, "i", &enabled )){return NULL;}
+	set_depth_pyramid(enabled);
+	
+	return Py_BuildValue("");
+}
+
+/* Sets the sampling mode of shadows and reflections */
+static PyObject* lilac_set_sampling_mode(PyObject* self, PyObject* args){
+	int mode,samples_per_frame;
+	if (!PyArg_ParseTuple(args, "ii", &mode, &samples_per_frame )){return NULL;}
+	set_sampling_mode(mode, samples_per_frame);
+	
+	return Py_BuildValue("");
+}
+
+/* Drops the progressive samples of the shadows and reflections */
+static PyObject* lilac_reset_sampling(PyObject* self, PyObject* args){
+	reset_sampling();
+	
+	return Py_BuildValue("");
+}
+
+/* Returns whether progressive sampling has converged */
+static PyObject* lilac_is_sampling_converged(PyObject* self, PyObject* args){
+	return PyBool_FromLong( sampling_converged() );
+}
+
+/* Sets how transparent polygons are blended */
+static PyObject* lilac_set_transparency_mode(PyObject* self, PyObject* args){
+	int mode,fragments;
+	if (!PyArg_ParseTuple(args, "ii", &mode, &fragments )){return NULL;}
+	set_transparency_mode(mode, fragments);
+	
+	return Py_BuildValue("");
+}
+
+/* Sets how many hidden layers per pixel the trace buffer holds */
+static PyObject* lilac_set_layer_pool_size(PyObject* self, PyObject* args){
+	int layers;
+	if (!PyArg_ParseTuple(args, "i", &layers )){return NULL;}
+	set_layer_pool_size(layers);
+	
+	return Py_BuildValue("");
+}
+
 /* Sets the scale on z-wise fog */
 static PyObject* lilac_set_fog_scale(PyObject* self, PyObject* args){
 	int new_fog_scale;
@@ -889,59 +981,43 @@ static PyObject* lilac_set_polygon_fill(PyObject* self, PyObject* args){
 	return Py_BuildValue("");;
 }
 
-
-int get_width(){ return Width; }
-int get_height(){ return Height; }
-
-/* Fixme: if width and height change, this might fail or memleak. Need to 
- * save old with height */
-static PyObject* init_trace_buffer(PyObject* self, PyObject* args){
-	int i;
+/** Clears an image in place, setting every pixel to the given color and 
+ *  every depth to the given depth, so that frame buffers can be reused
+ *  between frames instead of reallocated
+**/
+static PyObject* lilac_clear_image(PyObject* self, PyObject* args){
+	int* pixel_data;
+	float* zbuffer;
+	int color, dummy, i, num_pixels;
+	float depth;
 	
-	//debugging check
-	if ((LastWidth || LastHeight) && (Width != LastWidth || Height != LastHeight)){ 
-		printf("Init trace buffer not ready for you\n"); 
-		exit(3); 
-	}
+	PyArrayObject* numpy_tmp_array1; /* Pixel map */
+	PyArrayObject* numpy_tmp_array2; /* Z-buffer map */
 	
-	if (LastWidth != Width || LastHeight != Height){
-		/* Whipe the current buffer */
-		for (i = 0; i < LastWidth * LastHeight; i++){		
-			TraceElement *next = &trace_buffer[i];
-			while (next){
-				TraceElement *tmp = next->next;
-				free(next);
-				next = tmp;			
-			}
-		}
-
-		/* Make a new one */
-		trace_buffer = malloc(sizeof(TraceElement)*(Width*Height+1));
-	}
+	if (PyArg_ParseTuple(args, "iOOif", &dummy, &numpy_tmp_array1,
+				&numpy_tmp_array2, &color, &depth )){
+			pixel_data = (int*) numpy_tmp_array1->data;
+			zbuffer = (float*) numpy_tmp_array2->data;
+			num_pixels = numpy_tmp_array1->dimensions[0] * numpy_tmp_array1->dimensions[1];
+	}else {return NULL;}
 	
-	for (i = 0; i < Width * Height; i++){
-		TraceElement *el = &trace_buffer[i];
-		el->alpha = 1;
-		el->beta = 1;
-		el->g = 0;
-		el->r = 0;
-		el->b = 0;
-		el->Csr = 0;
-		el->Csg = 0;
-		el->Csb = 0;
-		el->depth = 1000;
-		
-		TraceElement *next = el->next;
-		while (next){
-			TraceElement *tmp = next->next;
-			free(next);
-			next = tmp;			
-		}
-		el->next = NULL;
+	for (i = 0; i < num_pixels; i++){
+		pixel_data[i] = color;
+		zbuffer[i] = depth;
 	}
 	
-	LastWidth = Width;
-	LastHeight = Height;
+	return Py_BuildValue("");
+}
+
+int get_width(){ return Width; }
+int get_height(){ return Height; }
+
+/* Readies the trace buffer for a new frame, resizing it if the image has
+ * changed size (see TraceBuffer.c) */
+static PyObject* init_trace_buffer(PyObject* self, PyObject* args){
+	reset_trace_buffer( Width, Height );
+	reset_fragment_buffer( Width, Height );
+	invalidate_depth_pyramid();
 
 	return Py_BuildValue("");
 }
@@ -1235,14 +1311,14 @@ static PyObject* lilac_init_lighting_buffer(PyObject *self, PyObject *args){
 
 static PyObject* lilac_apply_global_lighting(PyObject *self, PyObject *args){
 	int *pixels;
-	double *depths;
+	float *depths;
 	
 	PyArrayObject *nptmp1;
 	PyArrayObject *nptmp2;
 	
 	if (PyArg_ParseTuple(args,"OO",&nptmp1,&nptmp2)){
 		pixels =  (int *) 	 nptmp1->data;
-		depths =  (double *) nptmp2->data;
+		depths =  (float *)  nptmp2->data;
 	}else return NULL;
 	
 	Image image;
@@ -1252,7 +1328,10 @@ static PyObject* lilac_apply_global_lighting(PyObject *self, PyObject *args){
 	image.zbuffer = depths;
 
 	
+	/* The pass runs on the lighting thread pool without the GIL */
+	Py_BEGIN_ALLOW_THREADS
 	iterate_lighting(&image);
+	Py_END_ALLOW_THREADS
 	
 	return Py_BuildValue("");
 }
@@ -1387,12 +1466,14 @@ static PyMethodDef Lilac_Methods[] = {
 	},
 	{ "create_polygons",lilac_create_polygons,METH_VARARGS,
 	  /* Documentation that will be displayed in python goes here */
-	  "Creates a polygon at the indicated position \
-	   \nNULL create_polygon( Array pixels, Array coords, Array colors )\
+	  "Creates many polygons of the same number of vertices at once \
+	   \nNULL create_polygons( Array pixels, Array coords, Array zbuffer, Array colors [, Array normals] )\
 	   \nParameters\
 	  \n- pixels : a numpy array containing the image\
-      \n- ords : the coordinates of the polygon\
-	  \n- colors : the colors of each polygon\
+      \n- coords : an NxVx4 float32 array of polygon coordinates\
+	  \n- zbuffer : a numpy array containing the depth buffer\
+	  \n- colors : an NxVx4 array of vertex colors\
+	  \n- normals : an optional NxVx4 float32 array of vertex normals\
 	  "
 	},
 	{ "apply_shadows",lilac_apply_shadows,METH_VARARGS,
@@ -1447,6 +1528,14 @@ static PyMethodDef Lilac_Methods[] = {
 	 reflect off one another."},
 	{"set_polygon_fill",lilac_set_polygon_fill,METH_VARARGS,
 	"Sets the whether to fill the polygon (True) or not (False)."},
+	{"clear_image",lilac_clear_image,METH_VARARGS,
+	"Clears an image and its depth buffer in place \
+	\nNULL clear_image( Array pixels, Array zbuffer, int color, float depth )\
+	\nParameters\
+	\n- pixels : a numpy array containing the image\
+	\n- zbuffer : a float32 numpy array of the same size containing the depth buffer\
+	\n- color : the color written to every pixel\
+	\n- depth : the depth written to every element of the depth buffer"},
 	{"set_reflection_meta_parameters",lilac_set_reflection_meta_paramers,METH_VARARGS,
 	"Sets the meta-parameters used in reflection computations\n\
 	Parameters:\n\
@@ -1465,6 +1554,60 @@ static PyMethodDef Lilac_Methods[] = {
 	darkness_scalar - the doublar scale on the darkness of the shadow\
 	"},
 	
+	{"set_lighting_threads",lilac_set_lighting_threads,METH_VARARGS,
+	"Sets the number of threads that draw global lighting, shadows,\
+	 reflections and transparency (1 to 64). The image is split into tiles of rows\
+	 that the threads take in turn."},
+	{"set_lighting_seed",lilac_set_lighting_seed,METH_VARARGS,
+	"Sets the seed of the random jitter of shadow and reflection rays. Frames\
+	 drawn with the same seed are the same whatever the number of threads."},
+	
+	{"set_shadow_map_parameters",lilac_set_shadow_map_parameters,METH_VARARGS,
+	"Sets the meta-parameters used in shadow mapping\n\
+	Parameters:\n\
+	enabled - whether shadows are looked up from a shadow map instead of traced\
+	size - the integral width of each face of the map in texels\
+	filter - the integral radius of the percentage closer filter in texels\
+	bias - the doublar distance by which the map must be nearer to cast a shadow\
+	"},
+	
+	{"set_depth_pyramid",lilac_set_depth_pyramid,METH_VARARGS,
+	"Sets whether the shadow and reflection rays skip the empty spans of their\
+	 walks through a min/max depth pyramid (1, the default) or step through\
+	 every pixel (0). The images drawn are the same either way."},
+	
+	{"set_sampling_mode",lilac_set_sampling_mode,METH_VARARGS,
+	"Sets how the rays of area-light shadows and glossy reflections are sampled\n\
+	Parameters:\n\
+	mode - 0 to trace every ray at every pixel, 1 to trace them all only where\
+	 neighboring pixels disagree (adaptive), or 2 to trace a few more each frame\
+	 until the scene changes (progressive)\
+	samples_per_frame - the integral number of rays per pixel of a progressive frame\
+	"},
+	{"reset_sampling",lilac_reset_sampling,METH_VARARGS,
+	"Drops the rays that progressive sampling has gathered, so that the next\
+	 frame samples the shadows and reflections anew. Must be called whenever\
+	 the scene has changed, as a moved occluder changes the shadows of pixels\
+	 whose depth has not changed."},
+	{"is_sampling_converged",lilac_is_sampling_converged,METH_VARARGS,
+	"Returns whether the shadows and reflections drawn since the last call are\
+	 fully sampled, i.e., whether drawing the unchanged scene again would not\
+	 refine them."},
+	{"set_transparency_mode",lilac_set_transparency_mode,METH_VARARGS,
+	"Sets how transparent polygons are blended, from the next frame on\n\
+	Parameters:\n\
+	mode - 0 to blend the layers of the trace buffer, or 1 to keep the nearest\
+	 transparent fragments of each pixel aside and blend them over the\
+	 finished scene independently of drawing order (k-buffer)\
+	fragments - the integral number of fragments each pixel keeps in mode 1\
+	"},
+	{"set_layer_pool_size",lilac_set_layer_pool_size,METH_VARARGS,
+	"Sets how many layers the trace buffer holds behind the nearest, per pixel\n\
+	 on average, from the next frame on\n\
+	Parameters:\n\
+	layers - the non-negative integral number of hidden layers per pixel\
+	"},
+	
 	{"set_texture",init_texture_buffer,METH_VARARGS,
 	"Sets the texture to used in filling to images."},
 	{"set_bump_map",lilac_init_bump_map,METH_VARARGS,
@@ -127,10 +127,41 @@ void set_surface_color(const double r, const double g, const double b){
 
 /******************************************************************************/
 
+/** Scans a single polygon with an explicit (possibly NULL) per-vertex normal
+ * array; see plot_polygon and plot_polygons 
+*/
+static void scan_polygon( Image image, float* points, double* colors, 
+		float* normals, int num_points, int band_size, 
+		double nx, double ny, double nz );
+
 /** This funtion plots a polygon onto an image. See the file header for details */
 void plot_polygon( Image image, float* points, 
 		double* colors, int num_points, int band_size, 
 		double nx, double ny, double nz ){
+	NormalBuffer *normal_buffer = get_normal_buffer();
+	scan_polygon( image, points, colors, 
+		normal_buffer ? normal_buffer->normals : NULL,
+		num_points, band_size, nx, ny, nz );
+}
+
+/** Plots many polygons of the same number of vertices onto an image. The
+ * points, colors and normals are packed polygon after polygon, four bands
+ * per vertex; normals may be NULL, in which case no normals are interpollated.
+ * Each polygon is scanned on its own, exactly as plot_polygon would.
+*/
+void plot_polygons( Image image, float* points, double* colors,
+		float* normals, int num_polygons, int num_edges ){
+	int i;
+	const int stride = 4 * num_edges;
+	for (i = 0; i < num_polygons; i++){
+		scan_polygon( image, points + i * stride, colors + i * stride,
+			normals ? normals + i * stride : NULL, num_edges, 4, 0, 0, 0 );
+	}
+}
+
+static void scan_polygon( Image image, float* points, double* colors, 
+		float* normals, int num_points, int band_size, 
+		double nx, double ny, double nz ){
 
 	int i = 0;
 	float z0,z1,zinc,dz;
@@ -186,8 +217,6 @@ points and \"%d\" vertices\n",anchor->num_anchors,num_points);
 	const int inx = num_points * band_size;
 	
 	/* Set up normal interpollation */
-	NormalBuffer *normal_buffer = get_normal_buffer();
-	float *normals;
 	double n0x,n0y,n0z,n1x,n1y,n1z,dnx,dny,dnz;
 	n0x = nx;
 	n0y = ny;
@@ -195,9 +224,6 @@ points and \"%d\" vertices\n",anchor->num_anchors,num_points);
 	n1x = nx;
 	n1y = ny;
 	n1z = nz; /* By default accept params */
-	if (normal_buffer){
-		normals = normal_buffer->normals;
-	}
 		
 	Point* cur_edge;
 
@@ -410,7 +436,8 @@ points and \"%d\" vertices\n",anchor->num_anchors,num_points);
 
 void scan_line( void * voidline ){
 	const ScanLine line = (ScanLine)(*((ScanLine *) voidline));
-	TraceElement* trace_buffer = get_trace_buffer();
+	TraceBuffer* trace_buffer = get_trace_buffer();
+	FragmentBuffer* fragment_buffer = get_fragment_buffer();
 	Texture* texture_buffer =  get_texture_buffer();
 	Texture* bump_map = get_bump_map();
 
@@ -562,63 +589,26 @@ void scan_line( void * voidline ){
 
 
 
-					/* Write the color to the image if we're in front*/
-					color = (bb<<16)+(gg<<8)+rr;										
-					if (in_front){
-						pixel_data[index] = color; 
-						zbuffer[index] = z0; /* write to the zbuffer */		
-					}
-
-					/* Write our information to the trace buffer in either case */
-					TraceElement *cur = &trace_buffer[index];
-					if (cur->depth > 100){}/* There is no pixel set here */
-					/* We are in front of the top element, so push it backwards */
-					else if (cur->depth >= z0){ 
-						TraceElement *new_el = malloc(sizeof(TraceElement));
-						new_el->next = NULL; /* This is really bad if uninitialized so we double-ensure */
-						memcpy(new_el,cur,sizeof(TraceElement));
-						cur->next = new_el;
-					}
-					/* We are behind the top element, so move back in the stack until we reach our place */
-					else if(z0 <= 1000){
-						
-						while( cur->depth < z0 ){ 
-							if (!cur->next){
-								cur->next = malloc(sizeof(TraceElement)); 						
-								cur->next->depth = 1000;
-								cur->next->alpha = 1;
-								cur->next->beta = 1;
-								cur->next->next = NULL;
-								cur->next->r = 0; /* Colors can probably stay un-initialized */
-								cur->next->g = 0;
-								cur->next->b = 0;
-							}
-							
-							cur = cur->next;
+					/* Keep transparent fragments aside, to be blended over
+					 * the finished opaque scene (see FragmentBuffer.c)
+					*/
+					if (fragment_buffer && alpha > 0){
+						add_fragment( fragment_buffer, index, z0, rr, gg, bb, alpha );
+					}else{
+						/* Write the color to the image if we're in front*/
+						color = (bb<<16)+(gg<<8)+rr;										
+						if (in_front){
+							pixel_data[index] = color; 
+							zbuffer[index] = z0; /* write to the zbuffer */		
 						}
-						if (cur->depth < 100){
-							TraceElement *new_el = malloc(sizeof(TraceElement));
-							new_el->next = NULL;
-							memcpy(new_el,cur,sizeof(TraceElement));
-							cur->next = new_el;					
+
+						/* Write our information to the trace buffer in either case */
+						const int layer = insert_layer( trace_buffer, index, z0 );
+						if (layer >= 0){
+							write_layer( trace_buffer, layer, z0, rr, gg, bb, alpha, beta,
+								nx + bnx, ny + bny, nz + bnz, surface_color, polygon_id );
 						}
 					}
-											
-					cur->depth = z0;
-					cur->r = rr;
-					cur->g = gg;
-					cur->b = bb;
-					cur->alpha = alpha;
-					cur->beta  = beta;
-					
-					cur->nx = nx + bnx;
-					cur->ny = ny + bny;
-					cur->nz = nz + bnz;
-					cur->Csr = surface_color[0];
-					cur->Csg = surface_color[1];
-					cur->Csb = surface_color[2];
-					
-					cur->is_reached = polygon_id;
 				}
 				
 			
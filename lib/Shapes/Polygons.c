@@ -20,12 +20,12 @@ inline void preprocess_module( double* polygons, double* normals,
 	
 	double ctm[16] = {0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0};
 	
-	/* Transform the ltm and gtm together */
+	/* Transform the ltm and gtm together, ctm = gtm * ltm */
 	for (ii = 0; ii < 4; ii++){
 		for (jj=0;jj<4;jj++){
 			for (kk=0;kk<4;kk++){
-				xi = *(double *)&(ltm[ii*4+kk]);
-				xj = *(double *)&(gtm[ii*4+jj]);
+				xi = *(double *)&(gtm[ii*4+kk]);
+				xj = *(double *)&(ltm[kk*4+jj]);
 				ctm[ii*4+jj] += xi * xj;
 			}
 		}
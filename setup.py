@@ -47,7 +47,9 @@ if 'install' in arguments: # note the unjudicious use of "in" - don't mix args o
 	# The shape files we need to include
 	shapes = [ 'Line', 'Circle', 'Polygon', 'ShadedLine','FastLine', 'Polygons' ]
 	# The lighitng files we need to include
-	lights = ['AmbientLighting','PointLighting','Shade','ShadowTrace','ReflectionTrace','AlphaTrace','LightingLooper']
+	lights = ['AmbientLighting','PointLighting','Shade','ShadowTrace','ReflectionTrace','AlphaTrace','LightingLooper',
+		'LightingTiles','ShadowMap','Sampling','DepthPyramid','TraceBuffer',
+		'FragmentBuffer']
 	# utils = ['qsortl']
 	case_module = Extension('Lilac',sources=['lib/lilac.c']+\
 		[''.join(['lib/Shapes/',shape,'.c']) for shape in shapes]+\
@@ -0,0 +1,125 @@
+"""
+	This file tests the culling of shapes against known cameras.
+
+	Date: 10/18/2026
+"""
+
+import unittest
+import numpy as np
+
+from Module.Matrices.View3D import View3D
+from Module.Matrices.Vector import ModuleVector as Vec
+from Module.Shapes.Shape import Shape
+
+SIZE = 100
+
+def square( z, x = 0, normal = (0,0,-1) ):
+	""" Returns a unit square facing the z-axis at the given depth and
+		horizontal offset, as a 1x4x4 array, and its 1x4 normal
+	"""
+	coords = np.array([[[x,0,z,1],[x+1,0,z,1],[x+1,1,z,1],[x,1,z,1]]],dtype=float)
+	return (coords,np.array([list(normal)+[0]],dtype=float))
+
+class CullingTest(unittest.TestCase):
+	""" Looks down the z-axis from a perspective camera at z=-5, whose center
+		of projection lies at z=-6
+	"""
+
+	def setUp( self ):
+		""" Builds the camera's view transformation """
+		view = View3D( vrp = Vec(0,0,-5), vpn = Vec(0,0,1), vup = Vec(0,1,0),
+			d = 1., basis = 2., b = 10., rows = SIZE, cols = SIZE )
+		self.vtm = view.setView3D().transform
+
+	def outside( self, *squares ):
+		""" Returns whether each of the given squares is out of view """
+		coords = np.concatenate([ coords for (coords,_) in squares ])
+		return Shape.outside( coords.dot(self.vtm.transpose()), SIZE, SIZE ).tolist()
+
+	def test_outside_in_view( self ):
+		""" A square in front of the camera is in view """
+		self.assertEqual( self.outside( square(0) ), [False] )
+
+	def test_outside_behind_viewer( self ):
+		""" A square behind the center of projection is out of view """
+		self.assertEqual( self.outside( square(-10) ), [True] )
+
+	def test_outside_past_edge( self ):
+		""" Squares far to either side are out of view """
+		self.assertEqual( self.outside( square(0,x=50), square(0,x=-50) ), [True,True] )
+
+	def test_outside_crossing_viewer( self ):
+		""" A volume crossing the viewer's plane is kept, even if its
+			vertices in front of the viewer are past the edge
+		"""
+		(coords,_) = square(0,x=50)
+		coords[0,0,2] = coords[0,1,2] = -10
+		self.assertEqual( Shape.outside( coords.dot(self.vtm.transpose()),
+			SIZE, SIZE ).tolist(), [False] )
+
+	def test_facing_perspective( self ):
+		""" A square whose normal points at the camera faces it """
+		(coords,towards) = square(0)
+		(_,away) = square(0,normal=(0,0,1))
+		self.assertTrue( Shape.facing( coords, towards, self.vtm )[0] )
+		self.assertFalse( Shape.facing( coords, away, self.vtm )[0] )
+
+	def test_facing_behind_center( self ):
+		""" Seen from behind the camera, a square's facing is reversed """
+		(coords,towards) = square(-10)
+		self.assertFalse( Shape.facing( coords, towards, self.vtm )[0] )
+		self.assertTrue( Shape.facing( coords, -towards, self.vtm )[0] )
+
+	def test_facing_uses_geometric_normal( self ):
+		""" Smoothed vertex normals that lean away do not flip the side of a
+			square that faces the camera
+		"""
+		(coords,_) = square(0)
+		normals = np.array([[[1,0,-.1,0],[1,0,-.1,0],[-1,0,-.1,0],[-1,0,-.1,0]]])
+		self.assertTrue( Shape.facing( coords, normals, self.vtm )[0] )
+
+	def test_facing_parallel( self ):
+		""" A parallel projection sees along decreasing depth """
+		(coords,towards) = square(0)
+		self.assertTrue( Shape.facing( coords, towards, np.eye(4) )[0] )
+		self.assertFalse( Shape.facing( coords, -towards, np.eye(4) )[0] )
+
+	def test_cull_masks_and_homoginizes( self ):
+		""" Culling keeps the squares in view or partly in view, and divides
+			their coordinates without modifying the input
+		"""
+		coords = np.concatenate([ square(0)[0], square(-10)[0], square(0,x=50)[0],
+			square(0,x=5.5)[0] ]).dot(self.vtm.transpose())
+		original = coords.copy()
+		(visible,view) = Shape.cull( coords, SIZE, SIZE )
+		self.assertEqual( visible.tolist(), [True,False,False,True] )
+		np.testing.assert_array_equal( coords, original )
+		np.testing.assert_allclose( view[0,0,:2], [SIZE/2,SIZE/2] )
+		np.testing.assert_allclose( view[...,:2], original[...,:2] / original[...,3,np.newaxis] )
+		np.testing.assert_allclose( view[...,2], -original[...,2] )
+
+	def test_cull_keeps_covering_polygon( self ):
+		""" A polygon whose vertices all lie off the image, past different
+			edges, is kept when it covers the image
+		"""
+		coords = np.array([[[-10,-10,0,1],[60,-10,0,1],[60,60,0,1],[-10,60,0,1]]],
+			dtype=float)
+		(visible,_) = Shape.cull( coords, 50, 50 )
+		self.assertEqual( visible.tolist(), [True] )
+		self.assertEqual( Shape.outside( coords, 50, 50 ).tolist(), [False] )
+
+	def test_cull_drops_polygon_past_corner( self ):
+		""" A polygon past one corner of the image is dropped """
+		coords = np.array([[[60,60,0,1],[70,60,0,1],[70,70,0,1]]],dtype=float)
+		self.assertEqual( Shape.cull( coords, 50, 50 )[0].tolist(), [False] )
+
+	def test_cull_matches_clip( self ):
+		""" Culling a batch agrees with clipping each homoginized shape """
+		coords = np.concatenate([ square(0,x=x)[0] for x in range(-60,60,7) ])
+		(visible,view) = Shape.cull( coords.dot(self.vtm.transpose()), SIZE, SIZE )
+		clipped = [ bool(Shape.offscreen( shape, SIZE, SIZE )) for shape in view ]
+		self.assertEqual( (~visible).tolist(), clipped )
+		self.assertTrue( visible.any() and not visible.all() )
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,56 @@
+"""
+	This file tests the colors that an indexed mesh keeps from the polygons
+	it is built from.
+
+	Date: 10/18/2026
+"""
+
+import unittest
+import numpy as np
+
+from Module.Lighting.DrawState import DrawState
+from Module.Shapes.IndexedMesh import IndexedMesh
+from Module.Shapes.Polygon import Polygon
+
+def square( x, texture = [] ):
+	""" Returns a unit square at the given horizontal offset """
+	return Polygon( coords = np.array([[x,0,0,1],[x+1,0,0,1],[x+1,1,0,1],[x,1,0,1]],
+		dtype=float), color = [255,0,0,255], normals = np.array([0,0,-1,0],dtype=float),
+		texture = texture )
+
+class IndexedMeshColorTest(unittest.TestCase):
+	""" Builds meshes from squares and batches them as Polygon.batch would """
+
+	def assertBatchesAsPolygons( self, polygons ):
+		""" Asserts that the mesh of the polygons batches to their colors """
+		mesh = IndexedMesh.from_polygons( polygons )
+		np.testing.assert_array_equal( mesh.batch( DrawState() ).texture,
+			Polygon.batch( polygons, DrawState() ).texture )
+		return mesh
+
+	def test_face_colors( self ):
+		""" A texture color per face is kept per face """
+		mesh = self.assertBatchesAsPolygons([ square(0,[0,255,0,255]), square(1) ])
+		self.assertEqual( mesh.colors.shape, (2,4) )
+
+	def test_vertex_colors( self ):
+		""" A texture color per vertex is kept per corner of each face, and
+			the faces without one are colored alike at every corner
+		"""
+		texture = np.arange(16,dtype=float).reshape(4,4)
+		mesh = self.assertBatchesAsPolygons([ square(0,texture), square(1,[0,255,0,255]),
+			square(2) ])
+		self.assertEqual( mesh.colors.shape, (3,4,4) )
+
+	def test_triangulated_vertex_colors( self ):
+		""" Fanning a mesh into triangles keeps the colors of their corners """
+		texture = np.arange(16,dtype=float).reshape(4,4)
+		polygons = [ square(0,texture), square(1) ]
+		triangles = IndexedMesh.from_polygons( polygons ).triangulate()
+		expected = [ triangle.texture if len(triangle.texture) else
+			np.tile(triangle.color,(3,1)) for polygon in polygons
+			for triangle in polygon.triangulate() ]
+		np.testing.assert_array_equal( triangles.batch( DrawState() ).texture, expected )
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,61 @@
+"""
+	This file tests that visitors reach the geometry of instances.
+
+	Date: 10/18/2026
+"""
+
+import unittest
+import numpy as np
+
+from Module.Module import Module
+from Module.Instance import Instance
+from Module.Shapes.Polygon import Polygon
+from Module.Visitors import TableVisitor as table
+from Module.Visitors.FlipVisitor import FlipVisitor
+
+def triangle():
+	""" Returns a plain triangle """
+	return Polygon( coords = np.array([[0,0,0,1],[1,0,0,1],[0,1,0,1]],dtype=float),
+		color = [255,0,0,255] )
+
+class InstanceVisitorTest(unittest.TestCase):
+	""" Visits a scene holding an instance of a two polygon geometry """
+
+	def setUp( self ):
+		""" Builds the scene """
+		self.geometry = Module()
+		self.polygons = [ self.geometry.add_shape( triangle() ) for i in range(2) ]
+		self.root = Module()
+		self.instance = self.root.add_element( Instance( self.geometry ) )
+
+	def tearDown( self ):
+		""" Restores the default of the table """
+		table.ignore_polygons( True )
+
+	def test_table_lists_geometry( self ):
+		""" The table shows the instance and, under it, its geometry """
+		table.ignore_polygons( False )
+		rows = table.TableVisitor().get_table_info( self.root ).display_info
+		self.assertIn( [self.instance,2,self.root], rows )
+		for polygon in self.polygons:
+			self.assertIn( [polygon,3,self.instance], rows )
+
+	def test_table_hides_invisible_instance( self ):
+		""" An invisible instance is not listed """
+		self.instance.invisible = True
+		rows = table.TableVisitor().get_table_info( self.root ).display_info
+		self.assertNotIn( self.instance, [ row[0] for row in rows ] )
+
+	def test_flip_toggles_instance( self ):
+		""" Flipping toggles the instance but not its shared geometry """
+		self.root._clean()
+		FlipVisitor().flip_all( self.root )
+		self.assertTrue( self.instance.ignore )
+		self.assertFalse( self.geometry.ignore )
+		self.assertTrue( self.root._is_dirty() )
+		self.assertEqual( len(self.root.compile()), 0 )
+		FlipVisitor().flip_all( self.root )
+		self.assertEqual( self.root.compile().num_faces(), 2 )
+
+if __name__ == '__main__':
+	unittest.main()
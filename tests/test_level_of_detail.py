@@ -0,0 +1,89 @@
+"""
+	This file tests the choice of a level of detail by projected size.
+
+	Date: 10/18/2026
+"""
+
+import unittest
+import numpy as np
+
+from Module.Module import Module
+from Module.LevelOfDetail import LevelOfDetail
+from Module.RenderList import DetailSet
+from Module.Lighting.DrawState import DrawState
+from Module.Matrices.View3D import View3D
+from Module.Matrices.Vector import ModuleVector as Vec
+from Module.Shapes.Polygon import Polygon
+
+SIZE = 500
+
+def level( faces ):
+	""" Returns a module of the given number of triangles filling the unit
+		square around the origin
+	"""
+	module = Module()
+	for i in range(faces):
+		(x0,x1) = (i/faces - .5,(i+1)/faces - .5)
+		module.add_shape( Polygon( coords = np.array([[x0,-.5,0,1],[x1,-.5,0,1],
+			[x1,.5,0,1]],dtype=float), normals = np.array([0,0,-1,0],dtype=float) ) )
+	return module
+
+def camera( distance ):
+	""" Returns the view transformation of a camera looking at the origin
+		from the given distance
+	"""
+	return View3D( vrp = Vec(0,0,-distance), vpn = Vec(0,0,1), vup = Vec(0,1,0),
+		d = 1., basis = 2., b = 2*distance, rows = SIZE, cols = SIZE ).setView3D()
+
+class DetailSetTest(unittest.TestCase):
+	""" Selects among a coarse, a medium and a fine level of a square """
+
+	def setUp( self ):
+		""" Builds the levels """
+		self.levels = [ level(faces) for faces in (2,8,32) ]
+
+	def detail( self, radii = None, tolerance = 8 ):
+		""" Returns the render list's set of the levels """
+		return DetailSet( self.levels, DrawState(), radii, tolerance )
+
+	def test_default_radii( self ):
+		""" Each level is drawn while its faces are about tolerance wide """
+		np.testing.assert_allclose( self.detail().radii, [ 8*np.sqrt(faces)/2
+			for faces in (2,8,32) ] )
+
+	def test_explicit_radii( self ):
+		""" The coarsest level whose radius is not exceeded is drawn """
+		detail = self.detail( radii = [1,20] )
+		self.assertEqual( detail.select( camera(1000) ), 0 )
+		self.assertEqual( detail.select( camera(10) ), 1 )
+		self.assertEqual( detail.select( camera(2) ), 2 )
+
+	def test_nearer_is_finer( self ):
+		""" Moving the camera towards the square never picks a coarser level """
+		detail = self.detail()
+		chosen = [ detail.select( camera(distance) ) for distance in (400,100,30,10,3) ]
+		self.assertEqual( chosen, sorted(chosen) )
+		self.assertEqual( (chosen[0],chosen[-1]), (0,2) )
+
+	def test_crossing_viewer_is_finest( self ):
+		""" A set reaching behind the viewer is drawn at its finest """
+		vtm = camera(10)
+		vtm.transform = vtm.transform.dot( np.diag([1,1,100,1]) )
+		self.levels[-1].add_shape( Polygon( coords = np.array([[0,0,-.5,1],
+			[0,0,.5,1],[0,.1,0,1]],dtype=float) ) )
+		self.assertEqual( self.detail( radii = [1e9,1e9] ).select( vtm ), 2 )
+
+class LevelOfDetailTest(unittest.TestCase):
+	""" Keeps a level of detail in step with its levels """
+
+	def test_changed_level_dirties( self ):
+		""" Changing a level dirties the element """
+		levels = [ level(2), level(8) ]
+		detail = LevelOfDetail( levels )
+		detail._clean()
+		self.assertFalse( detail._is_dirty() )
+		levels[0]._dirty()
+		self.assertTrue( detail._is_dirty() )
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,89 @@
+"""
+	This file tests that the merge visitor stacks runs of polygons.
+
+	Date: 10/18/2026
+"""
+
+import unittest
+import numpy as np
+
+from Module.Module import Module
+from Module.Shapes.Polygon import Polygon
+from Module.Visitors.MergeVisitor import MergeVisitor
+
+RED = [255,0,0,255]
+BLUE = [0,0,255,255]
+
+def polygon( num_vertices, color = RED, texture = [] ):
+	""" Returns a flat polygon with the given number of vertices """
+	angles = np.arange(num_vertices) * 2 * np.pi / num_vertices
+	coords = np.column_stack(( np.cos(angles), np.sin(angles),
+		np.zeros(num_vertices), np.ones(num_vertices) ))
+	return Polygon( coords = coords, color = color, texture = texture,
+		normals = np.array([0,0,1,0],dtype=float) )
+
+class MergeVisitorTest(unittest.TestCase):
+	""" Merges the polygons of small modules """
+
+	def merge( self, *polygons ):
+		""" Returns the module holding the given polygons, merged, and the
+			number of draw calls saved
+		"""
+		module = Module()
+		[ module.add_shape( polygon ) for polygon in polygons ]
+		return (module,MergeVisitor().merge( module ))
+
+	def test_pads_shorter_polygons( self ):
+		""" A triangle stacked with a quad repeats its last vertex """
+		(quad,triangle) = (polygon(4),polygon(3))
+		(module,saved) = self.merge( quad, triangle )
+		self.assertEqual( saved, 1 )
+		self.assertEqual( len(module.__elements__), 1 )
+		coordinates = module.__elements__[0].coordinates
+		self.assertEqual( coordinates.shape, (2,4,4) )
+		np.testing.assert_array_equal( coordinates[0], quad.coordinates )
+		np.testing.assert_array_equal( coordinates[1,:3], triangle.coordinates )
+		np.testing.assert_array_equal( coordinates[1,3], triangle.coordinates[-1] )
+
+	def test_counts_saved_calls( self ):
+		""" Each run of n polygons saves n-1 draw calls """
+		(module,saved) = self.merge( polygon(3), polygon(3), polygon(3),
+			polygon(3,BLUE), polygon(3,BLUE) )
+		self.assertEqual( saved, 3 )
+		self.assertEqual( [ element.coordinates.shape[0] for element in
+			module.__elements__ ], [3,2] )
+
+	def test_lone_polygon_is_kept( self ):
+		""" A polygon with no compatible neighbour is left as it is """
+		lone = polygon(3,BLUE)
+		(module,saved) = self.merge( polygon(3), polygon(3), lone )
+		self.assertEqual( saved, 1 )
+		self.assertIs( module.__elements__[1], lone )
+
+	def test_untextured_colors_are_not_mixed( self ):
+		""" Polygons of different colors keep their own colors """
+		(module,saved) = self.merge( polygon(3), polygon(3,BLUE), polygon(3) )
+		self.assertEqual( saved, 0 )
+		self.assertEqual( [ element.color for element in module.__elements__ ],
+			[RED,BLUE,RED] )
+
+	def test_textured_polygons_merge_across_colors( self ):
+		""" Texture colors take precedence, so the polygon colors may differ """
+		(first,second) = (polygon(3,RED,[[9,9,9,255]]*3),polygon(3,BLUE,[[1,1,1,255]]*3))
+		(module,saved) = self.merge( first, second, polygon(3) )
+		self.assertEqual( saved, 1 )
+		merged = module.__elements__[0]
+		np.testing.assert_array_equal( merged.texture[:,0,:3], [[9,9,9],[1,1,1]] )
+		self.assertEqual( module.__elements__[1].color, RED )
+		self.assertEqual( len(module.__elements__[1].texture), 0 )
+
+	def test_merge_dirties_module( self ):
+		""" A module whose elements were merged must be compiled again """
+		module = Module()
+		[ module.add_shape( polygon(3) ) for i in range(2) ]
+		module._clean()
+		MergeVisitor().merge( module )
+		self.assertTrue( module._is_dirty() )
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,97 @@
+"""
+	This file tests the on-disk cache of generated meshes.
+
+	Date: 10/18/2026
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+import Module
+from Module.Shapes.MeshCache import MeshCache
+
+class MeshCacheTest(unittest.TestCase):
+	""" Fetches meshes through a cache in a temporary directory, counting
+		how many are built
+	"""
+
+	def setUp( self ):
+		""" Creates an empty cache directory """
+		self.directory = tempfile.mkdtemp()
+		self.builds = 0
+
+	def tearDown( self ):
+		""" Removes the cache directory """
+		shutil.rmtree( self.directory, ignore_errors = True )
+
+	def build( self, size = 4 ):
+		""" Returns the builder of a mesh's arrays, counting its calls """
+		def build():
+			self.builds += 1
+			return { 'vertices' : np.arange( size * 4, dtype=float ).reshape(size,4),
+				'faces' : np.arange( size, dtype=np.int32 ) }
+		return build
+
+	def fetch( self, cache, size = 4, version = 1 ):
+		""" Fetches the mesh of the given size """
+		return cache.fetch( 'test', { 'size' : size }, version, self.build( size ) )
+
+	def test_miss_then_hit( self ):
+		""" A mesh is built once, then found in memory """
+		cache = MeshCache( self.directory )
+		first = self.fetch( cache )
+		second = self.fetch( cache )
+		self.assertEqual( self.builds, 1 )
+		self.assertIs( first, second )
+		self.assertFalse( first['vertices'].flags.writeable )
+
+	def test_hit_on_disk( self ):
+		""" A mesh stored by one cache is memory-mapped by another """
+		self.fetch( MeshCache( self.directory ) )
+		arrays = self.fetch( MeshCache( self.directory ) )
+		self.assertEqual( self.builds, 1 )
+		self.assertIsInstance( arrays['vertices'], np.memmap )
+		self.assertFalse( arrays['vertices'].flags.writeable )
+		np.testing.assert_array_equal( arrays['vertices'], self.build()()['vertices'] )
+
+	def test_version_misses( self ):
+		""" A new version of a generator rebuilds its meshes """
+		cache = MeshCache( self.directory )
+		self.fetch( cache, version = 1 )
+		self.fetch( cache, version = 2 )
+		self.assertEqual( self.builds, 2 )
+
+	def test_least_recently_used_eviction( self ):
+		""" The least recently used entry is dropped from memory """
+		cache = MeshCache( self.directory, capacity = 2 )
+		(a,b) = (self.fetch( cache, 1 ),self.fetch( cache, 2 ))
+		self.assertIs( self.fetch( cache, 1 ), a )
+		self.fetch( cache, 3 ) # evicts 2, the least recently used
+		self.assertIs( self.fetch( cache, 1 ), a )
+		self.assertIsNot( self.fetch( cache, 2 ), b ) # reloaded from disk
+		self.assertEqual( self.builds, 3 )
+
+	def test_failed_store_leaves_no_staging( self ):
+		""" An entry that cannot be renamed into place leaves nothing behind """
+		key = MeshCache.key( 'test', { 'size' : 4 }, 1 )
+		open( os.path.join( self.directory, key ), 'w' ).close() # not a directory
+		self.fetch( MeshCache( self.directory ) )
+		self.assertEqual( os.listdir( self.directory ), [key] )
+
+	def test_default_directory( self ):
+		""" The default directory does not depend on the working directory """
+		working = os.getcwd()
+		try:
+			os.chdir( self.directory )
+			directory = MeshCache().directory
+		finally:
+			os.chdir( working )
+		self.assertTrue( os.path.isabs( directory ) )
+		self.assertEqual( directory, os.path.join( os.path.dirname( os.path.abspath(
+			Module.__file__ ) ), 'Objects', 'cache' ) )
+
+if __name__ == '__main__':
+	unittest.main()
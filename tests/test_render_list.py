@@ -0,0 +1,237 @@
+"""
+	This file tests that the render list a module caches is dropped whenever
+	the module tree changes, so that a redraw never replays a stale list.
+
+	Date: 10/18/2026
+"""
+
+import unittest
+import numpy as np
+
+import Lilac
+from Module.Module import Module
+from Module.Instance import Instance
+from Module.Matrices.Matrix import ViewTransformationMatrix
+from Module.RenderList import RenderList
+from Module.Shapes.Polygon import Polygon
+from Module.Visitors.FlipVisitor import FlipVisitor
+
+def triangle():
+	""" Returns a plain triangle """
+	return Polygon( coords = np.array([[0,0,0,1],[1,0,0,1],[0,1,0,1]],dtype=float),
+		color = [255,0,0,255] )
+
+class RenderListInvalidationTest(unittest.TestCase):
+	""" Draws module trees with a render list that records the shapes it
+		would draw rather than drawing them
+	"""
+
+	def setUp( self ):
+		""" Records the shapes of every render list drawn """
+		self.drawn = []
+		self.draw = RenderList.draw
+		RenderList.draw = lambda render_list, *args : self.drawn.append(
+			[ shape for group in render_list.groups for shape in group.shapes ] )
+
+	def tearDown( self ):
+		""" Restores the drawing of render lists """
+		RenderList.draw = self.draw
+
+	def draw_to_image( self, module ):
+		""" Draws the module and returns the shapes drawn """
+		module.draw_to_image( None )
+		return self.drawn[-1]
+
+	def test_replays_clean_module( self ):
+		""" A module that has not changed replays its list """
+		root = Module()
+		shape = root.add_shape( triangle() )
+		self.assertEqual( self.draw_to_image( root ), [shape] )
+		render_list = root.__render_list__
+		root._clean()
+		self.assertEqual( self.draw_to_image( root ), [shape] )
+		self.assertIs( root.__render_list__, render_list )
+
+	def test_selective_shadow_cycle( self ):
+		""" A flip, draw, flip and clean cycle, as LTk draws selective 
+			shadows, draws the flipped modules only in its second draw
+		"""
+		root = Module()
+		(a,b) = (root.add_element( Module() ),root.add_element( Module() ))
+		shape_a = a.add_shape( triangle() )
+		shape_b = b.add_shape( triangle() )
+		b.ignore = True
+		for frame in range(3):
+			self.assertEqual( self.draw_to_image( root ), [shape_a] )
+			FlipVisitor().flip_all( root )
+			self.assertEqual( self.draw_to_image( root ), [shape_b] )
+			FlipVisitor().flip_all( root )
+			root._clean()
+
+	def test_dirtied_descendant( self ):
+		""" Dirtying a descendant that was already dirty still drops the list """
+		root = Module()
+		child = root.add_element( Module() )
+		shape = child.add_shape( triangle() )
+		shape._dirty()
+		self.assertEqual( self.draw_to_image( root ), [shape] )
+		child.ignore = True
+		child._dirty()
+		self.assertEqual( self.draw_to_image( root ), [] )
+
+	def test_direct_element_assignment( self ):
+		""" An element placed directly into the element list is drawn once 
+			the module is dirtied, and its changes propagate afterwards
+		"""
+		root = Module()
+		child = root.add_element( Module() )
+		first = child.add_shape( triangle() )
+		self.draw_to_image( root )
+		root._clean()
+		second = triangle()
+		child.__elements__[0] = second
+		child._dirty()
+		self.assertEqual( self.draw_to_image( root ), [second] )
+		root._clean()
+		second.ignore = True
+		second._dirty()
+		self.assertTrue( root._is_dirty() )
+		self.assertIsNone( root.__render_list__ )
+
+	def test_propagation_reaches_root( self ):
+		""" Dirtying a shape deep in a drawn tree dirties the root """
+		root = Module()
+		child = root.add_element( Module() )
+		grandchild = child.add_element( Module() )
+		shape = grandchild.add_shape( triangle() )
+		self.draw_to_image( root )
+		root._clean()
+		self.assertFalse( root._is_dirty() )
+		shape._dirty()
+		self.assertTrue( root._is_dirty() )
+		self.assertIsNone( root.__render_list__ )
+
+	def test_edited_matrix( self ):
+		""" Editing a matrix carried by a drawn module drops its list, and the
+			recompiled shapes are placed by the edited transformation
+		"""
+		root = Module()
+		root.translate( 1, 0, 0 )
+		root.add_shape( triangle() )
+		matrix = root.__elements__[0]
+		self.draw_to_image( root )
+		root._clean()
+		matrix.translate( 2, 0, 0 )
+		self.assertTrue( root._is_dirty() )
+		self.assertIsNone( root.__render_list__ )
+		self.draw_to_image( root )
+		(group,) = root.__render_list__.groups
+		self.assertEqual( group.local_transformation_matrix[0,3], 3 )
+
+	def test_edited_instance_transform( self ):
+		""" Editing the matrix of a drawn instance drops its module's list """
+		root = Module()
+		instance = root.add_element( Instance( triangle() ) )
+		self.draw_to_image( root )
+		root._clean()
+		instance.transform.rotateZ( 0, 1 )
+		self.assertTrue( root._is_dirty() )
+		self.assertIsNone( root.__render_list__ )
+
+SIZE = 50
+
+class Camera:
+	""" Stands in for the camera of an LTk, which the lighting looks from """
+	def config( self, key ):
+		return np.array([0,0,-1,1],dtype=float)
+
+class Canvas:
+	""" Stands in for an LTk, holding the buffers that a module is drawn into """
+	fill = True
+	texture = False
+
+	def __init__( self ):
+		""" Initializes the buffers and readies the library for them """
+		camera = ViewTransformationMatrix()
+		camera.camera = Camera()
+		self.options = { 'width' : SIZE, 'height' : SIZE, 'camera' : camera }
+		Lilac.set_image_width( SIZE )
+		Lilac.set_image_height( SIZE )
+
+	def clear( self ):
+		""" Clears the buffers for a new frame """
+		self.options['pixels'] = np.zeros( SIZE*SIZE, dtype=np.int32 )
+		self.options['zbuffer'] = np.full( SIZE*SIZE, 1000, dtype=np.float32 )
+		Lilac.initialize_trace_buffer()
+
+	def config( self, *keys ):
+		""" Returns the value of a key, or the values of several """
+		return self.options[keys[0]] if len(keys) == 1 else \
+			[ self.options[key] for key in keys ]
+
+class Lighting:
+	""" Stands in for the lighting of an LTk with a white ambient light """
+	def get_lighting_parameters( self ):
+		return (np.array([[255,255,255,255]]),[1],np.zeros((1,4)),[1])
+
+	def shade( self, color, surface, polygon, vrp ):
+		return np.tile( np.asarray(color,dtype=float)[:4], (len(polygon.coordinates),1) )
+
+class ReturnedShapeTest(unittest.TestCase):
+	""" Draws a module into buffers and edits the shapes added to it, as 
+		the shapes that LTk's create_ methods return may be edited
+	"""
+
+	def setUp( self ):
+		""" Adds two triangles to a module """
+		self.canvas = Canvas()
+		self.root = Module()
+		self.shapes = [ self.root.add_shape( Polygon( coords = np.array([[x,5,0,1],
+			[x+15,5,0,1],[x,40,0,1]],dtype=float), color = [255,0,0,255] ) )
+			for x in (5,25) ]
+
+	def drawn( self ):
+		""" Draws the module as LTk does, returns the number of pixels drawn
+			and cleans the module
+		"""
+		self.canvas.clear()
+		self.root.draw_to_image( self.canvas, lighting = Lighting() )
+		self.root._clean()
+		return int( (self.canvas.config('zbuffer') < 100).sum() )
+
+	def test_coordinates_edited_in_place( self ):
+		""" Moving a shape off the image in place is drawn """
+		before = self.drawn()
+		self.assertGreater( before, 0 )
+		self.shapes[1].coordinates[:,0] += 100
+		self.assertTrue( self.root._is_dirty() )
+		self.assertEqual( self.drawn(), before // 2 )
+
+	def test_augmented_assignment( self ):
+		""" An augmented assignment to a shape's coordinates is drawn """
+		before = self.drawn()
+		self.shapes[0].coordinates -= [100,0,0,0]
+		self.assertEqual( self.drawn(), before // 2 )
+
+	def test_attribute_assignment( self ):
+		""" Assigning a new color to a shape is drawn """
+		self.drawn()
+		self.shapes[0].color = [0,0,255,255]
+		self.assertTrue( self.root._is_dirty() )
+		self.drawn()
+		self.assertIn( 255 << 16, self.canvas.config('pixels') )
+
+	def test_untouched_shapes_replay( self ):
+		""" Reading a shape's arrays, or arrays computed from them, leaves
+			the compiled list in place
+		"""
+		self.drawn()
+		render_list = self.root.__render_list__
+		moved = self.shapes[0].coordinates + 1
+		moved[:] = 0
+		self.assertFalse( self.root._is_dirty() )
+		self.drawn()
+		self.assertIs( self.root.__render_list__, render_list )
+
+if __name__ == '__main__':
+	unittest.main()
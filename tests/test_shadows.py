@@ -0,0 +1,183 @@
+"""
+	This file tests the shadow pass of the library on a small scene: an
+	occluder hovering over a receiver that fills the image, lit by a light
+	over the middle of the image.
+
+	Date: 10/18/2026
+"""
+
+import unittest
+import numpy as np
+
+import Lilac
+
+SIZE = 40
+UNIFORM = 0
+ADAPTIVE = 1
+PROGRESSIVE = 2
+
+def draw( occluder = 5, light = 1, strata = 1, depth = 3., 
+		position = (SIZE//2,SIZE//2,.5) ):
+	""" Draws the scene with the occluder at the given column and depth, or
+		without one if it is None, and returns its pixels and depths. The 
+		light at the given position is a square of the given width, sampled
+		by strata x strata rays from each pixel.
+	"""
+	Lilac.set_image_width( SIZE )
+	Lilac.set_image_height( SIZE )
+	Lilac.set_polygon_fill( 1 )
+	Lilac.set_alpha( 0. )
+	Lilac.set_shadow_meta_parameters( light, light, .5, strata, .5 )
+	Lilac.initialize_trace_buffer()
+	pixels = np.full( SIZE*SIZE, 0xFFFFFF, dtype=np.int32 )
+	zbuffer = np.full( SIZE*SIZE, 1000, dtype=np.float32 )
+	normals = np.tile( np.array([0,0,1,0],dtype=np.float32), (1,4,1) )
+	colors = np.ones( (1,4,4) )
+	squares = [(0,0,SIZE,SIZE,.1)]
+	if occluder is not None: squares.append( (occluder,15,occluder+6,21,depth) )
+	for (x0,y0,x1,y1,z) in squares:
+		coords = np.array([[[x0,y0,z,1],[x1,y0,z,1],[x1,y1,z,1],
+			[x0,y1,z,1]]],dtype=np.float32)
+		Lilac.create_polygons( -1, pixels, coords, zbuffer, colors, normals )
+	Lilac.apply_shadows( 0, pixels, zbuffer, *position )
+	return (pixels,zbuffer)
+
+class ShadowTest(unittest.TestCase):
+	""" Draws the scene's shadows """
+
+	def tearDown( self ):
+		""" Restores uniform sampling """
+		Lilac.set_sampling_mode( UNIFORM, 1 )
+
+	def uniform( self, **scene ):
+		""" Returns the pixels of the scene sampled uniformly """
+		Lilac.set_sampling_mode( UNIFORM, 1 )
+		return draw( **scene )[0]
+
+class SamplingTest(ShadowTest):
+	""" Samples the shadows adaptively and progressively """
+
+	def test_scene_casts_shadow( self ):
+		""" Moving the occluder moves its shadow over pixels that keep their
+			depth, which progressive sampling must not miss
+		"""
+		(before,depths) = draw( occluder = 5 )
+		(after,moved) = draw( occluder = 25 )
+		self.assertGreater( ((before != after) & (depths == moved)).sum(), 0 )
+
+	def test_adaptive_hard_shadow( self ):
+		""" A point light's shadow sampled adaptively is the uniform one """
+		expected = self.uniform()
+		Lilac.set_sampling_mode( ADAPTIVE, 1 )
+		np.testing.assert_array_equal( draw()[0], expected )
+
+	def test_progressive_hard_shadow( self ):
+		""" A point light's shadow converges in one progressive frame """
+		expected = self.uniform()
+		Lilac.set_sampling_mode( PROGRESSIVE, 1 )
+		np.testing.assert_array_equal( draw()[0], expected )
+		self.assertTrue( Lilac.is_sampling_converged() )
+
+	def test_progressive_convergence( self ):
+		""" A light of n^2 strata converges after n^2 frames of one ray, and
+			a converged image is not drawn again
+		"""
+		Lilac.set_sampling_mode( PROGRESSIVE, 1 )
+		converged = []
+		for frame in range(4):
+			pixels = draw( light = 4, strata = 2 )[0]
+			converged.append( Lilac.is_sampling_converged() )
+		self.assertEqual( converged, [False,False,False,True] )
+		np.testing.assert_array_equal( draw( light = 4, strata = 2 )[0], pixels )
+		self.assertTrue( Lilac.is_sampling_converged() )
+
+	def test_reset_after_moved_occluder( self ):
+		""" Once the scene is reset, the shadow of a moved occluder is drawn
+			where it now falls, even on pixels whose depth did not change
+		"""
+		expected = self.uniform( occluder = 25 )
+		Lilac.set_sampling_mode( PROGRESSIVE, 1 )
+		draw( occluder = 5 )
+		self.assertTrue( Lilac.is_sampling_converged() )
+		Lilac.reset_sampling()
+		np.testing.assert_array_equal( draw( occluder = 25 )[0], expected )
+
+class ThreadTest(ShadowTest):
+	""" Draws the shadows of an area light on several threads """
+
+	def tearDown( self ):
+		""" Restores a single thread """
+		ShadowTest.tearDown( self )
+		Lilac.set_lighting_threads( 1 )
+
+	def test_threads_draw_alike( self ):
+		""" A soft shadow drawn with the same seed is the same on one thread
+			as on eight, which share the image's tiles of rows
+		"""
+		frames = []
+		for threads in (1,8):
+			Lilac.set_lighting_threads( threads )
+			Lilac.set_lighting_seed( 7 )
+			frames.append( draw( light = 4, strata = 2 )[0] )
+		np.testing.assert_array_equal( frames[0], frames[1] )
+		self.assertGreater( len(np.unique( frames[0] )), 2 )
+
+class ShadowMapTest(ShadowTest):
+	""" Looks the shadows up from a shadow map, of a light at the left of
+		the image in front of an occluder nearer to the receiver
+	"""
+	scene = { 'occluder' : 15, 'depth' : .3, 'position' : (2,20,1) }
+
+	def tearDown( self ):
+		""" Restores traced shadows """
+		ShadowTest.tearDown( self )
+		Lilac.set_shadow_map_parameters( 0, 512, 1, 2. )
+
+	def test_map_shadows_behind_occluder( self ):
+		""" The occluder's shadow falls on its far side from the light, where
+			the rays from the light through its corners meet the receiver
+		"""
+		Lilac.set_shadow_map_parameters( 1, 64, 1, 2. )
+		pixels = draw( **self.scene )[0].reshape(SIZE,SIZE)
+		(rows,cols) = np.nonzero( pixels != 0xFFFFFF )
+		self.assertTrue( (cols > 21).any() )
+		self.assertTrue( ((rows >= 11) & (rows <= 24) & (cols >= 17) & (cols <= 29)).all() )
+
+	def test_map_without_occluder( self ):
+		""" A lone receiver does not shadow itself at the default bias """
+		Lilac.set_shadow_map_parameters( 1, 64, 1, 2. )
+		pixels = draw( **dict(self.scene, occluder = None) )[0]
+		self.assertTrue( (pixels == 0xFFFFFF).all() )
+
+	def test_map_off_traces( self ):
+		""" Turning the map off traces the shadows again """
+		expected = self.uniform( **self.scene )
+		Lilac.set_shadow_map_parameters( 1, 64, 1, 2. )
+		mapped = draw( **self.scene )[0]
+		Lilac.set_shadow_map_parameters( 0, 64, 1, 2. )
+		np.testing.assert_array_equal( draw( **self.scene )[0], expected )
+		self.assertTrue( (mapped != expected).any() )
+
+class DepthPyramidTest(ShadowTest):
+	""" Walks the shadow rays with and without the depth pyramid """
+
+	def tearDown( self ):
+		""" Restores the pyramid """
+		ShadowTest.tearDown( self )
+		Lilac.set_depth_pyramid( 1 )
+
+	def test_pyramid_draws_alike( self ):
+		""" Skipping the spans that the pyramid rules out draws the same
+			shadows as stepping through every pixel
+		"""
+		for scene in ({ 'light' : 4, 'strata' : 2 },ShadowMapTest.scene):
+			frames = []
+			for enabled in (0,1):
+				Lilac.set_depth_pyramid( enabled )
+				Lilac.set_lighting_seed( 7 )
+				frames.append( draw( **scene )[0] )
+			np.testing.assert_array_equal( frames[0], frames[1] )
+			self.assertTrue( (frames[0] != 0xFFFFFF).any() )
+
+if __name__ == '__main__':
+	unittest.main()
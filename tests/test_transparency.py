@@ -0,0 +1,99 @@
+"""
+	This file tests that transparent polygons blend the same whatever order
+	they are drawn in, which relies on the trace buffer keeping each pixel's
+	layers sorted by depth.
+
+	Date: 10/18/2026
+"""
+
+import unittest
+import itertools
+import numpy as np
+
+import Lilac
+
+SIZE = 16
+LAYERED = 0
+K_BUFFER = 1
+
+# an opaque red polygon behind transparent green, blue and yellow ones,
+# as (depth, color, alpha); the nearest polygon has the greatest depth
+RED = (-2.,[1.,0,0],0.)
+LAYERS = [ RED, (-1.,[0,1.,0],.5), (-.5,[0,0,1.],.5), (-.25,[1.,1.,0],.5) ]
+
+def draw( polygons, mode = LAYERED, fragments = 4 ):
+	""" Draws each polygon over the whole image in the given order, blends
+		the transparencies and returns the (r,g,b) color of a pixel. The
+		layer pool is sized so that no pixel drops a layer.
+	"""
+	Lilac.set_image_width( SIZE )
+	Lilac.set_image_height( SIZE )
+	Lilac.set_transparency_mode( mode, fragments )
+	Lilac.set_layer_pool_size( len(polygons) )
+	Lilac.initialize_trace_buffer()
+	Lilac.set_polygon_fill( 1 )
+	pixels = np.zeros( SIZE*SIZE, dtype=np.int32 )
+	zbuffer = np.full( SIZE*SIZE, 1000, dtype=np.float32 )
+	normals = np.tile( np.array([0,0,1,0],dtype=np.float32), (1,3,1) )
+	for (depth,color,alpha) in polygons:
+		Lilac.set_alpha( alpha )
+		coords = np.array([[[0,0,depth,1],[2*SIZE,0,depth,1],[0,2*SIZE,depth,1]]],
+			dtype=np.float32)
+		colors = np.tile( np.array(color+[1.]), (1,3,1) )
+		Lilac.create_polygons( -1, pixels, coords, zbuffer, colors, normals )
+	Lilac.apply_transparency( 0, pixels, zbuffer )
+	color = int(pixels[SIZE+1])
+	return (color & 0xFF, (color>>8) & 0xFF, (color>>16) & 0xFF)
+
+class TransparencyOrderTest(unittest.TestCase):
+	""" Blends polygons drawn in every order """
+
+	mode = LAYERED
+
+	def tearDown( self ):
+		""" Restores the default transparency mode and layer pool """
+		Lilac.set_transparency_mode( LAYERED, 4 )
+		Lilac.set_layer_pool_size( 1 )
+
+	def colors( self, polygons, fragments = 4 ):
+		""" Returns the set of colors of the polygons drawn in every order """
+		return { draw( order, self.mode, fragments ) for order in
+			itertools.permutations(polygons) }
+
+	def test_blend_is_order_independent( self ):
+		""" Every order blends green, blue, then yellow over the red """
+		colors = self.colors( LAYERS )
+		self.assertEqual( len(colors), 1 )
+		np.testing.assert_allclose( colors.pop(), (159,159,63), atol=1 )
+
+	def test_hidden_polygon_is_blended_under( self ):
+		""" A transparent polygon behind another is still blended, under it """
+		(green,yellow) = (LAYERS[1],LAYERS[3])
+		colors = self.colors( [RED,green,yellow] )
+		self.assertEqual( len(colors), 1 )
+		np.testing.assert_allclose( colors.pop(), (191,191,0), atol=1 )
+
+class KBufferOrderTest(TransparencyOrderTest):
+	""" Blends polygons drawn in every order in the k-buffer mode, which
+		keeps the transparent fragments aside sorted by add_fragment
+	"""
+
+	mode = K_BUFFER
+
+	def test_farthest_fragments_are_dropped( self ):
+		""" With two slots, only the two nearest fragments are blended,
+			whatever order they were drawn in
+		"""
+		colors = self.colors( LAYERS, fragments = 2 )
+		self.assertEqual( len(colors), 1 )
+		np.testing.assert_allclose( colors.pop(), (191,127,63), atol=1 )
+
+	def test_equal_depths_are_ordered( self ):
+		""" Fragments at the same depth are ordered by their colors, so the
+			same one is blended whichever was drawn first
+		"""
+		(green,blue) = ((-1.,[0,1.,0],.5),(-1.,[0,0,1.],.5))
+		self.assertEqual( len(self.colors( [RED,green,blue] )), 1 )
+
+if __name__ == '__main__':
+	unittest.main()
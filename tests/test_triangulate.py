@@ -0,0 +1,115 @@
+"""
+	This file tests the triangulation of polygons and the welding of
+	Gouraud normals.
+
+	Date: 10/18/2026
+"""
+
+import unittest
+import numpy as np
+
+from Module.Module import Module
+from Module.Shapes.Polygon import Polygon
+from Module.Shapes.ShapeFactory import shape_factory
+
+class TriangulateTest(unittest.TestCase):
+	""" Fans polygons into triangles """
+
+	def setUp( self ):
+		""" Builds a pentagon with one normal and a texture color per vertex """
+		angles = np.arange(5) * 2 * np.pi / 5
+		self.coords = np.column_stack(( np.cos(angles), np.sin(angles),
+			np.zeros(5), np.ones(5) ))
+		self.texture = np.arange(20,dtype=float).reshape(5,4)
+		self.pentagon = Polygon( coords = self.coords, color = [1,2,3,255],
+			normals = np.array([0,0,1,0],dtype=float), texture = self.texture,
+			two_sided = True )
+
+	def test_fans_from_first_vertex( self ):
+		""" A polygon with V vertices becomes V-2 triangles sharing its first """
+		triangles = self.pentagon.triangulate()
+		self.assertEqual( len(triangles), 3 )
+		for i,triangle in enumerate(triangles):
+			np.testing.assert_array_equal( triangle.coordinates, self.coords[[0,i+1,i+2]] )
+			np.testing.assert_array_equal( triangle.texture, self.texture[[0,i+1,i+2]] )
+			self.assertEqual( triangle.color, [1,2,3,255] )
+			self.assertTrue( triangle.two_sided )
+
+	def test_normals_are_given_per_corner( self ):
+		""" A single normal is copied to every corner of every triangle """
+		for triangle in self.pentagon.triangulate():
+			self.assertEqual( triangle.normals.shape, (3,4) )
+			np.testing.assert_array_equal( triangle.normals, [[0,0,1,0]]*3 )
+
+	def test_triangles_and_stacks_are_kept( self ):
+		""" Triangles and stacked polygons are returned as they are """
+		triangle = Polygon( coords = self.coords[:3] )
+		self.assertEqual( triangle.triangulate()[0].coordinates.shape, (3,4) )
+		stacked = Polygon( coords = np.array([self.coords,self.coords]) )
+		self.assertIs( stacked.triangulate()[0], stacked )
+
+class AverageNormalsTest(unittest.TestCase):
+	""" Welds the normals of polygons sharing vertices """
+
+	def square( self, corners, normal ):
+		""" Returns a square with the given corners and normal """
+		return Polygon( coords = np.array([ list(corner) + [1] for corner in corners ],
+			dtype=float), normals = np.array(normal,dtype=float) )
+
+	def test_shared_edge_is_averaged( self ):
+		""" The vertices of a shared edge take the mean of both normals, and
+			the other vertices keep their own
+		"""
+		module = Module()
+		floor = module.add_shape( self.square([(0,0,0),(1,0,0),(1,0,1),(0,0,1)],[0,1,0,0]) )
+		wall = module.add_shape( self.square([(0,0,0),(0,1,0),(0,1,1),(0,0,1)],[1,0,0,0]) )
+		module.average_normals()
+		np.testing.assert_allclose( floor.normals[:,:3],
+			[[.5,.5,0],[0,1,0],[0,1,0],[.5,.5,0]] )
+		np.testing.assert_allclose( wall.normals[:,:3],
+			[[.5,.5,0],[1,0,0],[1,0,0],[.5,.5,0]] )
+
+	def test_weld_tolerates_rounding( self ):
+		""" Vertices closer than the precision are welded """
+		module = Module()
+		first = module.add_shape( self.square([(0,0,0),(1,0,0),(1,0,1),(0,0,1)],[0,1,0,0]) )
+		second = module.add_shape( self.square([(1e-9,0,0),(-1,0,0),(-1,1,0),(0,1,0)],[0,0,1,0]) )
+		module.average_normals()
+		np.testing.assert_allclose( first.normals[0,:3], [0,.5,.5] )
+		np.testing.assert_allclose( second.normals[0,:3], [0,.5,.5] )
+		np.testing.assert_allclose( first.normals[1,:3], [0,1,0] )
+
+	def test_averaging_dirties_module( self ):
+		""" New normals must be compiled again """
+		module = Module()
+		module.add_shape( self.square([(0,0,0),(1,0,0),(1,0,1),(0,0,1)],[0,1,0,0]) )
+		module._clean()
+		module.average_normals()
+		self.assertTrue( module._is_dirty() )
+
+class SmoothShapeTest(unittest.TestCase):
+	""" Builds the factory's shapes with Gouraud normals """
+
+	def setUp( self ):
+		""" Builds shapes without the cache, which smooths them """
+		shape_factory.cache = False
+
+	def tearDown( self ):
+		""" Restores the cache """
+		shape_factory.cache = True
+
+	def test_box_corners_are_symmetric( self ):
+		""" Every corner of a smooth box averages its three faces evenly,
+			whichever side of a diagonal it falls on
+		"""
+		box = shape_factory.gen_shape( 'box' )
+		polygons = [ element for element in box.__elements__ if isinstance(element,Polygon) ]
+		self.assertEqual( len(polygons), 12 )
+		for polygon in polygons:
+			self.assertEqual( polygon.coordinates.shape, (3,4) )
+			np.testing.assert_allclose( np.abs(polygon.normals[:,:3]), 1/3 )
+			np.testing.assert_allclose( np.sign(polygon.normals[:,:3]), 
+				np.sign(polygon.coordinates[:,:3]) )
+
+if __name__ == '__main__':
+	unittest.main()